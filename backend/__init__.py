@@ -0,0 +1,4 @@
+"""
+Server-side building blocks for the Meteorite Impact Simulator.
+Route handlers live in server.py; this package holds the shared logic.
+"""
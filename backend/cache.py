@@ -0,0 +1,267 @@
+"""
+Bounded TTL + LRU cache for upstream responses.
+
+Entries are raw response bodies (bytes), evicted least-recently-used once the
+total size exceeds the byte budget. Expired entries are still served for a
+grace period while a single background refresh runs (stale-while-revalidate).
+An optional on-disk tier lets every gunicorn worker share fetched bodies;
+it has its own byte budget and drops the oldest-written files first. An an optional SingleFlight collapses concurrent misses for one key into
+a single fetch.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# The disk tier is rescanned after this share of its budget has been written
+DISK_SWEEP_FRACTION = 0.1
+
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+
+def make_key(route, params):
+    """Normalized cache key: route plus sorted, whitespace-trimmed params"""
+    items = sorted(
+        (str(k), str(v).strip()) for k, v in params.items() if v is not None)
+    return route + '?' + '&'.join(f"{k}={v}" for k, v in items)
+
+
+class _Entry:
+    __slots__ = ('body', 'stored_at', 'ttl', 'stale_ttl')
+
+    def __init__(self, body, stored_at, ttl, stale_ttl):
+        self.body = body
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def age(self):
+        return time.time() - self.stored_at
+
+    def is_fresh(self):
+        return self.age() < self.ttl
+
+    def is_usable(self):
+        return self.age() < self.ttl + self.stale_ttl
+
+
+class ResponseCache:
+    """In-process LRU keyed by normalized request, with an optional shared disk tier"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, flight=None,
+                 disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.flight = flight
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_lock = threading.Lock()
+        # Start over budget so the first write scans what earlier runs left behind
+        self._disk_written = disk_max_bytes
+        self._disk_bytes = 0
+        self._disk_evictions = 0
+
+    def get_or_fetch(self, key, fetch, ttl, stale_ttl=0):
+        """
+        Return (body, status) for key, calling fetch() -> bytes on a miss.
+        status is HIT, STALE or MISS. Exceptions from fetch() propagate and
+        nothing is cached.
+        """
+        entry = self._get(key)
+        if entry is None:
+            entry = self._disk_get(key, ttl, stale_ttl)
+            if entry is not None:
+                self._put(key, entry)
+
+        if entry is not None:
+            if entry.is_fresh():
+                self._bump('_hits')
+                return entry.body, HIT
+            if entry.is_usable():
+                self._bump('_stale_hits')
+                self._refresh_in_background(key, fetch, ttl, stale_ttl)
+                return entry.body, STALE
+
+        self._bump('_misses')
+        if self.flight is None:
+            body = fetch()
+            self.set(key, body, ttl, stale_ttl)
+            return body, MISS
+
+        def fetch_and_store():
+            body = fetch()
+            self.set(key, body, ttl, stale_ttl)
+            return body
+        body = self.flight.do(key, fetch_and_store)
+        if self._get(key) is None:
+            # Published by another worker, so fetch_and_store never ran here
+            self._put(key, _Entry(body, time.time(), ttl, stale_ttl))
+        return body, MISS
+
+    def peek(self, key, ttl, stale_ttl=0):
+        """(body, HIT or STALE) for a usable entry, (None, MISS) otherwise; never fetches"""
+        entry = self._get(key)
+        if entry is None:
+            entry = self._disk_get(key, ttl, stale_ttl)
+            if entry is not None:
+                self._put(key, entry)
+        if entry is None or not entry.is_usable():
+            return None, MISS
+        return entry.body, HIT if entry.is_fresh() else STALE
+
+    def set(self, key, body, ttl, stale_ttl=0):
+        entry = _Entry(body, time.time(), ttl, stale_ttl)
+        self._put(key, entry)
+        self._disk_put(key, body)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old.body)
+            self._entries[key] = entry
+            self._size += len(entry.body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+                self._evictions += 1
+
+    def _refresh_in_background(self, key, fetch, ttl, stale_ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                body = self.flight.do(key, fetch) if self.flight else fetch()
+                self.set(key, body, ttl, stale_ttl)
+            except Exception as e:
+                # Keep serving the stale copy; the next stale hit retries
+                print(f"Cache refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    def _disk_get(self, key, ttl, stale_ttl):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if time.time() - stored_at >= ttl + stale_ttl:
+                return None
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        return _Entry(body, stored_at, ttl, stale_ttl)
+
+    def _disk_put(self, key, body):
+        if not self.disk_dir or len(body) > self.disk_max_bytes:
+            return
+        # Write to a temp file and rename so other workers never see partial bodies
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, self._disk_path(key))
+        except OSError as e:
+            print(f"Cache disk write failed for {key}: {e}")
+            return
+
+        with self._lock:
+            self._disk_written += len(body)
+            due = self._disk_written >= self.disk_max_bytes * DISK_SWEEP_FRACTION
+            if due:
+                self._disk_written = 0
+        if due:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        """Delete the oldest-written files until the disk tier fits its budget"""
+        # Other workers write to the same directory, so its size is measured, not tracked
+        if not self._disk_lock.acquire(blocking=False):
+            return
+        try:
+            files = []
+            with os.scandir(self.disk_dir) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            evicted = 0
+            files.sort()
+            for _, size, path in files:
+                if total <= self.disk_max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Cache disk eviction failed for {path}: {e}")
+                    continue
+                total -= size
+                evicted += 1
+            with self._lock:
+                self._disk_bytes = total
+                self._disk_evictions += evicted
+        except OSError as e:
+            print(f"Cache disk scan failed for {self.disk_dir}: {e}")
+        finally:
+            self._disk_lock.release()
+
+    def _bump(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._stale_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'maxBytes': self.max_bytes,
+                'hits': self._hits,
+                'staleHits': self._stale_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hitRate': (self._hits + self._stale_hits) / lookups if lookups else 0.0,
+                'diskDir': self.disk_dir,
+                'diskBytes': self._disk_bytes,
+                'diskMaxBytes': self.disk_max_bytes,
+                'diskEvictions': self._disk_evictions,
+            }
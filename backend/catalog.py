@@ -0,0 +1,366 @@
+"""
+Local columnar NEO catalog answering /api/sbdb_query without calling JPL.
+
+An ingestion command bulk-loads an SBDB query export (JSON as returned by
+sbdb_query.api, or the CSV from the SBDB query tool) into a snapshot
+directory of NumPy column files:
+
+    <root>/snapshots/<id>/manifest.json
+    <root>/snapshots/<id>/<field>.str.npy     original values, used for output
+    <root>/snapshots/<id>/<field>.num.npy     float64 values for numeric fields
+    <root>/snapshots/<id>/<field>.order.npy   argsort index (indexed fields)
+    <root>/current -> snapshots/<id>          switched atomically
+
+Columns are memory-mapped, so every worker shares the same pages. Queries
+use the sorted indexes for range conditions and sorting. A running server
+notices when `current` moves to a new snapshot and swaps it in.
+
+    python -m backend.catalog ingest sbdb_export.json --root catalog
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Fields with a sorted index (range filters and sorting use them)
+INDEXED_FIELDS = ('diameter', 'H', 'moid', 'a', 'e', 'i', 'per')
+# Yes/no flags; SBDB exports use "Y"/"N", the frontend sends "1"
+FLAG_FIELDS = ('neo', 'pha')
+TRUE_VALUES = ('1', 'Y', 'y', 'true', 'True')
+
+OPERATORS = ('EQ', 'NE', 'LT', 'GT', 'LE', 'GE', 'RG', 'DF', 'ND')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 100000
+KEEP_SNAPSHOTS = 2
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+class CatalogUnavailable(Exception):
+    pass
+
+
+def _read_export(path):
+    """Return (fields, rows) from an SBDB query JSON or CSV export"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            doc = json.load(f)
+            return list(doc['fields']), doc['data']
+        reader = csv.reader(f)
+        fields = next(reader)
+        return fields, list(reader)
+
+
+def _is_numeric(values):
+    present = [v for v in values if v not in (None, '')]
+    if not present:
+        return False
+    try:
+        for v in present:
+            float(v)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def ingest(export_path, root):
+    """Build a new snapshot from an export file and make it current; returns the snapshot path"""
+    fields, rows = _read_export(export_path)
+    snapshot_id = time.strftime('%Y%m%dT%H%M%S') + f'-{os.getpid()}'
+    snapshot_dir = os.path.join(root, 'snapshots', snapshot_id)
+    os.makedirs(snapshot_dir)
+
+    numeric = []
+    for col, field in enumerate(fields):
+        values = [row[col] if col < len(row) else None for row in rows]
+        strings = np.asarray(['' if v is None else str(v) for v in values])
+        np.save(os.path.join(snapshot_dir, f'{field}.str.npy'), strings)
+
+        if field in FLAG_FIELDS:
+            flags = np.asarray([s in TRUE_VALUES for s in strings.tolist()], dtype=np.bool_)
+            np.save(os.path.join(snapshot_dir, f'{field}.flag.npy'), flags)
+        elif _is_numeric(values):
+            nums = np.asarray(
+                [float(v) if v not in (None, '') else np.nan for v in values], dtype=np.float64)
+            np.save(os.path.join(snapshot_dir, f'{field}.num.npy'), nums)
+            numeric.append(field)
+            if field in INDEXED_FIELDS:
+                # NaN sorts last, so missing values never fall inside a range
+                np.save(os.path.join(snapshot_dir, f'{field}.order.npy'),
+                        np.argsort(nums, kind='stable').astype(np.int32))
+
+    manifest = {
+        'id': snapshot_id,
+        'source': os.path.basename(export_path),
+        'created': time.time(),
+        'count': len(rows),
+        'fields': fields,
+        'numeric': numeric,
+        'flags': [f for f in fields if f in FLAG_FIELDS],
+    }
+    with open(os.path.join(snapshot_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    # Atomic switch: build a new symlink and rename it over `current`
+    link = os.path.join(root, 'current')
+    tmp_link = link + f'.tmp-{os.getpid()}'
+    os.symlink(os.path.join('snapshots', snapshot_id), tmp_link)
+    os.replace(tmp_link, link)
+
+    _prune_snapshots(root, keep=snapshot_id)
+    return snapshot_dir
+
+
+def _prune_snapshots(root, keep):
+    snapshots_dir = os.path.join(root, 'snapshots')
+    snapshots = sorted(os.listdir(snapshots_dir))
+    # Keep the newest few; workers may still have older ones mapped for a moment
+    for name in snapshots[:-KEEP_SNAPSHOTS]:
+        if name != keep:
+            shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
+
+
+class Snapshot:
+    """One immutable, memory-mapped catalog snapshot"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.count = self.manifest['count']
+        self.fields = self.manifest['fields']
+        self.strings = {f: self._load(f'{f}.str.npy') for f in self.fields}
+        self.numbers = {f: self._load(f'{f}.num.npy') for f in self.manifest['numeric']}
+        self.flags = {f: self._load(f'{f}.flag.npy') for f in self.manifest['flags']}
+        self.order = {}
+        self.sorted_values = {}
+        for field in self.numbers:
+            order_path = os.path.join(path, f'{field}.order.npy')
+            if os.path.exists(order_path):
+                self.order[field] = np.load(order_path, mmap_mode='r')
+                self.sorted_values[field] = self.numbers[field][self.order[field]]
+        # Sorted values end with the NaNs; ranges must stop before them
+        self.defined_count = {f: int(np.count_nonzero(~np.isnan(v))) for f, v in self.sorted_values.items()}
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, name), mmap_mode='r')
+
+    def elements(self, spkids=None, fields=('a', 'e', 'i', 'om', 'w', 'ma', 'epoch', 'per')):
+        """
+        Float columns for the given spkids (all objects when None), as a
+        dict of arrays; fields the snapshot lacks are left out.
+        Raises ValueError for unknown spkids.
+        """
+        if spkids is None:
+            rows = slice(None)
+        else:
+            if 'spkid' not in self.strings:
+                raise ValueError('Catalog has no spkid column')
+            ids = np.asarray(self.strings['spkid'])
+            order = np.argsort(ids)
+            wanted = np.asarray(spkids, dtype=ids.dtype)
+            pos = np.clip(np.searchsorted(ids, wanted, sorter=order), 0, len(ids) - 1)
+            rows = order[pos]
+            missing = ids[rows] != wanted
+            if missing.any():
+                raise ValueError(f'Unknown spkids: {wanted[missing][:10].tolist()}')
+        return {f: np.asarray(self.numbers[f][rows]) for f in fields if f in self.numbers}
+
+    def _range_mask(self, field, low, high, low_inclusive, high_inclusive):
+        """Rows with low < value < high (bounds optional), via the sorted index when present"""
+        mask = np.zeros(self.count, dtype=bool)
+        if field in self.order:
+            values = self.sorted_values[field]
+            start = 0 if low is None else np.searchsorted(values, low, 'left' if low_inclusive else 'right')
+            stop = self.defined_count[field] if high is None else np.searchsorted(values, high, 'right' if high_inclusive else 'left')
+            mask[self.order[field][start:stop]] = True
+            return mask
+        values = self.numbers[field]
+        mask[:] = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low if low_inclusive else values > low
+        if high is not None:
+            mask &= values <= high if high_inclusive else values < high
+        return mask
+
+    def condition_mask(self, condition):
+        field = condition.get('field')
+        op = str(condition.get('op', 'EQ')).upper()
+        value = condition.get('value')
+        if field not in self.strings:
+            raise ValueError(f'Unknown field: {field}')
+        if op not in OPERATORS:
+            raise ValueError(f'Unsupported operator: {op}')
+
+        if op in ('DF', 'ND'):
+            defined = self.strings[field] != ''
+            return defined if op == 'DF' else ~defined
+
+        if field in self.flags:
+            if op not in ('EQ', 'NE'):
+                raise ValueError(f'{field} only supports EQ/NE')
+            mask = self.flags[field] == (str(value) in TRUE_VALUES)
+            return mask if op == 'EQ' else ~mask
+
+        if field in self.numbers:
+            if op == 'RG':
+                low, high = (float(v) for v in (value if isinstance(value, list) else str(value).split(',')))
+                return self._range_mask(field, low, high, True, True)
+            number = float(value)
+            if op == 'EQ':
+                return self._range_mask(field, number, number, True, True)
+            if op == 'NE':
+                return ~self._range_mask(field, number, number, True, True)
+            return self._range_mask(
+                field,
+                number if op in ('GT', 'GE') else None,
+                number if op in ('LT', 'LE') else None,
+                op == 'GE', op == 'LE')
+
+        column = self.strings[field]
+        if op == 'EQ':
+            return column == str(value)
+        if op == 'NE':
+            return column != str(value)
+        raise ValueError(f'{field} is not numeric; only EQ/NE/DF/ND apply')
+
+    def query(self, fields, conditions=(), kind=None, sort=None, limit=DEFAULT_LIMIT):
+        """Return (total matches, rows) in the sbdb_query response layout"""
+        for field in fields:
+            if field not in self.strings:
+                raise ValueError(f'Unknown field: {field}')
+
+        mask = np.ones(self.count, dtype=bool)
+        for condition in conditions:
+            mask &= self.condition_mask(condition)
+        if kind and 'kind' in self.strings:
+            # sb-kind "a" = asteroids, "c" = comets (kind values like "an", "cu")
+            mask &= self.strings['kind'].astype(f'U{len(kind)}') == kind
+
+        if sort:
+            descending = sort.startswith('-')
+            field = sort.lstrip('-+')
+            if field in self.order:
+                order = np.asarray(self.order[field])
+                rows = order[mask[order]]
+                if descending:
+                    # Keep missing values (NaN, sorted last) at the end
+                    present = ~np.isnan(self.numbers[field][rows])
+                    rows = np.concatenate([rows[present][::-1], rows[~present]])
+            elif field in self.strings:
+                rows = np.flatnonzero(mask)
+                keys = self.numbers[field][rows] if field in self.numbers else self.strings[field][rows]
+                rows = rows[np.argsort(keys, kind='stable')]
+                if descending:
+                    rows = rows[::-1]
+            else:
+                raise ValueError(f'Unknown sort field: {field}')
+        else:
+            rows = np.flatnonzero(mask)
+
+        total = int(mask.sum())
+        rows = rows[:limit]
+        columns = [self.strings[f][rows].tolist() for f in fields]
+        data = [[v if v != '' else None for v in row] for row in zip(*columns)]
+        return total, data
+
+
+class Catalog:
+    """Serves queries from the current snapshot, reloading when it is replaced"""
+
+    def __init__(self, root):
+        self.root = root
+        self._snapshot = None
+        self._target = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                target = os.readlink(os.path.join(self.root, 'current'))
+            except OSError:
+                target = None
+            if target is None:
+                if self._snapshot is None:
+                    raise CatalogUnavailable(f'No catalog snapshot in {self.root}')
+            elif target != self._target:
+                # Swap in the new snapshot; in-flight queries keep their reference to the old one
+                self._snapshot = Snapshot(os.path.join(self.root, target))
+                self._target = target
+            return self._snapshot
+
+    def available(self):
+        try:
+            self.snapshot()
+            return True
+        except (CatalogUnavailable, OSError):
+            return False
+
+    def handle_query(self, payload):
+        """Answer an /api/sbdb_query payload in the same shape sbdb_query.api returns"""
+        snapshot = self.snapshot()
+        fields = payload.get('fields') or ['spkid', 'full_name']
+        if isinstance(fields, str):
+            fields = fields.split(',')
+
+        cdata = payload.get('sb_cdata', payload.get('sb-cdata')) or {}
+        if isinstance(cdata, str):
+            cdata = json.loads(cdata)
+        conditions = cdata.get('fields', []) if isinstance(cdata, dict) else []
+
+        limit = int(payload.get('limit') or DEFAULT_LIMIT)
+        limit = max(0, min(limit, MAX_LIMIT))
+        total, data = snapshot.query(
+            fields, conditions,
+            kind=payload.get('sb_kind', payload.get('sb-kind')),
+            sort=payload.get('sort') or payload.get('sb_sort'),
+            limit=limit)
+
+        return {
+            'signature': {
+                'source': 'Local SBDB catalog snapshot',
+                'version': '1.0',
+                'snapshot': snapshot.manifest['id'],
+            },
+            'count': total,
+            'fields': fields,
+            'data': data,
+        }
+
+
+def catalog_from_env():
+    """Catalog rooted at NEO_CATALOG_DIR, or None when not configured"""
+    root = os.environ.get('NEO_CATALOG_DIR')
+    return Catalog(root) if root else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the local SBDB catalog')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest_cmd = sub.add_parser('ingest', help='load an SBDB query export (.json or .csv)')
+    ingest_cmd.add_argument('export')
+    ingest_cmd.add_argument('--root', default=os.environ.get('NEO_CATALOG_DIR', 'catalog'))
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        os.makedirs(args.root, exist_ok=True)
+        start = time.perf_counter()
+        path = ingest(args.export, args.root)
+        snapshot = Snapshot(path)
+        print(f"Ingested {snapshot.count} objects into {path} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
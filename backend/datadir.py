@@ -0,0 +1,27 @@
+"""
+Where the server keeps its own files (scenario results, the job queue, sessions).
+
+The project directory is the web root: paths missing from the static asset
+table are served straight from it. Server state therefore defaults to a
+directory outside it, DATA_DIR, which falls back to
+$XDG_DATA_HOME/meteor-impact-simulator (~/.local/share/meteor-impact-simulator).
+"""
+
+import os
+
+APP_NAME = 'meteor-impact-simulator'
+
+
+def data_dir():
+    """DATA_DIR, created on first use"""
+    path = os.environ.get('DATA_DIR')
+    if not path:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+        path = os.path.join(base, APP_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_path(name):
+    """Path of a file in DATA_DIR"""
+    return os.path.join(data_dir(), name)
@@ -0,0 +1,192 @@
+"""
+Vectorized two-body ephemerides for many orbits at many epochs.
+
+Kepler's equation is solved with Newton-Raphson over an (N orbits x M
+epochs) grid at once, starting from Danby's guess so high-eccentricity
+orbits converge in a handful of iterations (the fixed-point iteration in
+js/nasa-sbdb-api.js stalls as e approaches 1). Positions are heliocentric
+ecliptic J2000 in AU, returned as float32.
+"""
+
+import base64
+
+import numpy as np
+
+# Gaussian gravitational constant (rad/day, AU^1.5 units) and Sun GM
+GAUSS_K = 0.01720209895
+GM_SUN_KM3_S2 = 1.32712440018e11
+AU_KM = 149597870.7
+
+ELEMENT_FIELDS = ('a', 'e', 'i', 'om', 'w', 'ma')
+MAX_ORBITS = 50000
+MAX_EPOCHS = 10000
+# Orbits x epochs per request: ~10 float64 intermediates of this size and a
+# ~16 MB base64 body, which one worker can afford
+MAX_POINTS = 1_000_000
+KEPLER_TOL = 1e-10
+KEPLER_MAX_ITER = 30
+
+
+def solve_kepler(mean_anomaly, e, tol=KEPLER_TOL, max_iter=KEPLER_MAX_ITER):
+    """Eccentric anomaly E (radians) for M = E - e sin E, elementwise for 0 <= e < 1"""
+    M = np.remainder(mean_anomaly, 2 * np.pi)
+    e = np.broadcast_to(e, M.shape)
+    # Danby (1987) starting value keeps Newton inside the basin for any e < 1
+    E = M + 0.85 * e * np.sign(np.sin(M))
+
+    # Iterate only on the elements that have not converged yet
+    shape = E.shape
+    E, M, e = E.ravel(), M.ravel(), np.ascontiguousarray(e).ravel()
+    active = np.arange(E.size)
+    for _ in range(max_iter):
+        Ea, ea = E[active], e[active]
+        step = (Ea - ea * np.sin(Ea) - M[active]) / (1.0 - ea * np.cos(Ea))
+        E[active] = Ea - step
+        active = active[np.abs(step) >= tol]
+        if active.size == 0:
+            break
+    return E.reshape(shape)
+
+
+def perifocal_basis(i, om, w):
+    """
+    Unit vectors P (toward perihelion) and Q in ecliptic coordinates,
+    shape (N, 3) each; angles in degrees.
+    """
+    i, om, w = np.radians(i), np.radians(om), np.radians(w)
+    cos_om, sin_om = np.cos(om), np.sin(om)
+    cos_i, sin_i = np.cos(i), np.sin(i)
+    cos_w, sin_w = np.cos(w), np.sin(w)
+    P = np.stack([
+        cos_om * cos_w - sin_om * sin_w * cos_i,
+        sin_om * cos_w + cos_om * sin_w * cos_i,
+        sin_w * sin_i,
+    ], axis=-1)
+    Q = np.stack([
+        -cos_om * sin_w - sin_om * cos_w * cos_i,
+        -sin_om * sin_w + cos_om * cos_w * cos_i,
+        cos_w * sin_i,
+    ], axis=-1)
+    return P, Q
+
+
+def mean_motion(a, per=None):
+    """Mean motion in degrees/day, from the period where known, else from a"""
+    n = np.degrees(GAUSS_K * np.asarray(a, dtype=np.float64) ** -1.5)
+    if per is None:
+        return n
+    per = np.asarray(per, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(per > 0, 360.0 / per, n)
+
+
+def positions(elements, epochs):
+    """
+    Heliocentric ecliptic positions (AU) of N orbits at M Julian dates.
+
+    elements: dict of arrays a (AU), e, i, om, w, ma (degrees), plus
+    optional epoch (JD of ma; defaults to the first requested epoch) and
+    n (deg/day) or per (days). Returns float32 of shape (N, M, 3); orbits
+    with e >= 1 or a <= 0 come back as NaN.
+    """
+    a = np.asarray(elements['a'], dtype=np.float64)
+    e = np.asarray(elements['e'], dtype=np.float64)
+    epochs = np.asarray(epochs, dtype=np.float64)
+    epoch0 = np.asarray(elements.get('epoch', epochs[0]), dtype=np.float64)
+    n = elements.get('n')
+    n = np.asarray(n, dtype=np.float64) if n is not None else mean_motion(a, elements.get('per'))
+
+    bound = (e >= 0) & (e < 1) & (a > 0)
+    e_safe = np.where(bound, e, 0.0)[:, None]
+    a_safe = np.where(bound, a, 1.0)[:, None]
+
+    M = np.radians(np.asarray(elements['ma'], dtype=np.float64)[:, None]
+                   + np.broadcast_to(n, a.shape)[:, None] * (epochs[None, :] - np.broadcast_to(epoch0, a.shape)[:, None]))
+    E = solve_kepler(M, e_safe)
+
+    # Perifocal coordinates, then rotate with the P/Q basis one axis at a time
+    x_orb = a_safe * (np.cos(E) - e_safe)
+    y_orb = (a_safe * np.sqrt(1.0 - e_safe ** 2)) * np.sin(E)
+    P, Q = perifocal_basis(elements['i'], elements['om'], elements['w'])
+    out = np.empty(E.shape + (3,), dtype=np.float32)
+    for axis in range(3):
+        out[..., axis] = x_orb * P[:, axis, None] + y_orb * Q[:, axis, None]
+    out[~bound] = np.nan
+    return out
+
+
+def epoch_grid(start_jd, stop_jd, step_days):
+    """Julian dates from start to stop inclusive"""
+    if step_days <= 0:
+        raise ValueError('step must be positive')
+    count = int(np.floor((stop_jd - start_jd) / step_days + 1e-9)) + 1
+    if count < 1:
+        raise ValueError('stop must not be before start')
+    if count > MAX_EPOCHS:
+        raise ValueError(f'Too many epochs ({count} > {MAX_EPOCHS})')
+    return start_jd + step_days * np.arange(count)
+
+
+def parse_request(data, catalog=None):
+    """
+    Validate an ephemeris request:
+      {"orbits": [{"a", "e", "i", "om", "w", "ma", "epoch", "per"?}, ...]
+         or "spkids": [...] (looked up in the local catalog),
+       "start": JD, "stop": JD, "step": days}
+    Returns (ids, elements, epochs). Raises ValueError.
+
+    Every orbit needs the epoch (JD) its mean anomaly refers to; without it
+    positions would be computed as if ma held at the start date.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+    try:
+        start = float(data['start'])
+        stop = float(data.get('stop', start))
+        step = float(data.get('step', 1.0))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('start (and optional stop, step) must be Julian dates / days')
+    epochs = epoch_grid(start, stop, step)
+
+    if 'spkids' in data:
+        if catalog is None:
+            raise ValueError('spkids need the local catalog (NEO_CATALOG_DIR)')
+        ids = [str(s) for s in data['spkids']]
+        elements = catalog.snapshot().elements(ids)
+        missing = [f for f in ELEMENT_FIELDS + ('epoch',) if f not in elements]
+        if missing:
+            raise ValueError(f'Catalog lacks orbital element columns: {missing}')
+    else:
+        orbits = data.get('orbits')
+        if not isinstance(orbits, list) or not orbits:
+            raise ValueError('orbits must be a non-empty list')
+        try:
+            elements = {
+                field: np.asarray([float(o[field]) for o in orbits])
+                for field in ELEMENT_FIELDS + ('epoch',)
+            }
+            # per is optional per orbit; NaN makes mean_motion fall back to a
+            if any('per' in o for o in orbits):
+                elements['per'] = np.asarray([float(o.get('per', 'nan')) for o in orbits])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Each orbit needs numeric {", ".join(ELEMENT_FIELDS)} and epoch')
+        ids = [o.get('id', str(k)) for k, o in enumerate(orbits)]
+
+    if len(ids) > MAX_ORBITS:
+        raise ValueError(f'Too many orbits ({len(ids)} > {MAX_ORBITS})')
+    if len(ids) * len(epochs) > MAX_POINTS:
+        raise ValueError(f'Too many positions ({len(ids) * len(epochs)} > {MAX_POINTS})')
+    return ids, elements, epochs
+
+
+def encode(ids, epochs, xyz):
+    """JSON body with positions as base64 little-endian float32, shape (N, M, 3)"""
+    return {
+        'ids': ids,
+        'epochs': epochs.tolist(),
+        'shape': list(xyz.shape),
+        'dtype': 'float32',
+        'units': 'au',
+        'frame': 'heliocentric ecliptic J2000',
+        'positions': base64.b64encode(xyz.astype('<f4').tobytes()).decode('ascii'),
+    }
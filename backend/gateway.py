@@ -0,0 +1,272 @@
+"""
+One-round-trip simulation pipeline for /api/impact/simulate.
+
+js/simulation.js runs the terrain check, the infrastructure query, geocoding
+and the physics one after another from the browser. Here the preliminary
+physics (which only needs the meteor parameters) sizes the query area.
+Then a single merged Overpass query (land-feature count plus the impact
+summary) and a Nominatim reverse lookup run concurrently. Each stage has
+its own deadline; a stage that times out or fails is reported and replaced
+by the same defaults the frontend uses, and the final physics runs on
+whatever arrived.
+
+The upstream clients are blocking (requests), so stages run on a dedicated
+thread pool under asyncio. That pool is never joined at the end of a
+request, so a late upstream response cannot hold the response back.
+"""
+
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.cache import make_key
+from backend.impact import DEFAULT_ANGLE, DEFAULT_POPULATION_DENSITY, calculate_impact, validate_inputs
+from backend.metrics import PHASE_SECONDS, timed
+from backend.overpass_summary import ImpactSummary, iter_elements
+from backend.population import apply_to_impact as apply_population_grid
+from backend.upstream import get_upstream
+
+METERS_PER_DEGREE = 111320
+TERRAIN_RADIUS_M = 500
+MIN_QUERY_RADIUS_M = 1000
+MAX_QUERY_RADIUS_M = 50000
+
+DEFAULT_DEADLINES = {'overpass': 20.0, 'geocoding': 5.0}
+MAX_DEADLINE = 60.0
+CONNECT_TIMEOUT = 3.05
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='gateway')
+
+
+def _bbox(lat, lon, radius_m):
+    half_lat = radius_m / METERS_PER_DEGREE
+    half_lon = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - half_lat, lon - half_lon, lat + half_lat, lon + half_lon
+
+
+def merged_query(lat, lon, radius_m, timeout=25, terrain=True):
+    """
+    Terrain check (checkIfOceanImpact) and impact summary in one Overpass
+    query: the land-feature set is reported with `out count`, followed by
+    the summary elements with `out center`. terrain=False leaves out the
+    terrain check (when the local land mask answers it).
+    """
+    area = '{:.6f},{:.6f},{:.6f},{:.6f}'.format(*_bbox(lat, lon, radius_m))
+    terrain_part = ''
+    if terrain:
+        box = '{:.6f},{:.6f},{:.6f},{:.6f}'.format(*_bbox(lat, lon, TERRAIN_RADIUS_M))
+        terrain_part = f"""
+    (
+      node["building"]({box});
+      way["building"]({box});
+      way["highway"]({box});
+      way["landuse"]({box});
+      node["place"]({box});
+    );
+    out count;"""
+    return f"""
+    [out:json][timeout:{timeout}];{terrain_part}
+    (
+      node["building"]({area});
+      way["building"]({area});
+      node["amenity"]({area});
+      way["amenity"]({area});
+      node["population"]({area});
+      way["population"]({area});
+      relation["population"]({area});
+      node["place"~"city|town|village|suburb|neighbourhood"]({area});
+      way["place"~"city|town|village|suburb|neighbourhood"]({area});
+    );
+    out center;
+    """
+
+
+def _chunks_until(response, stop_at, chunk_size=64 * 1024):
+    """Body chunks as they arrive; raises TimeoutError once the monotonic clock passes stop_at"""
+    while True:
+        # read1 returns after a single socket read, so a trickling body is checked often
+        chunk = response.raw.read1(chunk_size, decode_content=True)
+        if not chunk:
+            return
+        if time.monotonic() >= stop_at:
+            raise TimeoutError('Overpass response not complete within the stage deadline')
+        yield chunk
+
+
+def fetch_overpass(lat, lon, radius_m, deadline, terrain=True):
+    """Run the merged query; returns {landFeatures, isOceanImpact, summary}"""
+    # The read timeout only bounds each read; a trickling body is cut off at the
+    # stage deadline so it does not hold a thread and an upstream slot past it
+    stop_at = time.monotonic() + deadline
+    response = get_upstream('overpass').post(
+        data={'data': merged_query(lat, lon, radius_m, timeout=max(1, int(deadline)), terrain=terrain)},
+        stream=True, timeout=(CONNECT_TIMEOUT, deadline))
+    try:
+        response.raise_for_status()
+        land_features = None
+        summary = ImpactSummary()
+        for element in iter_elements(_chunks_until(response, stop_at)):
+            if element.get('type') == 'count':
+                land_features = int(element.get('tags', {}).get('total', 0))
+            else:
+                summary.add(element)
+    finally:
+        response.close()
+    return {
+        'landFeatures': land_features,
+        # Same rule as checkIfOceanImpact: no land features within 500 m means water
+        'isOceanImpact': land_features == 0 if terrain else None,
+        'summary': summary.result(),
+    }
+
+
+def fetch_reverse_geocoding(lat, lon, deadline, flight=None, gazetteer=None):
+    """Reverse lookup (local gazetteer first, then Nominatim); returns the display name and address parts"""
+    if gazetteer is not None:
+        place = gazetteer.reverse(lat, lon)
+        if place is not None:
+            return {'displayName': place['display_name'], 'address': place['address']}
+
+    params = {'format': 'json', 'lat': f'{lat:.5f}', 'lon': f'{lon:.5f}', 'zoom': 10}
+
+    def fetch():
+        response = get_upstream('nominatim').get(
+            'reverse', params=params, timeout=(CONNECT_TIMEOUT, deadline))
+        response.raise_for_status()
+        return response.content
+
+    body = flight.do(make_key('reverse', params), fetch) if flight else fetch()
+    data = json.loads(body)
+    return {
+        'displayName': data.get('display_name'),
+        'address': data.get('address', {}),
+    }
+
+
+async def _stage(name, deadline, fn, *args):
+    """Run a blocking stage with a deadline; returns (name, report, value or None)"""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        value = await asyncio.wait_for(loop.run_in_executor(_executor, fn, *args), deadline)
+        report = {'status': 'ok'}
+    except asyncio.TimeoutError:
+        value, report = None, {'status': 'timeout', 'deadline': deadline}
+    except Exception as e:
+        value, report = None, {'status': 'error', 'error': str(e)}
+    elapsed = time.perf_counter() - start
+    PHASE_SECONDS.observe(elapsed, phase=f'simulate.{name}')
+    report['elapsedMs'] = round(elapsed * 1000, 1)
+    return name, report, value
+
+
+def parse_request(data):
+    """Validate a simulate request; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+    for field in ('lat', 'lon', 'diameter', 'velocity', 'density'):
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+    try:
+        params = {
+            'lat': float(data['lat']),
+            'lon': float(data['lon']),
+            'diameter': float(data['diameter']),
+            'velocity': float(data['velocity']),
+            'angle': float(data.get('angle', DEFAULT_ANGLE)),
+            'density': str(data['density']),
+        }
+    except (TypeError, ValueError):
+        raise ValueError('lat, lon, diameter, velocity and angle must be numbers')
+    if not (-90 <= params['lat'] <= 90 and -180 <= params['lon'] <= 180):
+        raise ValueError('lat/lon out of range')
+    validate_inputs(params['diameter'], params['velocity'], params['angle'])
+
+    deadlines = dict(DEFAULT_DEADLINES)
+    requested = data.get('deadlines') or {}
+    if not isinstance(requested, dict):
+        raise ValueError('deadlines must be an object of stage: seconds')
+    for stage, value in requested.items():
+        if stage not in deadlines:
+            raise ValueError(f'Unknown stage: {stage}')
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'deadlines.{stage} must be a number of seconds')
+        if not (math.isfinite(seconds) and seconds > 0):
+            raise ValueError(f'deadlines.{stage} must be a positive number of seconds')
+        deadlines[stage] = min(MAX_DEADLINE, max(0.1, seconds))
+    params['deadlines'] = deadlines
+    return params
+
+
+async def simulate(params, geocoding_flight=None, landmask=None, population_grid=None, gazetteer=None):
+    """
+    Run the whole pipeline; always returns a result, with per-stage status.
+    With a land mask the terrain comes from it instead of the Overpass count,
+    and with a population grid casualties come from the people in each ring
+    instead of the density of tagged Overpass places. With a gazetteer the
+    location is looked up locally, falling back to Nominatim far from any place.
+    """
+    start = time.perf_counter()
+    lat, lon = params['lat'], params['lon']
+    meteor = (params['diameter'], params['velocity'], params['density'])
+
+    # Preliminary physics sizes the query area (blast radii don't depend on terrain)
+    preliminary = calculate_impact(*meteor, angle=params['angle'])
+    radius_m = min(MAX_QUERY_RADIUS_M, max(preliminary['totalDestructionZone'] * 1000, MIN_QUERY_RADIUS_M))
+
+    deadlines = params['deadlines']
+    results = await asyncio.gather(
+        _stage('overpass', deadlines['overpass'], fetch_overpass, lat, lon, radius_m, deadlines['overpass'],
+               landmask is None),
+        _stage('geocoding', deadlines['geocoding'], fetch_reverse_geocoding, lat, lon,
+               deadlines['geocoding'], geocoding_flight, gazetteer),
+    )
+    stages = {name: report for name, report, _ in results}
+    values = {name: value for name, _, value in results}
+
+    overpass = values['overpass']
+    if landmask is not None:
+        terrain = {'source': 'landmask', 'isOceanImpact': not landmask.is_land(lat, lon)}
+    elif overpass is not None:
+        terrain = {'source': 'overpass', 'landFeatures': overpass['landFeatures'],
+                   'isOceanImpact': overpass['isOceanImpact']}
+    else:
+        terrain = None
+    is_ocean_impact = bool(terrain and terrain['isOceanImpact'])
+    population_density = DEFAULT_POPULATION_DENSITY
+    if overpass and overpass['summary']['totalPopulation'] > 0:
+        # Population of the queried square over its area
+        area_km2 = (2 * radius_m / 1000) ** 2
+        population_density = overpass['summary']['totalPopulation'] / area_km2
+
+    physics_start = time.perf_counter()
+    with timed('simulate.physics'):
+        effects = calculate_impact(*meteor, population_density=population_density,
+                                   angle=params['angle'], is_ocean_impact=is_ocean_impact)
+        if population_grid is not None:
+            apply_population_grid(population_grid, lat, lon, effects)
+    stages['physics'] = {'status': 'ok', 'elapsedMs': round((time.perf_counter() - physics_start) * 1000, 1)}
+
+    return {
+        'effects': effects,
+        'parameters': {
+            'diameter': params['diameter'],
+            'velocity': params['velocity'],
+            'angle': params['angle'],
+            'density': params['density'],
+            'populationDensity': population_density,
+            'isOceanImpact': is_ocean_impact,
+        },
+        'coordinates': {'lat': lat, 'lon': lon},
+        'queryRadius': radius_m,
+        'location': values['geocoding'],
+        'terrain': terrain,
+        'infrastructure': None if overpass is None else overpass['summary'],
+        'partial': any(s['status'] != 'ok' for s in stages.values()),
+        'stages': stages,
+        'elapsedMs': round((time.perf_counter() - start) * 1000, 1),
+    }
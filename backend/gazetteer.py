@@ -0,0 +1,381 @@
+"""
+Local gazetteer for forward (city search, autocomplete) and reverse geocoding.
+
+Built once from a GeoNames dump (cities500.txt, cities15000.txt or
+allCountries.txt). The optional admin1CodesASCII.txt and countryInfo.txt
+files supply region and country names. The result is a directory of NumPy
+files that every worker memory-maps:
+
+    <dir>/meta.json            counts, grid size, country and region names
+    <dir>/lat.npy, lon.npy     place coordinates, stored in grid-cell order
+    <dir>/cells.npy            start offset of each 1° cell (spatial index)
+    <dir>/keys.npy             sorted normalized names (prefix index)
+    <dir>/key_place.npy        place for each key
+    <dir>/names.bin            UTF-8 names, sliced by name_offsets.npy
+    ...
+
+Reverse lookups scan the grid cells within a radius of the point,
+doubling the radius until a place is found inside it. Prefix searches are
+two binary searches over the sorted keys. Both take well under a
+millisecond.
+
+    python -m backend.gazetteer build cities500.txt gazetteer \\
+        --admin1 admin1CodesASCII.txt --countries countryInfo.txt
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import time
+import unicodedata
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 1.0
+# Names are indexed on their first KEY_BYTES bytes (normalized UTF-8)
+KEY_BYTES = 48
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+MAX_REVERSE_KM = 100.0
+# Reverse lookups search this radius first and double it until a place is found
+REVERSE_START_KM = 10.0
+LICENCE = 'Data © GeoNames, CC BY 4.0'
+
+
+def normalize(text):
+    """Case- and accent-insensitive form used for keys and queries"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+
+def _key(text):
+    return normalize(text).encode('utf-8')[:KEY_BYTES]
+
+
+def place_type(population):
+    """Nominatim-style place type from population"""
+    if population >= 100000:
+        return 'city'
+    if population >= 10000:
+        return 'town'
+    return 'village'
+
+
+class Gazetteer:
+    """Memory-mapped place index built by build()"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+        self.lat, self.lon = load('lat'), load('lon')
+        self.population = load('population')
+        self.geonameid = load('geonameid')
+        self.country = load('country')
+        self.admin1 = load('admin1')
+        self.name_offsets = load('name_offsets')
+        self.cells = load('cells')
+        self.keys, self.key_place = load('keys'), load('key_place')
+        self.names = np.memmap(os.path.join(path, 'names.bin'), dtype=np.uint8, mode='r') \
+            if self.name_offsets[-1] else np.zeros(0, dtype=np.uint8)
+
+        self.cell_deg = self.meta['cellDeg']
+        self.grid_rows = int(round(180 / self.cell_deg))
+        self.grid_cols = int(round(360 / self.cell_deg))
+        self.countries = self.meta['countries']
+        self.admin1_names = self.meta['admin1']
+        # Normalized region/country names for qualifiers ("Paris, Texas")
+        self._country_keys = {code: (code.casefold(), normalize(name)) for code, name in self.countries.items()}
+        self._admin1_keys = [normalize(name) for name in self.admin1_names]
+
+    @property
+    def count(self):
+        return len(self.lat)
+
+    def name(self, i):
+        start, stop = self.name_offsets[i], self.name_offsets[i + 1]
+        return bytes(self.names[start:stop]).decode('utf-8')
+
+    def _address(self, i):
+        population = int(self.population[i])
+        code = self.country[i].decode('ascii')
+        address = {place_type(population): self.name(i)}
+        if self.admin1[i] >= 0:
+            address['state'] = self.admin1_names[self.admin1[i]]
+        if code in self.countries:
+            address['country'] = self.countries[code]
+        address['country_code'] = code.lower()
+        return address
+
+    def place(self, i):
+        """One place in Nominatim's jsonv2-like search/reverse shape"""
+        address = self._address(i)
+        population = int(self.population[i])
+        kind = place_type(population)
+        parts = [address[kind]] + [address[k] for k in ('state', 'country') if k in address]
+        return {
+            'place_id': int(self.geonameid[i]),
+            'licence': LICENCE,
+            'lat': f'{self.lat[i]:.7f}',
+            'lon': f'{self.lon[i]:.7f}',
+            'display_name': ', '.join(parts),
+            'name': address[kind],
+            'class': 'place',
+            'type': kind,
+            'addresstype': kind,
+            'importance': round(min(1.0, math.log10(population + 1) / 8), 5),
+            'address': address,
+        }
+
+    def _qualifier_mask(self, candidates, qualifier):
+        """Candidates whose region or country name (or ISO code) starts with qualifier"""
+        codes = [code.encode('ascii') for code, (iso, name) in self._country_keys.items()
+                 if iso == qualifier or name.startswith(qualifier)]
+        if len(qualifier) == 2:
+            codes.append(qualifier.upper().encode('ascii'))
+        regions = [i for i, name in enumerate(self._admin1_keys) if name.startswith(qualifier)]
+        return (np.isin(self.country[candidates], codes)
+                | np.isin(self.admin1[candidates], regions))
+
+    def search(self, query, limit=DEFAULT_LIMIT, exact_first=True):
+        """
+        Places whose name starts with the first comma-separated part of
+        query; later parts must match the region or country. Exact names
+        rank first (unless exact_first is off, as for autocomplete), then
+        larger places.
+        """
+        parts = [normalize(p) for p in query.split(',')]
+        parts = [p for p in parts if p]
+        if not parts:
+            return []
+        prefix = parts[0].encode('utf-8')[:KEY_BYTES - 1]
+        lo = np.searchsorted(self.keys, prefix, side='left')
+        hi = np.searchsorted(self.keys, prefix + b'\xff', side='left')
+        candidates = np.unique(self.key_place[lo:hi])
+        for qualifier in parts[1:]:
+            candidates = candidates[self._qualifier_mask(candidates, qualifier)]
+        if not len(candidates):
+            return []
+
+        rank = -self.population[candidates].astype(np.float64)
+        if exact_first:
+            exact = self.keys[lo:hi] == parts[0].encode('utf-8')[:KEY_BYTES]
+            exact_places = np.unique(self.key_place[lo:hi][exact])
+            rank = np.where(np.isin(candidates, exact_places), rank - 1e12, rank)
+        take = min(limit, len(candidates))
+        top = np.argpartition(rank, take - 1)[:take]
+        top = top[np.argsort(rank[top], kind='stable')]
+        return [self.place(int(i)) for i in candidates[top]]
+
+    def _window(self, lat, lon, radius_km):
+        """Indexes of the places in every grid cell that a circle of radius_km can touch"""
+        delta = radius_km / EARTH_RADIUS_KM
+        north, south = lat + math.degrees(delta), lat - math.degrees(delta)
+        row0 = max(0, int((90.0 - north) / self.cell_deg))
+        row1 = min(self.grid_rows - 1, int((90.0 - south) / self.cell_deg))
+        cos_lat = math.cos(math.radians(lat))
+        if north >= 90 or south <= -90 or math.sin(delta) >= cos_lat:
+            spans = [(0, self.grid_cols)]
+        else:
+            half = math.degrees(math.asin(math.sin(delta) / cos_lat))
+            col0 = math.floor((lon - half + 180.0) / self.cell_deg)
+            col1 = math.floor((lon + half + 180.0) / self.cell_deg) + 1
+            if col1 - col0 >= self.grid_cols:
+                spans = [(0, self.grid_cols)]
+            elif col0 < 0:
+                spans = [(col0 + self.grid_cols, self.grid_cols), (0, col1)]
+            elif col1 > self.grid_cols:
+                spans = [(col0, self.grid_cols), (0, col1 - self.grid_cols)]
+            else:
+                spans = [(col0, col1)]
+        # Cells are stored row-major, so each row's column span is one slice of places
+        ranges = [(self.cells[row * self.grid_cols + a], self.cells[row * self.grid_cols + b])
+                  for row in range(row0, row1 + 1) for a, b in spans]
+        return np.concatenate([np.arange(a, b) for a, b in ranges] or [np.zeros(0, dtype=np.int64)])
+
+    def nearest(self, lat, lon, max_km=MAX_REVERSE_KM):
+        """(index, distance_km) of the closest place within max_km, or None"""
+        phi, lam = math.radians(lat), math.radians(lon)
+        radius = min(REVERSE_START_KM, max_km)
+        while True:
+            candidates = self._window(lat, lon, radius)
+            if len(candidates):
+                lat_c = np.radians(self.lat[candidates])
+                a = (np.sin((lat_c - phi) / 2) ** 2
+                     + math.cos(phi) * np.cos(lat_c) * np.sin((np.radians(self.lon[candidates]) - lam) / 2) ** 2)
+                km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+                i = int(np.argmin(km))
+                # Anything closer would lie inside the window just searched
+                if km[i] <= radius:
+                    return int(candidates[i]), float(km[i])
+            if radius >= max_km:
+                return None
+            radius = min(2 * radius, max_km)
+
+    def reverse(self, lat, lon, max_km=MAX_REVERSE_KM):
+        """Nearest place in the Nominatim reverse shape (plus distanceKm), or None"""
+        found = self.nearest(lat, lon, max_km)
+        if found is None:
+            return None
+        result = self.place(found[0])
+        result['distanceKm'] = round(found[1], 3)
+        return result
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'places': self.count,
+            'keys': int(len(self.keys)),
+            'source': self.meta.get('source'),
+        }
+
+
+def _read_admin1(path):
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            cols = line.rstrip('\n').split('\t')
+            if len(cols) >= 2:
+                names[cols[0]] = cols[1]
+    return names
+
+
+def _read_countries(path):
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            cols = line.rstrip('\n').split('\t')
+            if len(cols) > 4:
+                names[cols[0]] = cols[4]
+    return names
+
+
+def build(source, output, admin1=None, countries=None, min_population=0, alternates=False):
+    """Write the gazetteer directory from a GeoNames dump; returns the place count"""
+    admin1_names = _read_admin1(admin1) if admin1 else {}
+    country_names = _read_countries(countries) if countries else {}
+
+    lat, lon, population, geonameid, country, region, names, keys = [], [], [], [], [], [], [], []
+    regions = {}
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            cols = line.rstrip('\n').split('\t')
+            # Populated places only (feature class P)
+            if len(cols) < 15 or cols[6] != 'P':
+                continue
+            pop = int(cols[14] or 0)
+            if pop < min_population:
+                continue
+            index = len(lat)
+            lat.append(float(cols[4]))
+            lon.append(float(cols[5]))
+            population.append(pop)
+            geonameid.append(int(cols[0]))
+            country.append(cols[8])
+            region_name = admin1_names.get(f'{cols[8]}.{cols[10]}')
+            if region_name is None:
+                region.append(-1)
+            else:
+                region.append(regions.setdefault(region_name, len(regions)))
+            names.append(cols[1])
+            variants = {_key(cols[1]), _key(cols[2])}
+            if alternates and cols[3]:
+                variants.update(_key(name) for name in cols[3].split(','))
+            keys.extend((key, index) for key in variants if key)
+
+    lat, lon = np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64)
+    rows, cols = int(round(180 / CELL_DEG)), int(round(360 / CELL_DEG))
+    cell_row = np.clip(((90.0 - lat) / CELL_DEG).astype(np.int64), 0, rows - 1)
+    cell_col = np.floor((lon + 180.0) / CELL_DEG).astype(np.int64) % cols
+    cell = cell_row * cols + cell_col
+    order = np.argsort(cell, kind='stable')
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+
+    encoded = [names[i].encode('utf-8') for i in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(name) for name in encoded])
+
+    key_bytes = np.array([key for key, _ in keys], dtype=f'S{KEY_BYTES}')
+    key_place = position[np.array([index for _, index in keys], dtype=np.int64)].astype(np.int32)
+    key_order = np.argsort(key_bytes, kind='stable')
+
+    tmp = output + f'.tmp-{os.getpid()}'
+    os.makedirs(tmp)
+    columns = {
+        'lat': lat[order],
+        'lon': lon[order],
+        'population': np.array(population, dtype=np.int64)[order],
+        'geonameid': np.array(geonameid, dtype=np.int64)[order],
+        'country': np.array(country, dtype='S2')[order],
+        'admin1': np.array(region, dtype=np.int32)[order],
+        'name_offsets': offsets,
+        'cells': np.searchsorted(cell[order], np.arange(rows * cols + 1)).astype(np.int64),
+        'keys': key_bytes[key_order],
+        'key_place': key_place[key_order],
+    }
+    for name, values in columns.items():
+        np.save(os.path.join(tmp, name + '.npy'), values)
+    with open(os.path.join(tmp, 'names.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'count': len(lat),
+            'cellDeg': CELL_DEG,
+            'keyBytes': KEY_BYTES,
+            'countries': country_names,
+            'admin1': sorted(regions, key=regions.get),
+            'source': os.path.basename(source),
+            'built': time.time(),
+        }, f, ensure_ascii=False)
+
+    # Swap the finished directory into place
+    old = output + f'.old-{os.getpid()}'
+    if os.path.exists(output):
+        os.rename(output, old)
+    os.rename(tmp, output)
+    shutil.rmtree(old, ignore_errors=True)
+    return len(lat)
+
+
+def gazetteer_from_env():
+    """Gazetteer from GAZETTEER_DIR, or None when not configured or missing"""
+    path = os.environ.get('GAZETTEER_DIR')
+    if not path or not os.path.exists(os.path.join(path, 'meta.json')):
+        return None
+    return Gazetteer(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the local gazetteer')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='from a GeoNames dump (cities500.txt, allCountries.txt, ...)')
+    build_cmd.add_argument('source')
+    build_cmd.add_argument('output')
+    build_cmd.add_argument('--admin1', help='admin1CodesASCII.txt, for region names')
+    build_cmd.add_argument('--countries', help='countryInfo.txt, for country names')
+    build_cmd.add_argument('--min-population', type=int, default=0)
+    build_cmd.add_argument('--alternates', action='store_true',
+                           help='also index alternate names (much larger prefix index)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = build(args.source, args.output, admin1=args.admin1, countries=args.countries,
+                  min_population=args.min_population, alternates=args.alternates)
+    print(f'Indexed {count} places into {args.output} in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Impact effect calculations used by /api/impact/calculate and its batch variant.
+
+Both routes run the physics model in backend/physics.py (a port of
+js/calculations.js). calculate_impact() handles one scenario and returns
+plain Python values; calculate_impact_batch() evaluates NumPy arrays so
+thousands of scenarios cost one call.
+"""
+
+import numpy as np
+
+from backend import physics
+
+DEFAULT_POPULATION_DENSITY = 1000
+DEFAULT_ANGLE = 45
+
+MAX_BATCH_SIZE = 100000
+
+# Batch columns and their defaults (None = required)
+BATCH_FIELDS = {
+    'diameter': None,
+    'velocity': None,
+    'density': None,
+    'angle': DEFAULT_ANGLE,
+    'population_density': DEFAULT_POPULATION_DENSITY,
+    'is_ocean_impact': False,
+}
+
+
+def _with_zone_aliases(result):
+    # Older clients of /api/impact/calculate read these two radii at the top level
+    zones = result['casualties']['zones']
+    result['severeDestructionZone'] = zones['severeDestruction']
+    result['moderateDestructionZone'] = zones['moderateDestruction']
+    return result
+
+
+def calculate_impact(diameter, velocity, density, population_density=DEFAULT_POPULATION_DENSITY,
+                     angle=DEFAULT_ANGLE, is_ocean_impact=False):
+    """Effects for a single scenario (diameter in m, velocity in km/s, angle in degrees)"""
+    return _with_zone_aliases(physics.calculate_all_effects(
+        float(diameter), float(velocity), str(density), float(angle),
+        float(population_density), bool(is_ocean_impact)))
+
+
+def calculate_impact_batch(diameter, velocity, density, population_density=DEFAULT_POPULATION_DENSITY,
+                           angle=DEFAULT_ANGLE, is_ocean_impact=False):
+    """
+    Vectorized calculate_impact(). Inputs broadcast against each other;
+    returns the same structure with every leaf replaced by a NumPy array.
+    """
+    return _with_zone_aliases(physics.calculate_all_effects(
+        np.atleast_1d(np.asarray(diameter, dtype=np.float64)), velocity, density,
+        angle, population_density, is_ocean_impact))
+
+
+def parse_batch_request(data):
+    """
+    Turn a batch request body into keyword arrays for calculate_impact_batch().
+
+    Accepts either column arrays ({"diameter": [...], "velocity": [...],
+    "density": [...] or "stone", "angle": ..., "population_density": ...,
+    "is_ocean_impact": ...}) or a list of scenario objects
+    ({"scenarios": [{"diameter": ..., ...}, ...]}). Scalars broadcast.
+    Raises ValueError on malformed input.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+
+    if 'scenarios' in data:
+        scenarios = data['scenarios']
+        if not isinstance(scenarios, list) or not scenarios:
+            raise ValueError('scenarios must be a non-empty list')
+        if len(scenarios) > MAX_BATCH_SIZE:
+            raise ValueError(f'Batch too large ({len(scenarios)} > {MAX_BATCH_SIZE} scenarios)')
+        for i, scenario in enumerate(scenarios):
+            if not isinstance(scenario, dict):
+                raise ValueError(f'Scenario {i} must be an object')
+            for field, default in BATCH_FIELDS.items():
+                if default is None and field not in scenario:
+                    raise ValueError(f'Missing required field: {field} (scenario {i})')
+        columns = {
+            field: [s.get(field, default) for s in scenarios]
+            for field, default in BATCH_FIELDS.items()
+        }
+    else:
+        for field, default in BATCH_FIELDS.items():
+            if default is None and field not in data:
+                raise ValueError(f'Missing required field: {field}')
+        columns = {field: data.get(field, default) for field, default in BATCH_FIELDS.items()}
+
+    try:
+        arrays = {
+            'diameter': np.asarray(columns['diameter'], dtype=np.float64),
+            'velocity': np.asarray(columns['velocity'], dtype=np.float64),
+            'angle': np.asarray(columns['angle'], dtype=np.float64),
+            'population_density': np.asarray(columns['population_density'], dtype=np.float64),
+            'is_ocean_impact': np.asarray(columns['is_ocean_impact'], dtype=bool),
+        }
+    except (TypeError, ValueError):
+        raise ValueError('diameter, velocity, angle and population_density must be numbers')
+    arrays['density'] = np.asarray(columns['density'], dtype=object).astype(str)
+
+    try:
+        shape = np.broadcast_shapes(*(a.shape for a in arrays.values()))
+    except ValueError:
+        raise ValueError('Column arrays must have the same length')
+    if len(shape) > 1:
+        raise ValueError('Columns must be flat arrays')
+
+    size = shape[0] if shape else 1
+    if size > MAX_BATCH_SIZE:
+        raise ValueError(f'Batch too large ({size} > {MAX_BATCH_SIZE} scenarios)')
+
+    validate_inputs(arrays['diameter'], arrays['velocity'], arrays['angle'])
+    return {name: np.atleast_1d(a) for name, a in arrays.items()}
+
+
+def validate_inputs(diameter, velocity, angle):
+    """Reject values the model cannot handle (raises ValueError)"""
+    diameter, velocity, angle = np.asarray(diameter), np.asarray(velocity), np.asarray(angle)
+    if not np.all(np.isfinite(diameter) & (diameter > 0)):
+        raise ValueError('diameter must be a positive number of meters')
+    if not np.all(np.isfinite(velocity) & (velocity > 0)):
+        raise ValueError('velocity must be a positive number of km/s')
+    if not np.all((angle > 0) & (angle <= 90)):
+        raise ValueError('angle must be in (0, 90] degrees')
+
+
+def to_columns(result):
+    """Convert a batch result's arrays to JSON-serializable lists"""
+    if isinstance(result, dict):
+        return {key: to_columns(value) for key, value in result.items()}
+    return result.tolist()
@@ -0,0 +1,419 @@
+"""
+Background jobs for work that does not fit in a request.
+
+A job is submitted with a kind (registered by the app, e.g. 'sweep' or
+'overpass_summary') and its JSON parameters, and gets an id right away.
+Progress, cancellation and the result are read back by id. Jobs live in
+one SQLite file (WAL mode), so every gunicorn worker sees the same queue
+and a job that was running when its worker died is picked up again once
+its heartbeat goes stale.
+
+Workers are threads that claim the oldest job of the most urgent lane
+(high, normal, low). When there is more than one worker, one of them never
+takes low-lane jobs, so bulk work cannot hold up shorter jobs. Submissions
+beyond max_queued are refused (QueueFull, HTTP 429) instead of piling up.
+
+Cancellation and deadlines are cooperative: job functions call
+job.progress() or job.check() between steps, which raise JobCancelled or
+JobExpired. Heavy jobs compete with requests for the GIL, so for
+production run the workers in their own process and set JOB_WORKERS=0 for
+the web workers:
+
+    python -m backend.jobs server --workers 2
+
+Importing the app never starts workers; an entrypoint does (python
+server.py, the post_worker_init hook in gunicorn.conf.py, or the runner
+above), so processes that merely import the app, such as spawned Monte
+Carlo workers, stay out of the queue.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from backend.datadir import data_path
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+TERMINAL = (DONE, FAILED, CANCELLED, EXPIRED)
+
+LANES = {'high': 0, 'normal': 1, 'low': 2}
+
+DEFAULT_DEADLINE = 15 * 60
+MAX_DEADLINE = 6 * 60 * 60
+DEFAULT_MAX_QUEUED = 1000
+DEFAULT_RESULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_RETENTION = 24 * 60 * 60
+
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = 30.0          # a running job whose heartbeat is older belongs to a dead worker
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 0.5
+CHECK_INTERVAL = 0.5        # how often job.check() reads the cancel flag
+PROGRESS_INTERVAL = 0.25    # minimum time between progress writes
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are queued (maps to HTTP 429)"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobExpired(Exception):
+    pass
+
+
+class Job:
+    """Handle passed to job functions for progress reports and cancellation checks"""
+
+    def __init__(self, queue, job_id, deadline):
+        self.queue = queue
+        self.id = job_id
+        self.deadline = deadline
+        self.max_result_bytes = queue.result_max_bytes
+        self._last_check = 0.0
+        self._last_progress = 0.0
+
+    def check(self):
+        """Raise JobExpired past the deadline, JobCancelled once a cancel was requested"""
+        now = time.time()
+        if now > self.deadline:
+            raise JobExpired('Deadline exceeded')
+        if now - self._last_check >= CHECK_INTERVAL:
+            self._last_check = now
+            if self.queue._cancel_requested(self.id):
+                raise JobCancelled('Cancelled')
+
+    def progress(self, fraction, message=None):
+        """Record progress (0..1) and check for cancellation; writes are throttled"""
+        now = time.time()
+        if now - self._last_progress >= PROGRESS_INTERVAL or fraction >= 1:
+            self._last_progress = now
+            self.queue._set_progress(self.id, min(1.0, max(0.0, float(fraction))), message)
+        self.check()
+
+
+class JobQueue:
+    """Persistent priority queue plus the worker threads of this process"""
+
+    def __init__(self, path, workers=1, max_queued=DEFAULT_MAX_QUEUED,
+                 result_max_bytes=DEFAULT_RESULT_MAX_BYTES, retention=DEFAULT_RETENTION):
+        self.path = path
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_max_bytes = result_max_bytes
+        self.retention = retention
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._kinds = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._running = {}
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._last_maintenance = 0.0
+        self._completed = 0
+        self._failed = 0
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL,'
+                ' lane TEXT NOT NULL, priority INTEGER NOT NULL, state TEXT NOT NULL,'
+                ' progress REAL NOT NULL DEFAULT 0, message TEXT,'
+                ' result BLOB, result_type TEXT, error TEXT,'
+                ' created REAL NOT NULL, started REAL, finished REAL, deadline REAL NOT NULL,'
+                ' owner TEXT, heartbeat REAL, attempts INTEGER NOT NULL DEFAULT 0,'
+                ' cancel_requested INTEGER NOT NULL DEFAULT 0, client TEXT)')
+            # Queues created before jobs were scoped to the submitting client
+            if 'client' not in {row[1] for row in db.execute('PRAGMA table_info(jobs)')}:
+                db.execute('ALTER TABLE jobs ADD COLUMN client TEXT')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (state, priority, created)')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client, created)')
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not shareable across threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def register(self, kind, run, validate=None):
+        """
+        run(params, job) returns a JSON-serializable result or (bytes, mimetype).
+        validate(params) runs at submission and raises ValueError for bad input.
+        """
+        self._kinds[kind] = (run, validate)
+
+    # Client side
+    #
+    # Jobs belong to the client (session id) that submitted them. The read and
+    # cancel methods take that client and treat other clients' jobs as unknown;
+    # client=None skips the check and is for the queue's own use.
+
+    def submit(self, kind, params, lane='normal', deadline=None, client=None):
+        """Queue a job for client; returns its status. Raises ValueError or QueueFull"""
+        if kind not in self._kinds:
+            raise ValueError(f'Unknown job kind: {kind}')
+        if lane not in LANES:
+            raise ValueError(f'lane must be one of: {", ".join(LANES)}')
+        try:
+            deadline = DEFAULT_DEADLINE if deadline is None else float(deadline)
+        except (TypeError, ValueError):
+            raise ValueError('deadline must be a number of seconds')
+        if not 0 < deadline <= MAX_DEADLINE:
+            raise ValueError(f'deadline must be in (0, {MAX_DEADLINE}] seconds')
+        # Every kind takes a JSON object; validators can rely on that
+        if not isinstance(params, dict):
+            raise ValueError('params must be a JSON object')
+        validate = self._kinds[kind][1]
+        if validate is not None:
+            validate(params)
+
+        db = self._connect()
+        queued = db.execute('SELECT COUNT(*) FROM jobs WHERE state = ?', (QUEUED,)).fetchone()[0]
+        if queued >= self.max_queued:
+            raise QueueFull(f'{queued} jobs already queued')
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        db.execute(
+            'INSERT INTO jobs (id, kind, params, lane, priority, state, created, deadline, client)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, json.dumps(params), lane, LANES[lane], QUEUED, now, now + deadline, client))
+        self._wake.set()
+        return self.get(job_id)
+
+    @staticmethod
+    def _scope(job_id, client):
+        if client is None:
+            return 'id = ?', (job_id,)
+        return 'id = ? AND client = ?', (job_id, client)
+
+    def get(self, job_id, client=None):
+        """Status dict for a job, or None"""
+        where, args = self._scope(job_id, client)
+        row = self._connect().execute(
+            'SELECT id, kind, lane, state, progress, message, error, created, started, finished,'
+            ' deadline, attempts, result_type, length(result) FROM jobs WHERE ' + where, args).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0], 'kind': row[1], 'lane': row[2], 'state': row[3],
+            'progress': row[4], 'message': row[5], 'error': row[6],
+            'created': row[7], 'started': row[8], 'finished': row[9], 'deadline': row[10],
+            'attempts': row[11], 'resultType': row[12], 'resultBytes': row[13],
+        }
+
+    def list(self, client, state=None, limit=50):
+        """A client's most recent jobs"""
+        db = self._connect()
+        if state:
+            rows = db.execute('SELECT id FROM jobs WHERE client = ? AND state = ? ORDER BY created DESC LIMIT ?',
+                              (client, state, limit))
+        else:
+            rows = db.execute('SELECT id FROM jobs WHERE client = ? ORDER BY created DESC LIMIT ?', (client, limit))
+        return [self.get(job_id) for job_id, in rows.fetchall()]
+
+    def result(self, job_id, client=None):
+        """(body, mimetype) of a finished job, or None"""
+        where, args = self._scope(job_id, client)
+        row = self._connect().execute(
+            'SELECT result, result_type FROM jobs WHERE state = ? AND ' + where, (DONE,) + args).fetchone()
+        return None if row is None else (bytes(row[0]), row[1])
+
+    def cancel(self, job_id, client=None):
+        """Cancel a queued job now, or ask a running one to stop; returns its status or None"""
+        where, args = self._scope(job_id, client)
+        now = time.time()
+        db = self._connect()
+        db.execute('UPDATE jobs SET state = ?, finished = ?, error = ? WHERE state = ? AND ' + where,
+                   (CANCELLED, now, 'Cancelled', QUEUED) + args)
+        db.execute('UPDATE jobs SET cancel_requested = 1 WHERE state = ? AND ' + where, (RUNNING,) + args)
+        return self.get(job_id, client)
+
+    def watch(self, job_id, client=None, interval=POLL_INTERVAL, timeout=None):
+        """Yield the job's status whenever it changes, until it reaches a terminal state"""
+        last = None
+        stop_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.get(job_id, client)
+            if status is None:
+                return
+            if status != last:
+                yield status
+                last = status
+            if status['state'] in TERMINAL or (stop_at is not None and time.monotonic() >= stop_at):
+                return
+            time.sleep(interval)
+
+    # Worker side
+
+    def start(self, workers=None):
+        """Start this process's worker threads and heartbeat"""
+        if workers is not None:
+            self.workers = workers
+        for n in range(self.workers):
+            # With several workers the first one stays free for the high and normal lanes
+            max_priority = LANES['normal'] if n == 0 and self.workers > 1 else LANES['low']
+            thread = threading.Thread(target=self._work, args=(max_priority,), name=f'job-worker-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.workers:
+            thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _work(self, max_priority):
+        while not self._stop.is_set():
+            self._maintain()
+            claimed = self._claim(max_priority)
+            if claimed is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run(*claimed)
+
+    def _claim(self, max_priority):
+        now = time.time()
+        row = self._connect().execute(
+            'UPDATE jobs SET state = ?, started = ?, heartbeat = ?, owner = ?, attempts = attempts + 1'
+            ' WHERE id = (SELECT id FROM jobs WHERE state = ? AND priority <= ?'
+            '             ORDER BY priority, created LIMIT 1)'
+            ' RETURNING id, kind, params, lane, deadline',
+            (RUNNING, now, now, self.owner, QUEUED, max_priority)).fetchone()
+        return row
+
+    def _run(self, job_id, kind, params, lane, deadline):
+        with self._lock:
+            self._running[job_id] = lane
+        job = Job(self, job_id, deadline)
+        state, result, result_type, error = FAILED, None, None, None
+        try:
+            if kind not in self._kinds:
+                raise ValueError(f'Unknown job kind: {kind}')
+            job.check()
+            value = self._kinds[kind][0](json.loads(params), job)
+            if isinstance(value, tuple):
+                result, result_type = value
+            else:
+                result, result_type = json.dumps(value, separators=(',', ':')).encode('utf-8'), 'application/json'
+            if len(result) > self.result_max_bytes:
+                raise ValueError(f'Result too large ({len(result)} > {self.result_max_bytes} bytes)')
+            state = DONE
+        except JobCancelled as e:
+            state, error = CANCELLED, str(e)
+        except JobExpired as e:
+            state, error = EXPIRED, str(e)
+        except Exception as e:
+            state, error, result = FAILED, str(e) or type(e).__name__, None
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                if state == DONE:
+                    self._completed += 1
+                elif state == FAILED:
+                    self._failed += 1
+
+        self._connect().execute(
+            'UPDATE jobs SET state = ?, result = ?, result_type = ?, error = ?, finished = ?,'
+            ' progress = CASE WHEN ? THEN 1 ELSE progress END WHERE id = ? AND owner = ?',
+            (state, result, result_type, error, time.time(), state == DONE, job_id, self.owner))
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                ids = list(self._running)
+            if ids:
+                self._connect().executemany(
+                    'UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ?',
+                    [(time.time(), job_id, self.owner) for job_id in ids])
+
+    def _maintain(self):
+        """Requeue jobs of dead workers, expire overdue queued jobs and drop old finished ones"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_maintenance < POLL_INTERVAL:
+                return
+            self._last_maintenance = now
+        db = self._connect()
+        stale = now - STALE_AFTER
+        db.execute('UPDATE jobs SET state = ?, finished = ?, error = ? WHERE state = ? AND heartbeat < ?'
+                   ' AND attempts >= ?', (FAILED, now, 'Worker lost', RUNNING, stale, MAX_ATTEMPTS))
+        db.execute('UPDATE jobs SET state = ?, owner = NULL WHERE state = ? AND heartbeat < ?',
+                   (QUEUED, RUNNING, stale))
+        db.execute('UPDATE jobs SET state = ?, finished = ?, error = ? WHERE state = ? AND deadline < ?',
+                   (EXPIRED, now, 'Deadline passed while queued', QUEUED, now))
+        db.execute('DELETE FROM jobs WHERE finished < ? AND state IN (?, ?, ?, ?)',
+                   (now - self.retention, *TERMINAL))
+
+    def _cancel_requested(self, job_id):
+        row = self._connect().execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def _set_progress(self, job_id, fraction, message):
+        self._connect().execute(
+            'UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat = ? WHERE id = ? AND owner = ?',
+            (fraction, message, time.time(), job_id, self.owner))
+
+    def stats(self):
+        counts = dict(self._connect().execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        with self._lock:
+            return {
+                'path': self.path,
+                'workers': self.workers,
+                'maxQueued': self.max_queued,
+                **{state: counts.get(state, 0) for state in (QUEUED, RUNNING) + TERMINAL},
+                'runningHere': len(self._running),
+                'completedHere': self._completed,
+                'failedHere': self._failed,
+            }
+
+
+def job_queue_from_env():
+    """
+    Queue at JOB_QUEUE_PATH (default jobs.db in DATA_DIR) with JOB_WORKERS threads in
+    this process (default 1; 0 when a separate runner does the work) and
+    at most JOB_QUEUE_MAX queued jobs.
+    """
+    path = os.environ.get('JOB_QUEUE_PATH') or data_path('jobs.db')
+    return JobQueue(path, workers=int(os.environ.get('JOB_WORKERS', 1)),
+                    max_queued=int(os.environ.get('JOB_QUEUE_MAX', DEFAULT_MAX_QUEUED)),
+                    result_max_bytes=int(os.environ.get('JOB_RESULT_MAX_BYTES', DEFAULT_RESULT_MAX_BYTES)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background job workers outside the web server')
+    parser.add_argument('app', help='module that defines job_queue and registers the job kinds (e.g. server)')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    queue = importlib.import_module(args.app).job_queue
+    queue.start(args.workers)
+    print(f'{args.workers} job workers on {queue.path}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        queue.stop()
+
+
+if __name__ == '__main__':
+    main()
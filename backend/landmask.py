@@ -0,0 +1,213 @@
+"""
+Offline land/sea mask replacing the Overpass-based ocean check.
+
+The mask is a global equirectangular raster, one bit per cell (1 = land),
+row 0 at 90°N and column 0 at 180°W, stored as a packed uint8 .npy file so
+it can be memory-mapped and shared by every worker. At the default 2
+arc-minute resolution (~3.7 km) the whole planet takes about 7 MB.
+
+Build it once from land polygons (e.g. Natural Earth ne_10m_land.geojson)
+or from any boolean .npy raster with the same orientation:
+
+    python -m backend.landmask build ne_10m_land.geojson landmask.npy
+    python -m backend.landmask build land.npy landmask.npy
+
+Lookups are a few array indexing operations, vectorized for batches.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_RESOLUTION_ARCMIN = 2.0
+BAND_ROWS = 256
+MAX_BATCH_POINTS = 1_000_000
+
+
+class LandMask:
+    """Memory-mapped, bit-packed land/sea raster"""
+
+    def __init__(self, path):
+        self.path = path
+        self.bits = np.load(path, mmap_mode='r')
+        self.rows = self.bits.shape[0]
+        with open(path + '.json') as f:
+            self.meta = json.load(f)
+        self.cols = self.meta['cols']
+        self.cell_deg = 180.0 / self.rows
+
+    def _index(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        row = np.clip(((90.0 - lat) / self.cell_deg).astype(np.int64), 0, self.rows - 1)
+        col = (np.floor((lon + 180.0) / self.cell_deg).astype(np.int64)) % self.cols
+        return row, col
+
+    def is_land(self, lat, lon):
+        """Boolean array (or bool for scalars): True where the cell is land"""
+        row, col = self._index(lat, lon)
+        byte = self.bits[row, col >> 3]
+        land = ((byte >> (7 - (col & 7))) & 1).astype(bool)
+        return bool(land) if land.ndim == 0 else land
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'rows': self.rows,
+            'cols': self.cols,
+            'resolutionArcmin': self.cell_deg * 60,
+            'bytes': int(self.bits.nbytes),
+            'source': self.meta.get('source'),
+        }
+
+
+def _rings(geojson):
+    """Yield every polygon ring (as an (n, 2) lon/lat array) in a GeoJSON document"""
+    if geojson.get('type') == 'FeatureCollection':
+        geometries = [f['geometry'] for f in geojson['features'] if f.get('geometry')]
+    elif geojson.get('type') == 'Feature':
+        geometries = [geojson['geometry']]
+    else:
+        geometries = [geojson]
+    for geometry in geometries:
+        if geometry['type'] == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+        for polygon in polygons:
+            for ring in polygon:
+                yield np.asarray(ring, dtype=np.float64)[:, :2]
+
+
+def rasterize(geojson, rows, cols):
+    """
+    Even-odd scanline fill of all polygon rings at cell centers; returns a
+    packed (rows, cols / 8) uint8 array. Holes (lakes) come out as water
+    and islands inside them as land.
+    """
+    cell = 180.0 / rows
+    x0, y0, x1, y1 = [], [], [], []
+    for ring in _rings(geojson):
+        if len(ring) < 3:
+            continue
+        start, end = ring, np.roll(ring, -1, axis=0)
+        x0.append(start[:, 0]), y0.append(start[:, 1])
+        x1.append(end[:, 0]), y1.append(end[:, 1])
+    x0, y0, x1, y1 = (np.concatenate(v) for v in (x0, y0, x1, y1))
+
+    # Edges in raster coordinates: fractional row/col where cell centers sit at k + 0.5
+    r0, r1 = (90.0 - y0) / cell, (90.0 - y1) / cell
+    c0, c1 = (x0 + 180.0) / cell, (x1 + 180.0) / cell
+    top, bottom = np.minimum(r0, r1), np.maximum(r0, r1)
+    # Rows whose center k + 0.5 lies in [top, bottom): half-open so vertices count once
+    first = np.ceil(top - 0.5).astype(np.int64)
+    last = np.ceil(bottom - 0.5).astype(np.int64)
+    spans = np.maximum(last - first, 0)
+    edges = np.flatnonzero(spans)
+
+    packed = np.zeros((rows, cols // 8), dtype=np.uint8)
+    edge_ids = np.repeat(edges, spans[edges])
+    row_ids = first[edge_ids] + (np.arange(len(edge_ids)) - np.repeat(np.cumsum(spans[edges]) - spans[edges], spans[edges]))
+    t = (row_ids + 0.5 - r0[edge_ids]) / (r1[edge_ids] - r0[edge_ids])
+    crossing = c0[edge_ids] + t * (c1[edge_ids] - c0[edge_ids])
+    # A crossing toggles every cell whose center lies to its right
+    toggle_col = np.clip(np.ceil(crossing - 0.5).astype(np.int64), 0, cols)
+
+    order = np.argsort(row_ids, kind='stable')
+    row_ids, toggle_col = row_ids[order], toggle_col[order]
+    valid = (row_ids >= 0) & (row_ids < rows)
+    row_ids, toggle_col = row_ids[valid], toggle_col[valid]
+
+    for band_start in range(0, rows, BAND_ROWS):
+        band_stop = min(band_start + BAND_ROWS, rows)
+        lo, hi = np.searchsorted(row_ids, [band_start, band_stop])
+        toggles = np.zeros((band_stop - band_start, cols + 1), dtype=np.uint8)
+        np.bitwise_xor.at(toggles, (row_ids[lo:hi] - band_start, toggle_col[lo:hi]), 1)
+        inside = np.bitwise_xor.accumulate(toggles[:, :cols], axis=1).astype(bool)
+        packed[band_start:band_stop] = np.packbits(inside, axis=1)
+    return packed
+
+
+def build(source, output, resolution_arcmin=DEFAULT_RESOLUTION_ARCMIN):
+    """Write output (.npy) and its .json sidecar from GeoJSON polygons or a boolean .npy raster"""
+    if source.endswith('.npy'):
+        raster = np.load(source).astype(bool)
+        rows, cols = raster.shape
+        if cols != 2 * rows or cols % 8:
+            raise ValueError('raster must be 2:1 (equirectangular) with a multiple of 8 columns')
+        packed = np.packbits(raster, axis=1)
+    else:
+        rows = int(round(180 * 60 / resolution_arcmin))
+        cols = 2 * rows
+        if cols % 8:
+            raise ValueError('resolution must give a multiple of 8 columns')
+        with open(source) as f:
+            packed = rasterize(json.load(f), rows, cols)
+
+    tmp = output + f'.tmp-{os.getpid()}.npy'
+    np.save(tmp, packed)
+    os.replace(tmp, output)
+    # Sidecar last and atomically, so readers never see metadata ahead of the grid
+    meta_tmp = output + f'.json.tmp-{os.getpid()}'
+    with open(meta_tmp, 'w') as f:
+        json.dump({'rows': rows, 'cols': cols, 'source': os.path.basename(source),
+                   'built': time.time()}, f)
+    os.replace(meta_tmp, output + '.json')
+    return rows, cols
+
+
+def landmask_from_env():
+    """LandMask from LANDMASK_PATH, or None when not configured or missing"""
+    path = os.environ.get('LANDMASK_PATH')
+    if not path or not os.path.exists(path):
+        return None
+    return LandMask(path)
+
+
+def parse_points(data):
+    """Batch request as {"lat": [...], "lon": [...]} or {"points": [[lat, lon], ...]}; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+    try:
+        if 'points' in data:
+            points = np.asarray(data['points'], dtype=np.float64).reshape(-1, 2)
+            lat, lon = points[:, 0], points[:, 1]
+        else:
+            lat = np.atleast_1d(np.asarray(data['lat'], dtype=np.float64))
+            lon = np.atleast_1d(np.asarray(data['lon'], dtype=np.float64))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Expected points: [[lat, lon], ...] or lat/lon arrays')
+    if lat.shape != lon.shape or lat.ndim != 1:
+        raise ValueError('lat and lon must be flat arrays of the same length')
+    if lat.size > MAX_BATCH_POINTS:
+        raise ValueError(f'Too many points ({lat.size} > {MAX_BATCH_POINTS})')
+    if not (np.all(np.abs(lat) <= 90) and np.all(np.abs(lon) <= 180)):
+        raise ValueError('lat/lon out of range')
+    return lat, lon
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the land/sea mask')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='rasterize GeoJSON land polygons or pack a boolean .npy')
+    build_cmd.add_argument('source')
+    build_cmd.add_argument('output')
+    build_cmd.add_argument('--resolution', type=float, default=DEFAULT_RESOLUTION_ARCMIN,
+                           help='cell size in arc-minutes (GeoJSON input)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows, cols = build(args.source, args.output, args.resolution)
+    print(f'Built {rows}x{cols} mask ({os.path.getsize(args.output) / 1e6:.1f} MB) '
+          f'in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
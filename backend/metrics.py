@@ -0,0 +1,349 @@
+"""
+In-process metrics in the Prometheus text format, plus an opt-in sampling profiler.
+
+    instrument(app)            per-route latency, payload sizes, in-flight requests
+    REGISTRY.render()          body for GET /metrics
+    timed('physics')           context manager feeding phase_duration_seconds
+
+Upstream calls (backend.upstream) record their duration and outcome here.
+Existing component stats (caches, single-flight, pools) are exported at
+scrape time through collectors, so they cost nothing between scrapes.
+
+Metrics are per process. Under gunicorn each worker reports its own, and
+Prometheus sums them across targets.
+
+The profiler (METRICS_PROFILE_HZ, e.g. 19) is a daemon thread that wakes
+up hz times a second and folds every other thread's Python stack into a
+counter. Nothing is traced between samples, so at ~20 Hz the overhead is
+negligible. GET /metrics/profile returns collapsed stacks for
+flamegraph.pl or speedscope.
+"""
+
+import bisect
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers cached lookups (~1 ms) through slow Overpass queries (60 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes; 100 B .. 50 MB
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 50_000_000)
+MAX_PROFILE_STACKS = 20000
+MAX_STACK_DEPTH = 64
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for labelled metric families"""
+
+    type = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.label_names)
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f'{self.name}{_labels(self.label_names, k)} {_number(v)}' for k, v in items]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Non-cumulative counts per bucket; cumulated at render time
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(counts), total)) for k, (counts, total) in self._values.items())
+        lines = self._header()
+        names = self.label_names + ('le',)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(names, key + (_number(float(bound)),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Metric families plus scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def register_collector(self, fn):
+        """
+        fn() returns [(name, type, help, [(labels dict, value), ...]), ...];
+        called on every scrape.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                lines.append(f'# collector {getattr(collect, "__name__", "?")} failed: {_escape(e)}')
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status'))
+HTTP_REQUEST_BYTES = REGISTRY.histogram(
+    'http_request_size_bytes', 'Request body size by route', ('method', 'route'), SIZE_BUCKETS)
+HTTP_RESPONSE_BYTES = REGISTRY.histogram(
+    'http_response_size_bytes', 'Response body size by route (streamed bodies excluded)',
+    ('method', 'route'), SIZE_BUCKETS)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', 'Requests being handled', ('route',))
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'upstream_request_duration_seconds', 'Upstream call duration until response headers',
+    ('upstream', 'host', 'status'))
+PHASE_SECONDS = REGISTRY.histogram(
+    'phase_duration_seconds', 'Time spent in named server-side phases', ('phase',))
+
+
+def observe_upstream(upstream, host, status, seconds):
+    """Record one upstream call; status is the HTTP code, 'error' or 'rejected'"""
+    UPSTREAM_SECONDS.observe(seconds, upstream=upstream, host=host, status=status)
+
+
+@contextmanager
+def timed(phase):
+    """Time a block into phase_duration_seconds{phase=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase=phase)
+
+
+def stats_collector(prefix, sources):
+    """
+    Collector exporting the numeric fields of existing stats() dicts as gauges.
+    sources maps a component label to a callable returning its stats dict;
+    nested dicts (e.g. upstream_stats()) become an extra 'name' label.
+    """
+    def collect():
+        families = {}
+        for component, source in sources.items():
+            stats = source()
+            if stats is None:
+                continue
+            nested = bool(stats) and all(isinstance(v, dict) for v in stats.values())
+            rows = stats.items() if nested else [(None, stats)]
+            for name, row in rows:
+                for field, value in row.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    labels = {'component': component}
+                    if name is not None:
+                        labels['name'] = name
+                    metric = f'{prefix}_{_snake(field)}'
+                    families.setdefault(metric, []).append((labels, value))
+        return [(name, 'gauge', f'{name} from component stats()', samples)
+                for name, samples in families.items()]
+
+    collect.__name__ = f'{prefix}_collector'
+    return collect
+
+
+def _snake(name):
+    return ''.join('_' + ch.lower() if ch.isupper() else ch for ch in name)
+
+
+def instrument(app):
+    """Record latency, payload sizes and in-flight counts for every route of a Flask app"""
+    from flask import request
+
+    @app.before_request
+    def _start_timer():
+        rule = request.url_rule
+        route = rule.rule if rule is not None else 'unmatched'
+        # Kept in the WSGI environ: cheaper than flask.g and visible to teardown
+        request.environ['metrics.request'] = (time.perf_counter(), route)
+        HTTP_IN_FLIGHT.inc(route=route)
+        size = request.environ.get('CONTENT_LENGTH')
+        if size and size != '0':
+            HTTP_REQUEST_BYTES.observe(int(size), method=request.method, route=route)
+
+    @app.after_request
+    def _record(response):
+        started = request.environ.get('metrics.request')
+        if started is not None:
+            start, route = started
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                         route=route, status=response.status_code)
+            if not response.is_streamed:
+                size = response.headers.get('Content-Length')
+                if size is not None:
+                    HTTP_RESPONSE_BYTES.observe(int(size), method=request.method, route=route)
+        return response
+
+    @app.teardown_request
+    def _leave(error=None):
+        started = request.environ.pop('metrics.request', None)
+        if started is not None:
+            HTTP_IN_FLIGHT.dec(route=started[1])
+
+    return app
+
+
+class SamplingProfiler:
+    """Periodically folds every thread's stack into collapsed-stack counts"""
+
+    def __init__(self, hz):
+        self.interval = 1.0 / hz
+        self.hz = hz
+        self._counts = {}
+        self._samples = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(names)))
+            del frames
+            with self._lock:
+                self._samples += 1
+                for stack in stacks:
+                    if stack in self._counts:
+                        self._counts[stack] += 1
+                    elif len(self._counts) < MAX_PROFILE_STACKS:
+                        self._counts[stack] = 1
+                    else:
+                        self._dropped += 1
+
+    def collapsed(self, reset=False):
+        """Collapsed stacks ('frame;frame;frame count' per line), hottest first"""
+        with self._lock:
+            # Copy under the lock; the sampler thread keeps adding stacks
+            counts = self._counts if reset else dict(self._counts)
+            if reset:
+                self._counts = {}
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+    def stats(self):
+        with self._lock:
+            return {'hz': self.hz, 'samples': self._samples, 'stacks': len(self._counts), 'dropped': self._dropped}
+
+
+def profiler_from_env():
+    """Running SamplingProfiler when METRICS_PROFILE_HZ is set, else None"""
+    hz = float(os.environ.get('METRICS_PROFILE_HZ') or 0)
+    return SamplingProfiler(hz).start() if hz > 0 else None
@@ -0,0 +1,318 @@
+"""
+Monte Carlo uncertainty estimates for impact outcomes.
+
+Diameter, velocity, density class and entry angle are sampled from
+configurable distributions and run through the vectorized physics model in
+chunks spread over a process pool. Each chunk gets its own child of one
+SeedSequence, so a seeded run gives the same samples whatever the worker
+count. Results are summarized as P5/P50/P95 percentiles per output.
+
+Every input has a domain the model accepts (DOMAINS). Fixed values and the
+bounds of uniform/loguniform ranges outside it are rejected; normal and
+lognormal distributions, whose tails are unbounded, are truncated to it by
+redrawing out-of-range samples, and the result reports the share redrawn.
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from backend import physics
+
+MAX_SAMPLES = 1_000_000
+DEFAULT_SAMPLES = 10_000
+CHUNK_SIZE = 50_000
+DEFAULT_TIME_BUDGET = 10.0
+MAX_TIME_BUDGET = 30.0
+CHECK_INTERVAL = 0.25
+PERCENTILES = (5, 50, 95)
+
+# Inputs the model accepts: diameter (m), velocity (km/s, Earth escape to
+# retrograde-comet speed), entry angle (degrees above the horizon)
+DOMAINS = {
+    'diameter': (0.01, math.inf),
+    'velocity': (11.0, 72.0),
+    'angle': (1e-3, 90.0),
+}
+# Redraw rounds for truncated tails; anything still outside is clipped
+MAX_REDRAWS = 64
+
+# Rough share of density classes among impactors when nothing is known
+DEFAULT_DENSITY_WEIGHTS = {'stone': 0.75, 'carbon': 0.17, 'iron': 0.05, 'comet': 0.03}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.environ.get('MONTE_CARLO_WORKERS', os.cpu_count() or 1))
+            # spawn: forking a threaded web worker is not safe
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _discard_executor(executor):
+    """Forget a broken pool so the next run starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_distribution(name, spec, domain=None):
+    """
+    Normalize a distribution spec, checking it against domain (lo, hi). Accepted forms:
+      number                                  -> fixed value
+      {"min": a, "max": b}                    -> uniform
+      {"dist": "uniform", "min": a, "max": b}
+      {"dist": "loguniform", "min": a, "max": b}
+      {"dist": "normal", "mean": m, "std": s}
+      {"dist": "lognormal", "median": m, "sigma": s}   (sigma in natural-log units)
+      {"dist": "sin2"}                        -> entry angle, pdf sin(2θ) on (0°, 90°]
+    Fixed values and uniform bounds must lie in the domain; a normal mean or
+    lognormal median must too, and their tails are truncated to it when
+    sampling. Raises ValueError on bad input.
+    """
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        spec = {'dist': 'fixed', 'value': float(spec)}
+    if not isinstance(spec, dict):
+        raise ValueError(f'{name}: expected a number or a distribution object')
+
+    dist = spec.get('dist', 'uniform' if 'min' in spec else None)
+    try:
+        if dist == 'fixed':
+            params = {'value': float(spec['value'])}
+        elif dist in ('uniform', 'loguniform'):
+            params = {'min': float(spec['min']), 'max': float(spec['max'])}
+            if params['min'] > params['max']:
+                raise ValueError(f'{name}: min must not exceed max')
+            if dist == 'loguniform' and params['min'] <= 0:
+                raise ValueError(f'{name}: loguniform needs min > 0')
+        elif dist == 'normal':
+            params = {'mean': float(spec['mean']), 'std': float(spec['std'])}
+            if not params['std'] >= 0:
+                raise ValueError(f'{name}: std must not be negative')
+        elif dist == 'lognormal':
+            params = {'median': float(spec['median']), 'sigma': float(spec['sigma'])}
+            if not params['sigma'] >= 0:
+                raise ValueError(f'{name}: sigma must not be negative')
+        elif dist == 'sin2':
+            params = {}
+        else:
+            raise ValueError(f'{name}: unknown distribution {dist!r}')
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'{name}: missing or invalid parameter {e}')
+
+    if not all(math.isfinite(v) for v in params.values()):
+        raise ValueError(f'{name}: parameters must be finite numbers')
+    if domain is not None:
+        lo, hi = domain
+        bounds = {'fixed': ('value',), 'uniform': ('min', 'max'), 'loguniform': ('min', 'max'),
+                  'normal': ('mean',), 'lognormal': ('median',)}.get(dist, ())
+        for key in bounds:
+            if not lo <= params[key] <= hi:
+                raise ValueError(f'{name}: {key} {params[key]:g} outside [{lo:g}, {hi:g}]')
+    return {'dist': dist, **params}
+
+
+def truncates(dist):
+    """Whether sampling dist can fall outside its domain and gets redrawn"""
+    return dist['dist'] in ('normal', 'lognormal')
+
+
+def parse_density(spec):
+    """Density as a class name or {class: weight} mapping"""
+    if spec is None:
+        spec = DEFAULT_DENSITY_WEIGHTS
+    if isinstance(spec, str):
+        spec = {spec: 1.0}
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError('density: expected a class name or {class: weight}')
+    names = list(spec)
+    unknown = [n for n in names if n not in physics.DENSITY_VALUES]
+    if unknown:
+        raise ValueError(f'density: unknown classes {unknown}')
+    weights = np.asarray([float(spec[n]) for n in names])
+    if np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError('density: weights must be non-negative and not all zero')
+    return {'classes': names, 'weights': (weights / weights.sum()).tolist()}
+
+
+def sample(dist, rng, n):
+    kind = dist['dist']
+    if kind == 'fixed':
+        return np.full(n, dist['value'])
+    if kind == 'uniform':
+        return rng.uniform(dist['min'], dist['max'], n)
+    if kind == 'loguniform':
+        return np.exp(rng.uniform(math.log(dist['min']), math.log(dist['max']), n))
+    if kind == 'normal':
+        return rng.normal(dist['mean'], dist['std'], n)
+    if kind == 'lognormal':
+        return dist['median'] * np.exp(rng.normal(0.0, dist['sigma'], n))
+    if kind == 'sin2':
+        # Inverse CDF of sin(2θ): F(θ) = sin²θ
+        return np.degrees(np.arcsin(np.sqrt(rng.uniform(0.0, 1.0, n))))
+    raise ValueError(f'unknown distribution {kind!r}')
+
+
+def sample_truncated(dist, domain, rng, n):
+    """n samples of dist restricted to domain; returns (samples, number redrawn)"""
+    values = sample(dist, rng, n)
+    if not truncates(dist):
+        return values, 0
+    lo, hi = domain
+    outside = np.flatnonzero((values < lo) | (values > hi))
+    redrawn = outside.size
+    for _ in range(MAX_REDRAWS):
+        if not outside.size:
+            break
+        values[outside] = sample(dist, rng, outside.size)
+        outside = outside[(values[outside] < lo) | (values[outside] > hi)]
+    return np.clip(values, lo, hi), redrawn
+
+
+def run_chunk(spec, seed_seq, n):
+    """Sample and evaluate n scenarios; returns {output name: array} plus redraw counts"""
+    rng = np.random.default_rng(seed_seq)
+    inputs = {}
+    redrawn = {}
+    for name in ('diameter', 'velocity', 'angle'):
+        inputs[name], redrawn[name] = sample_truncated(spec[name], DOMAINS[name], rng, n)
+    density = rng.choice(np.asarray(spec['density']['classes']), size=n, p=spec['density']['weights'])
+
+    effects = physics.calculate_all_effects(
+        inputs['diameter'], inputs['velocity'], density, inputs['angle'],
+        spec['population_density'], spec['is_ocean_impact'])
+
+    return {**physics.flatten_outputs(effects), 'redrawn': redrawn}
+
+
+def parse_request(data):
+    """Validate a Monte Carlo request body into a picklable spec"""
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+    for field in ('diameter', 'velocity'):
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+
+    samples = int(data.get('samples', DEFAULT_SAMPLES))
+    if not 1 <= samples <= MAX_SAMPLES:
+        raise ValueError(f'samples must be between 1 and {MAX_SAMPLES}')
+    time_budget = float(data.get('time_budget', DEFAULT_TIME_BUDGET))
+    if not 0 < time_budget <= MAX_TIME_BUDGET:
+        raise ValueError(f'time_budget must be in (0, {MAX_TIME_BUDGET}] seconds')
+    # Seeds are echoed back as strings since they can exceed JavaScript's integer precision
+    seed = data.get('seed')
+    if isinstance(seed, str) and seed.isdigit():
+        seed = int(seed)
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise ValueError('seed must be a non-negative integer')
+
+    return {
+        'samples': samples,
+        'time_budget': time_budget,
+        'seed': seed,
+        'diameter': parse_distribution('diameter', data['diameter'], DOMAINS['diameter']),
+        'velocity': parse_distribution('velocity', data['velocity'], DOMAINS['velocity']),
+        'angle': parse_distribution('angle', data.get('angle', {'dist': 'sin2'}), DOMAINS['angle']),
+        'density': parse_density(data.get('density')),
+        'population_density': float(data.get('population_density', 1000)),
+        'is_ocean_impact': bool(data.get('is_ocean_impact', False)),
+    }
+
+
+def summarize(chunks):
+    """Percentiles and mean per metric over all evaluated chunks"""
+    summary = {}
+    for metric in physics.FLAT_OUTPUTS:
+        if metric == 'airburst':
+            continue
+        values = np.concatenate([c[metric] for c in chunks]).astype(np.float64)
+        p = np.percentile(values, PERCENTILES)
+        summary[metric] = {
+            **{f'p{q}': float(v) for q, v in zip(PERCENTILES, p)},
+            'mean': float(values.mean()),
+        }
+    airburst = np.concatenate([c['airburst'] for c in chunks])
+    summary['airburstProbability'] = float(airburst.mean())
+    return summary
+
+
+def run_monte_carlo(spec, parallel=True, check=None):
+    """
+    Evaluate spec['samples'] scenarios within spec['time_budget'] seconds.
+    Chunks that don't finish in time are dropped and the result reports how
+    many samples were actually evaluated. check(), if given, is called between
+    chunks (and at least every CHECK_INTERVAL seconds while waiting on the
+    pool); whatever it raises aborts the run and cancels the pending chunks.
+    """
+    start = time.monotonic()
+    deadline = start + spec['time_budget']
+    n_chunks = math.ceil(spec['samples'] / CHUNK_SIZE)
+    sizes = [CHUNK_SIZE] * (n_chunks - 1) + [spec['samples'] - CHUNK_SIZE * (n_chunks - 1)]
+    root = np.random.SeedSequence(spec['seed'])
+    seeds = root.spawn(n_chunks)
+
+    chunks = []
+    if not parallel or n_chunks == 1:
+        for seed_seq, n in zip(seeds, sizes):
+            if check is not None:
+                check()
+            if chunks and time.monotonic() >= deadline:
+                break
+            chunks.append(run_chunk(spec, seed_seq, n))
+    else:
+        executor = _get_executor()
+        pending = set()
+        try:
+            pending = {executor.submit(run_chunk, spec, s, n) for s, n in zip(seeds, sizes)}
+            while pending:
+                if check is not None:
+                    check()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if check is not None:
+                    remaining = min(remaining, CHECK_INTERVAL)
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                chunks.extend(f.result() for f in done)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); a broken pool never recovers
+            _discard_executor(executor)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    if not chunks:
+        raise TimeoutError('No samples evaluated within the time budget')
+
+    evaluated = sum(len(c['energyMegatons']) for c in chunks)
+    # Normal/lognormal inputs were truncated to the model's domain; report how much
+    truncated = {
+        name: {'min': DOMAINS[name][0], 'max': DOMAINS[name][1] if math.isfinite(DOMAINS[name][1]) else None,
+               'redrawnFraction': sum(c['redrawn'][name] for c in chunks) / evaluated}
+        for name in DOMAINS if truncates(spec[name])
+    }
+    return {
+        'samples': evaluated,
+        'requestedSamples': spec['samples'],
+        'complete': evaluated == spec['samples'],
+        'seed': str(root.entropy),
+        'elapsedSeconds': time.monotonic() - start,
+        'percentiles': list(PERCENTILES),
+        'truncated': truncated,
+        'results': summarize(chunks),
+    }
@@ -0,0 +1,344 @@
+"""
+NASA NeoWs feed: ranges of any length, and a columnar form for the UI.
+
+The feed API answers at most 7 days per call. DailyFeed splits a longer
+range into 7-day windows, fetches the windows concurrently and keeps every
+day as its own cache entry, so overlapping ranges only fetch the days they
+do not share and days in the past (which no longer change) are never
+fetched twice. The merged document has the feed's own shape:
+
+    {"element_count": 42, "near_earth_objects": {"2024-01-01": [...], ...}}
+
+The raw feed nests every object under its date and repeats the estimated
+diameter in four units and the close-approach data per object. The browser
+(NASAAPI.getNEOData) only needs name, hazard flag, mean diameter, velocity,
+approach date and miss distance, so normalize_feed() flattens it into one
+array per field:
+
+    {"count": 3, "fields": [...], "dtypes": {...}, "columns": {"name": [...], ...}}
+
+Served as JSON, or as MessagePack when the client sends
+Accept: application/msgpack. In MessagePack, numeric columns are raw
+little-endian typed arrays (bin), ready for Float32Array/Float64Array/Uint8Array
+on the client. The encoder below covers the few types this payload uses, so
+no msgpack package is needed.
+"""
+
+import datetime
+import json
+import os
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.cache import HIT, MISS, STALE, make_key
+
+WINDOW_DAYS = 7                        # NeoWs feed limit per call, both ends inclusive
+MAX_RANGE_DAYS = 366
+PAST_DAY_TTL = 10 * 365 * 24 * 60 * 60  # a day that is over does not change
+
+API_KEY_RE = re.compile(r'[?&]api_key=[^&]*')
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Column -> dtype (numpy, little-endian) or 'str'
+FIELDS = {
+    'id': 'str',
+    'name': 'str',
+    'pha': '<u1',
+    'diameterM': '<f4',
+    'velocityKmh': '<f4',
+    'approachDate': 'str',
+    'missDistanceKm': '<f8',
+}
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def normalize_feed(feed):
+    """Flatten a NeoWs feed document into {field: numpy array or list}, ordered by date"""
+    rows = {field: [] for field in FIELDS}
+    for date in sorted(feed.get('near_earth_objects') or {}):
+        for neo in feed['near_earth_objects'][date]:
+            meters = (neo.get('estimated_diameter') or {}).get('meters') or {}
+            approach = (neo.get('close_approach_data') or [{}])[0]
+            rows['id'].append(str(neo.get('id', '')))
+            rows['name'].append(neo.get('name', ''))
+            rows['pha'].append(bool(neo.get('is_potentially_hazardous_asteroid')))
+            rows['diameterM'].append((_float(meters.get('estimated_diameter_min'))
+                                      + _float(meters.get('estimated_diameter_max'))) / 2)
+            rows['velocityKmh'].append(_float((approach.get('relative_velocity') or {}).get('kilometers_per_hour')))
+            rows['approachDate'].append(approach.get('close_approach_date', date))
+            rows['missDistanceKm'].append(_float((approach.get('miss_distance') or {}).get('kilometers')))
+    return {field: values if FIELDS[field] == 'str' else np.asarray(values, dtype=FIELDS[field])
+            for field, values in rows.items()}
+
+
+def _envelope(columns):
+    return {
+        'count': len(columns['id']),
+        'fields': list(FIELDS),
+        'dtypes': {field: FIELDS[field].lstrip('<') for field in FIELDS},
+    }
+
+
+def encode_json(columns):
+    """Compact JSON; NaN (missing numbers) becomes null"""
+    doc = _envelope(columns)
+    doc['columns'] = {
+        field: values if FIELDS[field] == 'str'
+        else [None if v != v else v for v in values.tolist()]
+        for field, values in columns.items()
+    }
+    return json.dumps(doc, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encode_msgpack(columns):
+    doc = _envelope(columns)
+    doc['columns'] = {
+        field: values if FIELDS[field] == 'str' else values.astype(FIELDS[field]).tobytes()
+        for field, values in columns.items()
+    }
+    out = bytearray()
+    _pack(doc, out)
+    return bytes(out)
+
+
+def _pack(obj, out):
+    """MessagePack for None, bool, int, float, str, bytes, list and dict"""
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True or obj is False:
+        out.append(0xc3 if obj else 0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif 0 <= obj <= 0xffffffff:
+            out += struct.pack('>BI', 0xce, obj)
+        else:
+            out += struct.pack('>Bq', 0xd3, obj)
+    elif isinstance(obj, float):
+        out += struct.pack('>Bd', 0xcb, obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        n = len(data)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n < 0x100:
+            out += struct.pack('>BB', 0xd9, n)
+        elif n < 0x10000:
+            out += struct.pack('>BH', 0xda, n)
+        else:
+            out += struct.pack('>BI', 0xdb, n)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n < 0x100:
+            out += struct.pack('>BB', 0xc4, n)
+        elif n < 0x10000:
+            out += struct.pack('>BH', 0xc5, n)
+        else:
+            out += struct.pack('>BI', 0xc6, n)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(0x90 | n)
+        elif n < 0x10000:
+            out += struct.pack('>BH', 0xdc, n)
+        else:
+            out += struct.pack('>BI', 0xdd, n)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(0x80 | n)
+        elif n < 0x10000:
+            out += struct.pack('>BH', 0xde, n)
+        else:
+            out += struct.pack('>BI', 0xdf, n)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f'cannot pack {type(obj).__name__}')
+
+
+def encode(columns, accept_msgpack):
+    """(body, mimetype) for the negotiated format"""
+    if accept_msgpack:
+        return encode_msgpack(columns), MSGPACK_TYPES[0]
+    return encode_json(columns), 'application/json'
+
+
+def parse_range(start_date=None, end_date=None, today=None, max_days=MAX_RANGE_DAYS):
+    """
+    (start, end) dates for a feed request. Like the NASA API, start defaults
+    to today and end to 7 days after start. Raises ValueError for malformed
+    dates, reversed ranges and ranges over max_days.
+    """
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    try:
+        start = datetime.date.fromisoformat(start_date) if start_date else today
+        end = datetime.date.fromisoformat(end_date) if end_date else start + datetime.timedelta(days=WINDOW_DAYS)
+    except ValueError:
+        raise ValueError('Dates must be YYYY-MM-DD')
+    if end < start:
+        raise ValueError('end_date must not be before start_date')
+    if (end - start).days + 1 > max_days:
+        raise ValueError(f'Date range limited to {max_days} days')
+    return start, end
+
+
+def plan_windows(days, window_days=WINDOW_DAYS):
+    """Fewest feed windows (first, last) covering the given sorted days"""
+    windows = []
+    for day in days:
+        if windows and (day - windows[-1][0]).days < window_days:
+            windows[-1][1] = day
+        else:
+            windows.append([day, day])
+    return [tuple(w) for w in windows]
+
+
+def _pack_day(neos):
+    """Cache entry for one day: object count, newline, JSON array"""
+    for neo in neos:
+        # Object links embed the caller's api_key; cached days are shared
+        links = neo.get('links')
+        if isinstance(links, dict) and isinstance(links.get('self'), str):
+            links['self'] = API_KEY_RE.sub('', links['self'])
+    return b'%d\n' % len(neos) + json.dumps(neos, separators=(',', ':')).encode('utf-8')
+
+
+def _unpack_day(entry):
+    count, _, neos = entry.partition(b'\n')
+    return int(count), neos
+
+
+class DailyFeed:
+    """NeoWs feed for any date range, assembled from per-day entries in a ResponseCache"""
+
+    def __init__(self, upstream, cache, ttl, stale_ttl=0, max_concurrency=4, flight=None):
+        self.upstream = upstream
+        self.cache = cache
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.flight = flight
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='neo-feed')
+        self._lock = threading.Lock()
+        self._day_hits = 0
+        self._day_misses = 0
+        self._windows = 0
+        self._stale_fallbacks = 0
+
+    @staticmethod
+    def _key(day):
+        return make_key('nasa/neo/day', {'date': day.isoformat()})
+
+    def _ttls(self, day, today):
+        if day < today:
+            return PAST_DAY_TTL, 0
+        return self.ttl, self.stale_ttl
+
+    def fetch(self, start, end, api_key, today=None):
+        """
+        (feed JSON body, cache status) for [start, end]. Status is HIT when every
+        day came from the cache, MISS when any window was fetched, and STALE when
+        a failed window was answered from expired days instead.
+        """
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        days = [start + datetime.timedelta(days=n) for n in range((end - start).days + 1)]
+
+        found, stale = {}, {}
+        for day in days:
+            body, status = self.cache.peek(self._key(day), *self._ttls(day, today))
+            if status == HIT:
+                found[day] = body
+            elif status == STALE:
+                stale[day] = body
+        missing = [day for day in days if day not in found]
+
+        with self._lock:
+            self._day_hits += len(days) - len(missing)
+            self._day_misses += len(missing)
+
+        status = HIT
+        windows = plan_windows(missing)
+        futures = [(w, self._executor.submit(self._fetch_window, w[0], w[1], api_key, today)) for w in windows]
+        for (first, last), future in futures:
+            try:
+                found.update(future.result())
+                status = MISS
+            except Exception:
+                wanted = [day for day in missing if first <= day <= last]
+                if not all(day in stale for day in wanted):
+                    raise
+                found.update((day, stale[day]) for day in wanted)
+                status = STALE if status == HIT else status
+                with self._lock:
+                    self._stale_fallbacks += 1
+
+        return self._assemble([(day, found[day]) for day in days]), status
+
+    def _fetch_window(self, first, last, api_key, today):
+        params = {'start_date': first.isoformat(), 'end_date': last.isoformat(), 'api_key': api_key}
+
+        def get():
+            response = self.upstream.get('neo/rest/v1/feed', params=params)
+            response.raise_for_status()
+            return response.content
+
+        # Concurrent requests for overlapping ranges miss the same days and plan the same windows
+        body = self.flight.do(make_key('nasa/neo', params), get) if self.flight else get()
+        by_date = json.loads(body).get('near_earth_objects') or {}
+
+        with self._lock:
+            self._windows += 1
+        entries = {}
+        for n in range((last - first).days + 1):
+            day = first + datetime.timedelta(days=n)
+            # A date missing from the response simply had no close approaches
+            entries[day] = _pack_day(by_date.get(day.isoformat(), []))
+            self.cache.set(self._key(day), entries[day], *self._ttls(day, today))
+        return entries
+
+    @staticmethod
+    def _assemble(days):
+        """Splice the cached day arrays into one feed document without re-encoding them"""
+        total, parts = 0, []
+        for day, entry in days:
+            count, neos = _unpack_day(entry)
+            total += count
+            parts.append(b'"%s":%s' % (day.isoformat().encode(), neos))
+        return b'{"element_count":%d,"near_earth_objects":{%s}}' % (total, b','.join(parts))
+
+    def stats(self):
+        with self._lock:
+            lookups = self._day_hits + self._day_misses
+            return {
+                'dayHits': self._day_hits,
+                'dayMisses': self._day_misses,
+                'windowsFetched': self._windows,
+                'staleFallbacks': self._stale_fallbacks,
+                'maxConcurrency': self.max_concurrency,
+                'hitRate': self._day_hits / lookups if lookups else 0.0,
+            }
+
+
+def daily_feed_from_env(upstream, cache, ttl, stale_ttl=0, flight=None):
+    """DailyFeed fetching up to NEO_FEED_CONCURRENCY windows at a time (default 4)"""
+    max_concurrency = int(os.environ.get('NEO_FEED_CONCURRENCY', 4))
+    return DailyFeed(upstream, cache, ttl, stale_ttl, max_concurrency=max_concurrency, flight=flight)
@@ -0,0 +1,192 @@
+"""
+Streaming aggregation of Overpass responses into a compact impact summary.
+
+Mirrors processImpactData in js/overpass.js (building counts, amenity
+criticality, population tags) but parses the upstream body element by
+element as it arrives, so peak memory stays bounded on dense urban areas.
+"""
+
+import codecs
+import json
+
+# Same classification as processImpactData in js/overpass.js
+AMENITY_CRITICALITY = {
+    'hospital': 'CRITICAL', 'clinic': 'CRITICAL', 'doctors': 'CRITICAL',
+    'fire_station': 'CRITICAL', 'police': 'CRITICAL',
+    'school': 'HIGH', 'university': 'HIGH', 'fuel': 'HIGH',
+    'pharmacy': 'HIGH', 'shelter': 'HIGH',
+    'townhall': 'MEDIUM', 'post_office': 'MEDIUM', 'bank': 'MEDIUM',
+    'library': 'MEDIUM', 'community_centre': 'MEDIUM',
+}
+CRITICALITY_LEVELS = ('CRITICAL', 'HIGH', 'MEDIUM', 'LOW')
+PLACE_TYPES = ('city', 'town', 'village', 'suburb', 'neighbourhood')
+
+MAX_CRITICAL_FACILITIES = 100
+MAX_POPULATED_AREAS = 25
+
+
+def summary_query(south, west, north, east, timeout=25):
+    """Overpass query for the impact summary; `out center` gives ways a point without recursing"""
+    bbox = f"{south},{west},{north},{east}"
+    return f"""
+    [out:json][timeout:{timeout}];
+    (
+      node["building"]({bbox});
+      way["building"]({bbox});
+      node["amenity"]({bbox});
+      way["amenity"]({bbox});
+      node["population"]({bbox});
+      way["population"]({bbox});
+      relation["population"]({bbox});
+      node["place"~"city|town|village|suburb|neighbourhood"]({bbox});
+      way["place"~"city|town|village|suburb|neighbourhood"]({bbox});
+    );
+    out center;
+    """
+
+
+def iter_elements(chunks):
+    """
+    Yield the objects of the top-level "elements" array from an iterable of
+    byte chunks without loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    in_array = False
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+
+        if not in_array:
+            key = buffer.find('"elements"')
+            start = buffer.find('[', key) if key != -1 else -1
+            if start == -1:
+                # Keep a tail in case the key is split across chunks
+                pos = max(0, len(buffer) - 16)
+                continue
+            pos = start + 1
+            in_array = True
+
+        while True:
+            # Skip separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element continues in the next chunk
+                break
+            pos = end
+            yield element
+
+
+def _point(element):
+    if 'lat' in element and 'lon' in element:
+        return element['lat'], element['lon']
+    center = element.get('center')
+    if center:
+        return center['lat'], center['lon']
+    return None
+
+
+def _population(tags):
+    try:
+        value = int(str(tags.get('population', '')).replace(',', '').strip())
+    except ValueError:
+        return 0
+    return value if value > 0 else 0
+
+
+class ImpactSummary:
+    """Running aggregate over Overpass elements"""
+
+    def __init__(self, max_facilities=MAX_CRITICAL_FACILITIES, max_areas=MAX_POPULATED_AREAS):
+        self.max_facilities = max_facilities
+        self.max_areas = max_areas
+        self.elements = 0
+        self.buildings = 0
+        self.amenities = 0
+        self.by_criticality = dict.fromkeys(CRITICALITY_LEVELS, 0)
+        self.by_type = {}
+        self.total_population = 0
+        self.populated_count = 0
+        self.facilities = []
+        self.populated_areas = []
+
+    def add(self, element):
+        self.elements += 1
+        tags = element.get('tags')
+        if not tags:
+            return
+
+        if 'building' in tags:
+            self.buildings += 1
+
+        amenity = tags.get('amenity')
+        if amenity:
+            criticality = AMENITY_CRITICALITY.get(amenity, 'LOW')
+            self.amenities += 1
+            self.by_criticality[criticality] += 1
+            self.by_type[amenity] = self.by_type.get(amenity, 0) + 1
+            if criticality in ('CRITICAL', 'HIGH') and len(self.facilities) < self.max_facilities:
+                self.facilities.append({
+                    'id': element.get('id'),
+                    'type': amenity,
+                    'name': tags.get('name', amenity),
+                    'criticality': criticality,
+                    'coordinates': _point(element),
+                })
+
+        # Counted once per element, even when it is also a place
+        population = _population(tags)
+        if population:
+            self.total_population += population
+            self.populated_count += 1
+            area = {
+                'id': element.get('id'),
+                'population': population,
+                'placeName': tags.get('name', 'Unknown'),
+                'place': tags.get('place') if tags.get('place') in PLACE_TYPES else None,
+                'coordinates': _point(element),
+            }
+            self.populated_areas.append(area)
+            if len(self.populated_areas) > self.max_areas * 2:
+                self._trim_areas()
+
+    def _trim_areas(self):
+        self.populated_areas.sort(key=lambda a: a['population'], reverse=True)
+        del self.populated_areas[self.max_areas:]
+
+    def result(self):
+        self._trim_areas()
+        rank = {level: i for i, level in enumerate(CRITICALITY_LEVELS)}
+        facilities = sorted(self.facilities, key=lambda f: rank[f['criticality']])
+        return {
+            'elementsProcessed': self.elements,
+            'buildings': self.buildings,
+            'amenities': {
+                'total': self.amenities,
+                'byCriticality': self.by_criticality,
+                'byType': self.by_type,
+            },
+            'totalPopulation': self.total_population,
+            'populatedAreasCount': self.populated_count,
+            'populatedAreas': self.populated_areas,
+            'criticalFacilities': facilities,
+            'criticalFacilitiesTruncated': self.by_criticality['CRITICAL'] + self.by_criticality['HIGH'] > len(facilities),
+        }
+
+
+def summarize_stream(chunks, **kwargs):
+    """Aggregate an Overpass JSON body given as byte chunks"""
+    summary = ImpactSummary(**kwargs)
+    for element in iter_elements(chunks):
+        summary.add(element)
+    return summary.result()
@@ -0,0 +1,324 @@
+"""
+Spatial tile cache for Overpass queries.
+
+Requested areas are split into fixed lat/lon tiles. Each tile's elements are
+cached per query profile, missing tiles are fetched together in one batched
+Overpass query, and the answer for any radius or bbox is assembled locally
+from cached tiles. Areas that cross the antimeridian are covered as two
+longitude spans; areas too large for MAX_TILES_PER_QUERY tiles even at the
+coarsest level are refused (AreaTooLarge, HTTP 400).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from backend.singleflight import singleflight_from_env
+
+METERS_PER_DEGREE = 111320
+
+# Tile edge sizes in degrees (~1.1 km, ~5.5 km, ~28 km at the equator).
+# The smallest level that covers the area with at most MAX_TILES_PER_QUERY tiles is used.
+TILE_LEVELS = (0.01, 0.05, 0.25)
+MAX_TILES_PER_QUERY = 64
+
+TILE_TTL = 24 * 60 * 60
+# Overpass is told to give up this long before our read timeout, so a slow
+# batch comes back as its own error instead of a dropped connection
+QUERY_TIMEOUT_MARGIN = 5
+DEFAULT_MAX_ELEMENTS = 100_000
+
+# Overpass filters per profile; {bbox} is replaced by "south,west,north,east"
+PROFILES = {
+    # Everything in the area (root /overpass route)
+    'all': {
+        'filters': ('node({bbox})', 'way({bbox})', 'relation({bbox})'),
+        'recurse': False,
+    },
+    # Buildings, amenities and population (fetchImpactData / /api/overpass)
+    'impact': {
+        'filters': (
+            'node["building"]({bbox})',
+            'way["building"]({bbox})',
+            'node["amenity"]({bbox})',
+            'way["amenity"]({bbox})',
+            'node["population"]({bbox})',
+            'way["population"]({bbox})',
+            'relation["population"]({bbox})',
+            'node["place"~"city|town|village|suburb|neighbourhood"]({bbox})',
+            'way["place"~"city|town|village|suburb|neighbourhood"]({bbox})',
+        ),
+        'recurse': True,
+    },
+    # Land features only, for the client's water/land check (checkIfOceanImpact)
+    'terrain': {
+        'filters': (
+            'node["building"]({bbox})',
+            'way["building"]({bbox})',
+            'way["highway"]({bbox})',
+            'way["landuse"]({bbox})',
+            'node["place"]({bbox})',
+        ),
+        'recurse': False,
+    },
+}
+
+
+class AreaTooLarge(ValueError):
+    """Raised when an area needs more than MAX_TILES_PER_QUERY tiles at every level (maps to HTTP 400)"""
+
+
+class Area:
+    """
+    A query area: either a circle (center + radius) or a lat/lon box.
+    The box runs east from west; when it crosses the antimeridian (west > east
+    once wrapped) it is kept as two longitude spans.
+    """
+
+    def __init__(self, south, west, north, east, center=None, radius=None):
+        self.south = max(-90.0, south)
+        self.north = min(90.0, north)
+        self.center = center
+        self.radius = radius
+        width = east - west if east >= west else east - west + 360
+        if width >= 360:
+            self.spans = [(-180.0, 180.0)]
+        else:
+            if not -180 <= west < 180:
+                west = (west + 180) % 360 - 180
+            east = west + width
+            self.spans = [(west, east)] if east <= 180 else [(west, 180.0), (-180.0, east - 360)]
+
+    @classmethod
+    def circle(cls, lat, lon, radius):
+        dlat = radius / METERS_PER_DEGREE
+        dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        return cls(lat - dlat, lon - dlon, lat + dlat, lon + dlon, center=(lat, lon), radius=radius)
+
+    @classmethod
+    def bbox(cls, south, west, north, east):
+        # west > east is a box across the antimeridian, not swapped corners
+        return cls(min(south, north), west, max(south, north), east)
+
+    def contains(self, lat, lon):
+        if not (self.south <= lat <= self.north and any(w <= lon <= e for w, e in self.spans)):
+            return False
+        if self.center is None:
+            return True
+        return _distance_m(self.center[0], self.center[1], lat, lon) <= self.radius
+
+    def tiles(self, tile_deg):
+        iy0, iy1 = math.floor(self.south / tile_deg), math.floor(self.north / tile_deg)
+        tiles = []
+        for west, east in self.spans:
+            ix0, ix1 = math.floor(west / tile_deg), math.floor(east / tile_deg)
+            tiles.extend((ix, iy) for iy in range(iy0, iy1 + 1) for ix in range(ix0, ix1 + 1))
+        return tiles
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    """Haversine distance in meters"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371000 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def pick_tile_level(area):
+    """Smallest tile size that keeps the tile count for area within the query budget"""
+    for tile_deg in TILE_LEVELS:
+        count = len(area.tiles(tile_deg))
+        if count <= MAX_TILES_PER_QUERY:
+            return tile_deg
+    raise AreaTooLarge(f"Area too large: {count} tiles of {TILE_LEVELS[-1]} deg "
+                       f"(limit {MAX_TILES_PER_QUERY})")
+
+
+def build_batch_query(profile, tile_deg, tiles, timeout=55):
+    """
+    One Overpass query for several tiles. A derived "tile" element is emitted
+    before each tile's output so the combined element list can be split back up.
+    """
+    spec = PROFILES[profile]
+    parts = [f'[out:json][timeout:{timeout}];']
+    for ix, iy in tiles:
+        bbox = (f"{iy * tile_deg:.6f},{ix * tile_deg:.6f},"
+                f"{(iy + 1) * tile_deg:.6f},{(ix + 1) * tile_deg:.6f}")
+        parts.append(f'make tile ix="{ix}",iy="{iy}"; out;')
+        parts.append('(' + ''.join(f.format(bbox=bbox) + ';' for f in spec['filters']) + ');')
+        parts.append('out body; >; out skel qt;' if spec['recurse'] else 'out body;')
+    return '\n'.join(parts)
+
+
+def split_batch_response(elements):
+    """Group a batched response's elements by the tile markers that precede them"""
+    by_tile = {}
+    current = None
+    for element in elements:
+        if element.get('type') == 'tile':
+            tags = element.get('tags', {})
+            current = (int(tags['ix']), int(tags['iy']))
+            by_tile[current] = []
+        elif current is not None:
+            by_tile[current].append(element)
+    return by_tile
+
+
+class OverpassTileCache:
+    """LRU of per-tile element lists, bounded by total element count"""
+
+    def __init__(self, upstream, max_elements=DEFAULT_MAX_ELEMENTS, ttl=TILE_TTL, flight=None):
+        self.upstream = upstream
+        self.flight = flight
+        self.max_elements = max_elements
+        self.ttl = ttl
+        self._tiles = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._batches = 0
+
+    def query_radius(self, profile, lat, lon, radius):
+        return self.query(profile, Area.circle(lat, lon, radius))
+
+    def query_bbox(self, profile, south, west, north, east):
+        return self.query(profile, Area.bbox(south, west, north, east))
+
+    def query(self, profile, area):
+        """Return the Overpass-style JSON document for area, fetching only missing tiles"""
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown Overpass profile: {profile}")
+
+        tile_deg = pick_tile_level(area)
+        wanted = area.tiles(tile_deg)
+
+        found = {}
+        missing = []
+        for tile in wanted:
+            elements = self._get((profile, tile_deg, tile))
+            if elements is None:
+                missing.append(tile)
+            else:
+                found[tile] = elements
+
+        if missing:
+            fetched = self._fetch(profile, tile_deg, missing)
+            found.update(fetched)
+
+        with self._lock:
+            self._hits += len(wanted) - len(missing)
+            self._misses += len(missing)
+
+        return {
+            'version': 0.6,
+            'generator': 'Overpass tile cache',
+            'elements': self._assemble(area, [found[t] for t in wanted]),
+        }
+
+    def _fetch(self, profile, tile_deg, tiles):
+        read_timeout = self.upstream.timeout[1]
+        query = build_batch_query(profile, tile_deg, tiles,
+                                  timeout=max(1, int(read_timeout) - QUERY_TIMEOUT_MARGIN))
+
+        def post():
+            response = self.upstream.post(data={'data': query})
+            response.raise_for_status()
+            return response.content
+
+        # Identical concurrent requests miss the same tiles and build the same query
+        body = self.flight.do(query, post) if self.flight else post()
+        by_tile = split_batch_response(json.loads(body).get('elements', []))
+
+        with self._lock:
+            self._batches += 1
+        for tile in tiles:
+            # A tile missing from the response simply has no matching elements
+            by_tile.setdefault(tile, [])
+            self._put((profile, tile_deg, tile), by_tile[tile])
+        return by_tile
+
+    def _assemble(self, area, tile_lists):
+        """Merge tiles, drop duplicates and trim to the requested area"""
+        unique = {}
+        for elements in tile_lists:
+            for element in elements:
+                unique.setdefault((element['type'], element['id']), element)
+
+        coords = {
+            el['id']: (el['lat'], el['lon'])
+            for (kind, _), el in unique.items() if kind == 'node' and 'lat' in el
+        }
+
+        selected = []
+        referenced = set()
+        for (kind, _), element in unique.items():
+            if kind == 'way':
+                points = [coords[n] for n in element.get('nodes', ()) if n in coords]
+                # Overpass keeps a way when any of its nodes is inside the area
+                if points and not any(area.contains(lat, lon) for lat, lon in points):
+                    continue
+                referenced.update(('node', n) for n in element.get('nodes', ()))
+            elif kind == 'relation':
+                referenced.update(
+                    (m['type'], m['ref']) for m in element.get('members', ()))
+            elif kind == 'node' and element.get('tags'):
+                if not area.contains(element['lat'], element['lon']):
+                    continue
+            selected.append(element)
+
+        # Untagged nodes are geometry; keep the ones inside the area or used by kept ways
+        result = []
+        for element in selected:
+            key = (element['type'], element['id'])
+            if element['type'] == 'node' and not element.get('tags') and key not in referenced:
+                if not area.contains(element['lat'], element['lon']):
+                    continue
+            result.append(element)
+        return result
+
+    def _get(self, key):
+        with self._lock:
+            item = self._tiles.get(key)
+            if item is None:
+                return None
+            stored_at, elements = item
+            if time.time() - stored_at >= self.ttl:
+                del self._tiles[key]
+                self._size -= len(elements)
+                return None
+            self._tiles.move_to_end(key)
+            return elements
+
+    def _put(self, key, elements):
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._tiles[key] = (time.time(), elements)
+            self._size += len(elements)
+            while self._size > self.max_elements and len(self._tiles) > 1:
+                _, (_, evicted) = self._tiles.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'tiles': len(self._tiles),
+                'elements': self._size,
+                'maxElements': self.max_elements,
+                'tileHits': self._hits,
+                'tileMisses': self._misses,
+                'batchQueries': self._batches,
+                'hitRate': self._hits / lookups if lookups else 0.0,
+            }
+
+
+def tile_cache_from_env(upstream):
+    """Tile cache sized from OVERPASS_TILE_CACHE_MAX_ELEMENTS, coalescing identical batch queries"""
+    max_elements = int(os.environ.get('OVERPASS_TILE_CACHE_MAX_ELEMENTS', DEFAULT_MAX_ELEMENTS))
+    return OverpassTileCache(upstream, max_elements=max_elements, flight=singleflight_from_env('overpass'))
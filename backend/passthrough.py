@@ -0,0 +1,73 @@
+"""
+Streaming passthrough for upstream responses the server does not transform.
+
+The body is relayed in chunks straight from the upstream socket instead of
+being parsed with response.json() and re-serialized with jsonify(), so the
+first byte reaches the client as soon as the upstream sends it and a worker
+never holds more than one chunk of a large SBDB query result.
+
+A compressed upstream body (Content-Encoding: gzip/deflate/br) is relayed
+still compressed when the client accepts that encoding, and decompressed on
+the fly otherwise. Bodies over max_bytes are refused up front when the
+upstream announces its Content-Length, and cut off mid-stream when it does
+not (the client then sees a truncated transfer, never a silently short body).
+"""
+
+from flask import Response, request
+
+CHUNK_SIZE = 64 * 1024
+
+# Upstream headers worth relaying; hop-by-hop and connection headers are not
+RELAYED_HEADERS = ('Content-Type', 'Content-Encoding', 'Content-Length', 'ETag', 'Last-Modified')
+
+
+class ResponseTooLarge(Exception):
+    """Raised when an upstream body exceeds the passthrough limit (maps to HTTP 502)"""
+
+    def __init__(self, upstream, size, max_bytes):
+        super().__init__(f"Upstream '{upstream}' response too large: {size} bytes (limit {max_bytes})")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+def _chunks(upstream_response, name, decode, max_bytes, chunk_size):
+    sent = 0
+    try:
+        for chunk in upstream_response.raw.stream(chunk_size, decode_content=decode):
+            sent += len(chunk)
+            if sent > max_bytes:
+                raise ResponseTooLarge(name, sent, max_bytes)
+            yield chunk
+    finally:
+        upstream_response.close()
+
+
+def stream_response(upstream_response, name, max_bytes, chunk_size=CHUNK_SIZE):
+    """
+    Relay a requests response opened with stream=True as a streamed Flask response.
+    Error statuses raise (requests.HTTPError) and oversized announced bodies raise
+    ResponseTooLarge before anything is sent; the upstream connection is closed either way.
+    """
+    try:
+        upstream_response.raise_for_status()
+        length = upstream_response.headers.get('Content-Length')
+        if length is not None and length.isdigit() and int(length) > max_bytes:
+            raise ResponseTooLarge(name, int(length), max_bytes)
+    except Exception:
+        upstream_response.close()
+        raise
+
+    headers = {k: upstream_response.headers[k] for k in RELAYED_HEADERS if k in upstream_response.headers}
+    encoding = headers.get('Content-Encoding', 'identity').lower()
+    # Decompress only for clients that cannot take the upstream's encoding
+    decode = encoding != 'identity' and not request.accept_encodings[encoding]
+    if decode:
+        headers.pop('Content-Encoding')
+        headers.pop('Content-Length', None)
+
+    response = Response(_chunks(upstream_response, name, decode, max_bytes, chunk_size),
+                        status=upstream_response.status_code, headers=headers, direct_passthrough=True)
+    if encoding != 'identity':
+        response.vary.add('Accept-Encoding')
+    response.call_on_close(upstream_response.close)
+    return response
@@ -0,0 +1,438 @@
+"""
+Impact physics model, ported from the ImpactCalculations class in js/calculations.js.
+
+Every function accepts Python scalars or NumPy arrays (broadcast against each
+other). calculate_all_effects() mirrors calculateAllEffects() and returns
+Python scalars for scalar input and arrays otherwise. Output keys match the
+JavaScript model so browser and server results are interchangeable.
+"""
+
+import numpy as np
+
+# Bump when any formula changes so cached results can be invalidated
+MODEL_VERSION = '1.0'
+
+# Material densities in kg/m³
+DENSITY_VALUES = {
+    'iron': 7800,      # Iron meteorite
+    'stone': 3300,     # Stony meteorite (chondrite)
+    'ice': 917,        # Ice/comet
+    'gold': 19300,     # Gold (theoretical)
+    'comet': 500,      # Comet nucleus (porous ice/rock)
+    'carbon': 2260,    # Carbonaceous chondrite
+    'concrete': 2400,  # Infrastructure
+    'wood': 800,       # Wooden structures
+    'water': 1000,     # Water density
+}
+DEFAULT_DENSITY_KEY = 'stone'
+
+# Physical constants
+GRAVITY = 9.81                # m/s² (Earth surface gravity)
+AIR_DENSITY_SEA_LEVEL = 1.225  # kg/m³
+SCALE_HEIGHT = 8500           # m (atmospheric scale height)
+SOUND_SPEED = 340             # m/s (speed of sound in air)
+DRAG_COEFF = 0.47             # sphere
+
+# Target properties (Earth's crust)
+TARGET_DENSITY = 2700         # kg/m³ (typical crustal rock)
+TARGET_STRENGTH = 65e6        # Pa (compressive strength of granite)
+
+# Crater scaling parameters (Holsapple & Schmidt, 1987), gravity regime
+CRATER_K1 = 0.132
+CRATER_MU = 0.41
+CRATER_NU = 0.4
+
+MEGATON_J = 4.184e15
+SEAWATER_DENSITY = 1025
+DEFAULT_WATER_DEPTH = 4000
+
+
+def _round(x):
+    """JavaScript Math.round (halves round towards +infinity)"""
+    return np.floor(np.asarray(x, dtype=np.float64) + 0.5)
+
+
+def density_kg_m3(density_key):
+    """Material density for a key or array of keys; unknown keys fall back to stone"""
+    keys = np.asarray(density_key)
+    if keys.dtype.kind not in 'US':
+        # Numeric input is already a density in kg/m³
+        return keys.astype(np.float64)
+    result = np.full(keys.shape, float(DENSITY_VALUES[DEFAULT_DENSITY_KEY]))
+    for name, value in DENSITY_VALUES.items():
+        result[keys == name] = value
+    return result
+
+
+def calculate_mass(diameter, density):
+    """Meteorite mass in kg (diameter in m, density in kg/m³)"""
+    radius = np.asarray(diameter, dtype=np.float64) / 2
+    return (4 / 3) * np.pi * radius ** 3 * density
+
+
+def joules_to_megatons(joules):
+    return np.asarray(joules, dtype=np.float64) / MEGATON_J
+
+
+def calculate_atmospheric_entry(diameter, velocity, density, angle):
+    """Atmospheric entry effects (Passey & Melosh, 1980; simplified Collins et al., 2005)"""
+    diameter = np.asarray(diameter, dtype=np.float64)
+    mass = calculate_mass(diameter, density)
+    velocity_ms = np.asarray(velocity, dtype=np.float64) * 1000
+
+    cross_section = np.pi * (diameter / 2) ** 2
+    ballistic_coeff = mass / cross_section
+
+    sin_angle = np.sin(np.radians(angle))
+
+    # Exponential atmosphere evaluated at sea level
+    impact_altitude = 0
+    air_density = AIR_DENSITY_SEA_LEVEL * np.exp(-impact_altitude / SCALE_HEIGHT)
+
+    H = SCALE_HEIGHT * sin_angle
+    drag_parameter = (DRAG_COEFF * air_density * H) / (2 * ballistic_coeff * sin_angle)
+
+    airburst = drag_parameter >= 1
+    final_velocity = np.where(
+        airburst,
+        np.sqrt(2 * GRAVITY * H),  # Breaks up: terminal velocity
+        velocity_ms * np.sqrt(np.where(airburst, 0, 1 - drag_parameter)))
+
+    initial_ke = 0.5 * mass * velocity_ms ** 2
+    final_ke = 0.5 * mass * final_velocity ** 2
+
+    return {
+        'finalVelocity': final_velocity / 1000,
+        'finalKE': final_ke,
+        'energyLoss': initial_ke - final_ke,
+        'airburst': airburst,
+        'altitude': np.where(airburst, H * (1 - 1 / drag_parameter), 0.0),
+    }
+
+
+def calculate_crater_diameter(diameter, velocity, density, angle):
+    """Crater diameter in km, Holsapple & Schmidt (1987) gravity-regime scaling"""
+    diameter = np.asarray(diameter, dtype=np.float64)
+    velocity_ms = np.asarray(velocity, dtype=np.float64) * 1000
+    mass = calculate_mass(diameter, density)
+
+    sin_angle = np.sin(np.radians(angle))
+    angle_effect = sin_angle ** (1 / 3)
+
+    v_eff = velocity_ms * sin_angle
+    energy_per_mass = 0.5 * v_eff ** 2
+
+    projectile_volume = mass / density
+    projectile_length = projectile_volume ** (1 / 3)
+
+    pi2 = (mass / TARGET_DENSITY) * (energy_per_mass / (GRAVITY * projectile_length)) ** CRATER_MU
+    crater_volume = CRATER_K1 * pi2
+
+    # Complex craters: depth ~ 1/5 of the diameter
+    crater_diameter = 2 * ((3 * crater_volume) / (np.pi * 0.2)) ** (1 / 3)
+    final_crater_diameter = crater_diameter * angle_effect / 1000
+
+    # Minimum 20x projectile diameter
+    return np.maximum(final_crater_diameter, diameter / 1000 * 20)
+
+
+def calculate_blast_zones(energy_megatons):
+    """Overpressure radii in km (Glasstone & Dolan, 1977): R = C * E^(1/3)"""
+    e_third = np.asarray(energy_megatons, dtype=np.float64) ** (1 / 3)
+    return {
+        'totalDestruction': 0.28 * e_third,     # 20 psi
+        'severeDestruction': 0.4 * e_third,     # 10 psi
+        'moderateDestruction': 0.71 * e_third,  # 5 psi
+        'lightDestruction': 1.27 * e_third,     # 2 psi
+        'glassBreakage': 2.2 * e_third,         # 1 psi
+    }
+
+
+# Share of the population killed in each blast ring; injuries are 2.8x fatalities
+ZONE_FATALITY_RATES = {
+    'totalDestruction': 0.98,
+    'severeDestruction': 0.75,
+    'moderateDestruction': 0.3,
+    'lightDestruction': 0.05,
+}
+INJURY_RATIO = 2.8
+
+
+def casualties_from_zone_population(zone_population):
+    """Casualties from the number of people in each blast ring ({zone: people})"""
+    fatalities = sum(
+        np.asarray(zone_population[zone], dtype=np.float64) * rate
+        for zone, rate in ZONE_FATALITY_RATES.items())
+    injuries = fatalities * INJURY_RATIO
+    return {
+        'fatalities': _round(fatalities).astype(np.int64),
+        'injuries': _round(injuries).astype(np.int64),
+        'totalAffected': _round(fatalities + injuries).astype(np.int64),
+    }
+
+
+def estimate_casualties_with_infrastructure(energy_megatons, population_density):
+    """Casualties per blast ring (Collins et al., 2005)"""
+    zones = calculate_blast_zones(energy_megatons)
+    total_r = zones['totalDestruction']
+    severe_r = zones['severeDestruction']
+    moderate_r = zones['moderateDestruction']
+    light_r = zones['lightDestruction']
+
+    total_area = np.pi * total_r ** 2
+    severe_area = np.pi * (severe_r ** 2 - total_r ** 2)
+    moderate_area = np.pi * (moderate_r ** 2 - severe_r ** 2)
+    light_area = np.pi * (light_r ** 2 - moderate_r ** 2)
+
+    fatalities = (
+        total_area * population_density * ZONE_FATALITY_RATES['totalDestruction']
+        + severe_area * population_density * ZONE_FATALITY_RATES['severeDestruction']
+        + moderate_area * population_density * ZONE_FATALITY_RATES['moderateDestruction']
+        + light_area * population_density * ZONE_FATALITY_RATES['lightDestruction'])
+    injuries = fatalities * INJURY_RATIO
+
+    return {
+        'fatalities': _round(fatalities).astype(np.int64),
+        'injuries': _round(injuries).astype(np.int64),
+        'totalAffected': _round(fatalities + injuries).astype(np.int64),
+        'zones': zones,
+    }
+
+
+def calculate_earthquake_magnitude(energy_joules):
+    """Richter magnitude from seismic energy, Kanamori (1977)"""
+    ergs = np.asarray(energy_joules, dtype=np.float64) * 1e7
+    seismic_energy = ergs * 0.005  # ~0.5% of the impact energy becomes seismic
+    with np.errstate(divide='ignore'):
+        magnitude = (2 / 3) * np.log10(seismic_energy) - 6.0
+    return np.maximum(magnitude, 0)
+
+
+def calculate_seismic_radius(energy_joules, energy_megatons):
+    """Distance in km where shaking is still felt (MMI III-IV)"""
+    magnitude = calculate_earthquake_magnitude(energy_joules)
+    radius_km = 10 ** (0.53 * magnitude - 0.18)
+    max_radius = np.asarray(energy_megatons, dtype=np.float64) ** 0.35 * 150
+    return np.minimum(radius_km, max_radius)
+
+
+def calculate_tsunami_height(energy_joules, water_depth=DEFAULT_WATER_DEPTH, is_ocean_impact=False):
+    """Coastal tsunami height in m (Ward & Asphaug, 2000); 0 for land impacts"""
+    tsunami_energy = np.asarray(energy_joules, dtype=np.float64) * 0.1
+    amplitude = (tsunami_energy / (SEAWATER_DENSITY * GRAVITY * water_depth ** 2)) ** 0.25 * water_depth
+    amplification_factor = 3.5  # shoaling
+    height = np.maximum(amplitude / 1000 * amplification_factor, 1)
+    return np.where(is_ocean_impact, height, 0.0)
+
+
+def calculate_tsunami_radius(energy_joules, is_ocean_impact=False):
+    """Radius in km where the wave is still damaging (>2 m), capped at 10,000 km"""
+    height = calculate_tsunami_height(energy_joules, DEFAULT_WATER_DEPTH, True)
+    damaging_threshold = 2.0
+    r0 = 10  # km reference distance
+    radius = np.minimum(r0 * (height / damaging_threshold) ** 2, 10000)
+    return np.where(is_ocean_impact, radius, 0.0)
+
+
+def calculate_fire_radius(energy_megatons):
+    """Thermal ignition radius in km (Glasstone & Dolan, 1977)"""
+    thermal_yield = np.asarray(energy_megatons, dtype=np.float64) * 0.35
+    return np.maximum(0.92 * thermal_yield ** 0.41, 0.5)
+
+
+def calculate_dust_cloud_radius(energy_megatons):
+    """Ejecta / dust plume radius in km (Toon et al., 1997; Melosh, 1989)"""
+    megatons = np.asarray(energy_megatons, dtype=np.float64)
+    ejecta_radius = np.maximum(megatons ** 0.33 * 18, 5)
+    return np.select(
+        [megatons > 1e6, megatons > 1000],
+        [20000.0, megatons ** 0.4 * 50],
+        ejecta_radius)
+
+
+def calculate_global_climate_effects(energy_megatons):
+    """Temperature drop (°C) and duration (years) for large impacts"""
+    megatons = np.asarray(energy_megatons, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_mt = np.log10(megatons)
+    factor = np.select([megatons > 1000, megatons > 100], [2.0, 1.0], 0.0)
+    effect = np.where(factor > 0, log_mt * factor, 0.0)
+    return {
+        'temperatureDrop': effect,
+        'duration': effect,
+        'globalImpact': megatons > 1000,
+    }
+
+
+def calculate_survival_probability(distance, energy_megatons):
+    zones = calculate_blast_zones(energy_megatons)
+    distance = np.asarray(distance, dtype=np.float64)
+    return np.select(
+        [distance <= zones['totalDestruction'],
+         distance <= zones['severeDestruction'],
+         distance <= zones['moderateDestruction']],
+        [0.05, 0.5, 0.9],
+        0.98)
+
+
+def calculate_secondary_effect_timing(distance, energy_megatons):
+    distance = np.asarray(distance, dtype=np.float64)
+    return {
+        'earthquake': np.zeros_like(distance),
+        'tsunami': distance / 200,
+        'fire': np.sqrt(distance) * 0.1,
+        'dust': distance / 50,
+        'climate': 365 * np.log10(np.maximum(energy_megatons, 1)),
+    }
+
+
+def get_earthquake_description(magnitude):
+    return np.select(
+        [magnitude < 3, magnitude < 5, magnitude < 6, magnitude < 7],
+        ['Negligible', 'Minor tremors', 'Moderate damage', 'Severe damage'],
+        'Catastrophic')
+
+
+def get_tsunami_description(height):
+    return np.select(
+        [height < 5, height < 15, height < 30],
+        ['Minimal wave', 'Moderate wave', 'Dangerous wave'],
+        'Catastrophic wave')
+
+
+def get_fire_description(radius):
+    return np.select(
+        [radius < 5, radius < 15, radius < 30],
+        ['Localized fires', 'Widespread fires', 'Massive firestorm'],
+        'Global conflagration')
+
+
+def get_dust_description(radius):
+    return np.select(
+        [radius < 50, radius < 200, radius < 1000],
+        ['Local dust cloud', 'Regional obscuration', 'Continental darkness'],
+        'Global atmospheric impact')
+
+
+IMPACT_CLASSES = (
+    (0.001, 'Local', 'Local impact, minor damage.'),
+    (0.1, 'Regional', 'Regional impact, significant damage.'),
+    (10, 'Continental', 'Continental impact, massive devastation.'),
+    (1000, 'Global', 'Global impact, climate change.'),
+)
+
+
+def classify_impact(energy_megatons):
+    conditions = [energy_megatons < limit for limit, _, _ in IMPACT_CLASSES]
+    return {
+        'level': np.select(conditions, [level for _, level, _ in IMPACT_CLASSES], 'Extinction'),
+        'description': np.select(
+            conditions, [desc for _, _, desc in IMPACT_CLASSES], 'Mass extinction event.'),
+    }
+
+
+def calculate_all_effects(diameter, velocity, density_key, angle=45,
+                          population_density=1000, is_ocean_impact=False):
+    """
+    Port of calculateAllEffects(): diameter in m, velocity in km/s, angle in
+    degrees, population density in people/km².
+    """
+    scalar_input = all(np.ndim(v) == 0 for v in (
+        diameter, velocity, density_key, angle, population_density, is_ocean_impact))
+
+    diameter, velocity, material_density, angle, population_density, is_ocean_impact = np.broadcast_arrays(
+        np.asarray(diameter, dtype=np.float64),
+        np.asarray(velocity, dtype=np.float64),
+        density_kg_m3(density_key),
+        np.asarray(angle, dtype=np.float64),
+        np.asarray(population_density, dtype=np.float64),
+        np.asarray(is_ocean_impact, dtype=bool))
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        mass = calculate_mass(diameter, material_density)
+
+        # Kinetic energy after atmospheric entry
+        entry = calculate_atmospheric_entry(diameter, velocity, material_density, angle)
+        energy = entry['finalKE']
+        energy_megatons = joules_to_megatons(energy)
+
+        casualties = estimate_casualties_with_infrastructure(energy_megatons, population_density)
+        earthquake_magnitude = calculate_earthquake_magnitude(energy)
+        tsunami_height = calculate_tsunami_height(energy, DEFAULT_WATER_DEPTH, is_ocean_impact)
+        fire_radius = calculate_fire_radius(energy_megatons)
+        dust_radius = calculate_dust_cloud_radius(energy_megatons)
+
+        result = {
+            'mass': mass,
+            'energy': energy,
+            'energyMegatons': energy_megatons,
+            'craterDiameter': calculate_crater_diameter(diameter, velocity, material_density, angle),
+            'casualties': casualties,
+            'totalDestructionZone': casualties['zones']['totalDestruction'],
+            'impactClassification': classify_impact(energy_megatons),
+            'atmosphericEntry': {
+                'initialVelocity': velocity,
+                'finalVelocity': entry['finalVelocity'],
+                'energyLoss': joules_to_megatons(entry['energyLoss']),
+                'airburst': entry['airburst'],
+                'airburstAltitude': entry['altitude'],
+            },
+            'earthquake': {
+                'magnitude': earthquake_magnitude,
+                'radius': calculate_seismic_radius(energy, energy_megatons),
+                'description': get_earthquake_description(earthquake_magnitude),
+            },
+            'tsunami': {
+                'height': tsunami_height,
+                'radius': calculate_tsunami_radius(energy, is_ocean_impact),
+                'description': get_tsunami_description(tsunami_height),
+                'applicable': is_ocean_impact,
+            },
+            'fire': {
+                'radius': fire_radius,
+                'description': get_fire_description(fire_radius),
+            },
+            'dust': {
+                'radius': dust_radius,
+                'description': get_dust_description(dust_radius),
+            },
+        }
+
+    return to_python(result) if scalar_input else result
+
+
+# Flat names for the headline outputs of calculate_all_effects(), used by
+# bulk endpoints (Monte Carlo, sweeps) that return one value per metric
+FLAT_OUTPUTS = {
+    'energyMegatons': ('energyMegatons',),
+    'craterDiameter': ('craterDiameter',),
+    'totalDestructionZone': ('casualties', 'zones', 'totalDestruction'),
+    'severeDestructionZone': ('casualties', 'zones', 'severeDestruction'),
+    'moderateDestructionZone': ('casualties', 'zones', 'moderateDestruction'),
+    'lightDestructionZone': ('casualties', 'zones', 'lightDestruction'),
+    'fatalities': ('casualties', 'fatalities'),
+    'injuries': ('casualties', 'injuries'),
+    'earthquakeMagnitude': ('earthquake', 'magnitude'),
+    'fireRadius': ('fire', 'radius'),
+    'dustRadius': ('dust', 'radius'),
+    'tsunamiHeight': ('tsunami', 'height'),
+    'airburst': ('atmosphericEntry', 'airburst'),
+}
+
+
+def flatten_outputs(result, names=None):
+    """Pick FLAT_OUTPUTS (or a subset) out of a calculate_all_effects() result"""
+    flat = {}
+    for name in names or FLAT_OUTPUTS:
+        value = result
+        for key in FLAT_OUTPUTS[name]:
+            value = value[key]
+        flat[name] = value
+    return flat
+
+
+def to_python(result):
+    """Convert 0-d arrays in a result tree to plain Python scalars"""
+    if isinstance(result, dict):
+        return {key: to_python(value) for key, value in result.items()}
+    return np.asarray(result).item()
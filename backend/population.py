@@ -0,0 +1,276 @@
+"""
+Gridded population with a summed-area table for population-in-area queries.
+
+A global equirectangular population-count grid (row 0 at 90°N, column 0 at
+180°W) is turned once into its summed-area table S, where S[r, c] is the
+population of all cells above and left of (r, c). The table is stored as a
+float64 .npy file and memory-mapped, so a query only touches the pages it
+reads.
+
+Treating each cell's population as spread uniformly makes S bilinear
+between grid points. A box with fractional edges therefore costs four
+interpolated reads. A circle (or a ring, the difference of two circles)
+is summed as one box per latitude row that it crosses. That is a handful
+of vectorized reads whatever the radius, so continental zones cost about
+the same as city-sized ones.
+
+    python -m backend.population build gpw_count_2pt5_min.asc population_sat.npy
+    python -m backend.population build counts.npy population_sat.npy
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from backend import physics
+
+EARTH_RADIUS_KM = 6371.0088
+BAND_ROWS = 512
+# A circle is summed over at least this many latitude strips, so small radii
+# (a few cells across) are not approximated by one or two rectangles
+MIN_STRIPS = 32
+
+
+def check_point(lat, lon):
+    """Raise ValueError unless lat/lon are finite and within +-90/+-180"""
+    if not (math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180):
+        raise ValueError(f'lat/lon out of range: {lat}, {lon}')
+
+
+class PopulationGrid:
+    """Memory-mapped summed-area table over a global population grid"""
+
+    def __init__(self, path):
+        self.path = path
+        self.sat = np.load(path, mmap_mode='r')
+        self.rows = self.sat.shape[0] - 1
+        self.cols = self.sat.shape[1] - 1
+        self.cell_deg = 180.0 / self.rows
+        with open(path + '.json') as f:
+            self.meta = json.load(f)
+
+    def _cumulative(self, r, c):
+        """Population above row r and left of column c (fractional, bilinear in S)"""
+        r = np.clip(np.asarray(r, dtype=np.float64), 0, self.rows)
+        c = np.clip(np.asarray(c, dtype=np.float64), 0, self.cols)
+        r0 = np.minimum(np.floor(r).astype(np.int64), self.rows - 1)
+        c0 = np.minimum(np.floor(c).astype(np.int64), self.cols - 1)
+        dr, dc = r - r0, c - c0
+        s00, s01 = self.sat[r0, c0], self.sat[r0, c0 + 1]
+        s10, s11 = self.sat[r0 + 1, c0], self.sat[r0 + 1, c0 + 1]
+        return (s00 * (1 - dr) * (1 - dc) + s01 * (1 - dr) * dc
+                + s10 * dr * (1 - dc) + s11 * dr * dc)
+
+    def _rect(self, r0, r1, c0, c1):
+        """Population in fractional grid rectangles [r0, r1) x [c0, c1) (no wrap)"""
+        return (self._cumulative(r1, c1) - self._cumulative(r0, c1)
+                - self._cumulative(r1, c0) + self._cumulative(r0, c0))
+
+    def _row(self, lat):
+        return (90.0 - np.asarray(lat, dtype=np.float64)) / self.cell_deg
+
+    def _col(self, lon):
+        return (np.asarray(lon, dtype=np.float64) + 180.0) / self.cell_deg
+
+    def box(self, south, west, north, east):
+        """Population inside a lat/lon box (west > east crosses the antimeridian)"""
+        check_point(south, west)
+        check_point(north, east)
+        if south > north:
+            raise ValueError('south must not be north of north')
+        r0, r1 = self._row(north), self._row(south)
+        if west <= east:
+            return float(self._rect(r0, r1, self._col(west), self._col(east)))
+        return float(self._rect(r0, r1, self._col(west), self.cols)
+                     + self._rect(r0, r1, 0.0, self._col(east)))
+
+    def circle(self, lat, lon, radius_km):
+        """Population within a great-circle radius of (lat, lon)"""
+        check_point(lat, lon)
+        if not math.isfinite(radius_km):
+            raise ValueError(f'radius must be finite: {radius_km}')
+        if radius_km <= 0:
+            return 0.0
+        delta = min(radius_km / EARTH_RADIUS_KM, math.pi)
+        north = min(90.0, lat + math.degrees(delta))
+        south = max(-90.0, lat - math.degrees(delta))
+
+        # Strips bounded by grid rows, with fractional first and last strips
+        top, bottom = float(self._row(north)), float(self._row(south))
+        edges = np.concatenate([[top], np.arange(math.floor(top) + 1, math.ceil(bottom)), [bottom]])
+        if len(edges) <= MIN_STRIPS:
+            edges = np.union1d(edges, np.linspace(top, bottom, MIN_STRIPS + 1))
+        r0, r1 = edges[:-1], edges[1:]
+        mid_lat = np.radians(90.0 - (r0 + r1) / 2 * self.cell_deg)
+
+        # Half-width in longitude of the spherical cap at each strip's latitude
+        phi0 = math.radians(lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_dlon = (math.cos(delta) - np.sin(mid_lat) * math.sin(phi0)) / (np.cos(mid_lat) * math.cos(phi0))
+        half = np.degrees(np.arccos(np.clip(np.nan_to_num(cos_dlon, nan=-1.0), -1.0, 1.0)))
+
+        width = 2 * half / self.cell_deg
+        c0 = self._col(lon - half)
+        c1 = c0 + width
+        full = width >= self.cols
+        # Split spans crossing the antimeridian into two pieces
+        low = np.where(c0 < 0, c0 + self.cols, c0)
+        high = np.where(c0 < 0, c1 + self.cols, c1)
+        first = self._rect(r0, r1, low, np.minimum(high, self.cols))
+        wrapped = self._rect(r0, r1, 0.0, np.clip(high - self.cols, 0, self.cols))
+        whole = self._rect(r0, r1, 0.0, float(self.cols))
+        return float(np.where(full, whole, first + wrapped).sum())
+
+    def ring(self, lat, lon, inner_km, outer_km):
+        """Population between two radii"""
+        return self.circle(lat, lon, outer_km) - self.circle(lat, lon, inner_km)
+
+    def zone_population(self, lat, lon, zones):
+        """People in each blast ring, given zone radii in km (as in physics.calculate_blast_zones)"""
+        result, previous = {}, 0.0
+        for zone in physics.ZONE_FATALITY_RATES:
+            within = self.circle(lat, lon, float(zones[zone]))
+            result[zone] = max(0.0, within - previous)
+            previous = within
+        return result
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'rows': self.rows,
+            'cols': self.cols,
+            'resolutionArcmin': self.cell_deg * 60,
+            'totalPopulation': self.meta.get('total'),
+            'source': self.meta.get('source'),
+        }
+
+
+def apply_to_impact(grid, lat, lon, result):
+    """Replace the uniform-density casualties in an impact result with grid-based ones"""
+    zones = result['casualties']['zones']
+    zone_population = grid.zone_population(lat, lon, zones)
+    casualties = physics.to_python(physics.casualties_from_zone_population(zone_population))
+    result['casualties'].update(casualties)
+    result['casualties']['zonePopulation'] = {k: round(v) for k, v in zone_population.items()}
+    result['casualties']['populationSource'] = 'grid'
+    return result
+
+
+def circle_area_km2(radius_km):
+    """Area of a spherical cap of great-circle radius radius_km"""
+    delta = min(radius_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.pi * EARTH_RADIUS_KM ** 2 * (1 - math.cos(delta))
+
+
+def box_area_km2(south, west, north, east):
+    """Area of a lat/lon box (west > east crosses the antimeridian)"""
+    span = (east - west) % 360 or 360.0
+    band = math.sin(math.radians(north)) - math.sin(math.radians(south))
+    return EARTH_RADIUS_KM ** 2 * band * math.radians(span)
+
+
+def cell_areas_km2(rows, cols):
+    """Area of one cell in each row of a global grid (km², shape (rows, 1))"""
+    edges = np.radians(90.0 - np.arange(rows + 1) * 180.0 / rows)
+    band = np.abs(np.sin(edges[:-1]) - np.sin(edges[1:]))
+    return (EARTH_RADIUS_KM ** 2 * band * (2 * math.pi / cols))[:, None]
+
+
+def read_ascii_grid(path):
+    """ESRI ASCII grid (as shipped by GPW) placed into a global grid; NODATA becomes 0"""
+    header = {}
+    with open(path) as f:
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            match = re.match(r'\s*([A-Za-z_]+)\s+(\S+)', line)
+            if not match or match.group(1).lower() not in (
+                    'ncols', 'nrows', 'xllcorner', 'yllcorner', 'xllcenter', 'yllcenter',
+                    'cellsize', 'nodata_value'):
+                f.seek(pos)
+                break
+            header[match.group(1).lower()] = float(match.group(2))
+        values = np.array(f.read().split(), dtype=np.float64)
+
+    ncols, nrows, cell = int(header['ncols']), int(header['nrows']), header['cellsize']
+    west = header.get('xllcorner', header.get('xllcenter', -180.0) - cell / 2)
+    south = header.get('yllcorner', header.get('yllcenter', -90.0) - cell / 2)
+    data = values.reshape(nrows, ncols)
+    if 'nodata_value' in header:
+        data[data == header['nodata_value']] = 0.0
+    data[~np.isfinite(data) | (data < 0)] = 0.0
+
+    rows, cols = int(round(180 / cell)), int(round(360 / cell))
+    grid = np.zeros((rows, cols))
+    row0 = int(round((90.0 - (south + nrows * cell)) / cell))
+    col0 = int(round((west + 180.0) / cell))
+    grid[row0:row0 + nrows, col0:col0 + ncols] = data
+    return grid
+
+
+def build(source, output, density=False):
+    """Write the summed-area table for a population grid (.asc or global .npy) and its .json sidecar"""
+    grid = read_ascii_grid(source) if source.endswith('.asc') else np.load(source).astype(np.float64)
+    rows, cols = grid.shape
+    if cols != 2 * rows:
+        raise ValueError('grid must be global and equirectangular (2:1)')
+    grid = np.nan_to_num(grid, nan=0.0)
+    if density:
+        # people/km² -> people per cell
+        grid = grid * cell_areas_km2(rows, cols)
+
+    tmp = output + f'.tmp-{os.getpid()}.npy'
+    sat = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=(rows + 1, cols + 1))
+    sat[0, :] = 0.0
+    sat[:, 0] = 0.0
+    running = np.zeros(cols)
+    for start in range(0, rows, BAND_ROWS):
+        band = np.cumsum(grid[start:start + BAND_ROWS], axis=1)
+        band = np.cumsum(band, axis=0) + running
+        sat[start + 1:start + 1 + len(band), 1:] = band
+        running = band[-1]
+    sat.flush()
+    del sat
+
+    os.replace(tmp, output)
+    # Sidecar last and atomically, so readers never see metadata ahead of the grid
+    meta_tmp = output + f'.json.tmp-{os.getpid()}'
+    with open(meta_tmp, 'w') as f:
+        json.dump({'rows': rows, 'cols': cols, 'total': float(running[-1]),
+                   'source': os.path.basename(source), 'built': time.time()}, f)
+    os.replace(meta_tmp, output + '.json')
+    return rows, cols, float(running[-1])
+
+
+def population_grid_from_env():
+    """PopulationGrid from POPULATION_GRID_PATH, or None when not configured or missing"""
+    path = os.environ.get('POPULATION_GRID_PATH')
+    if not path or not os.path.exists(path):
+        return None
+    return PopulationGrid(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the population summed-area table')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='from an ESRI ASCII grid or a global .npy of counts')
+    build_cmd.add_argument('source')
+    build_cmd.add_argument('output')
+    build_cmd.add_argument('--density', action='store_true',
+                           help='input is people/km² rather than people per cell')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows, cols, total = build(args.source, args.output, density=args.density)
+    print(f'Built {rows}x{cols} table, {total:,.0f} people, in {time.perf_counter() - start:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Content-addressed store of complete /api/impact/simulate results.
+
+A scenario is identified by a hash of its canonical inputs: the meteor
+parameters, the impact point snapped to a grid cell, the physics
+MODEL_VERSION and the local datasets the pipeline used (land mask,
+population grid, gazetteer) with their build times, so rebuilding a
+dataset retires the results computed from the old one. Asking for the same
+scenario again, whether a preset like Apophis over a capital or a shared
+link, is one SQLite lookup instead of the physics plus Overpass and
+geocoding. The id is stable and can be shared (GET /api/scenarios/<id>).
+
+Results are stored as encoded JSON. Bumping MODEL_VERSION changes every
+id, so old results are never served, and they are dropped the next time
+the store is opened. Total size is bounded by evicting the least recently
+used results.
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from backend.datadir import data_path
+from backend.physics import MODEL_VERSION
+
+DEFAULT_GRID_DEG = 0.01        # ~1.1 km; well under the smallest blast radius worth mapping
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ID_LENGTH = 24                 # hex characters of the SHA-256 (96 bits)
+
+
+def snap(value, grid_deg, limit):
+    """Center of the grid cell containing value, kept within +-limit"""
+    return max(-limit, min(limit, round((math.floor(value / grid_deg) + 0.5) * grid_deg, 9)))
+
+
+def canonical_inputs(params, grid_deg=DEFAULT_GRID_DEG, sources=()):
+    """
+    The inputs that determine a simulate result, normalized so equal
+    scenarios compare equal. Coordinates are replaced by their grid cell center.
+    """
+    return {
+        'modelVersion': MODEL_VERSION,
+        'diameter': float(f"{params['diameter']:.6g}"),
+        'velocity': float(f"{params['velocity']:.6g}"),
+        'angle': float(f"{params['angle']:.6g}"),
+        'density': params['density'].strip().lower(),
+        'lat': snap(params['lat'], grid_deg, 90),
+        'lon': snap(params['lon'], grid_deg, 180),
+        'gridDeg': grid_deg,
+        'sources': sorted(sources),
+    }
+
+
+def scenario_id(inputs):
+    """Stable id for canonical inputs"""
+    encoded = json.dumps(inputs, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:ID_LENGTH]
+
+
+class ScenarioStore:
+    """Results shared by every worker on the host through one SQLite file in WAL mode"""
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, grid_deg=DEFAULT_GRID_DEG):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.grid_deg = grid_deg
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS scenarios ('
+                ' id TEXT PRIMARY KEY, model_version TEXT NOT NULL, inputs TEXT NOT NULL,'
+                ' result BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL,'
+                ' accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)')
+            db.execute('CREATE INDEX IF NOT EXISTS scenarios_accessed ON scenarios (accessed)')
+            # Results of an older physics model can never be asked for again
+            db.execute('DELETE FROM scenarios WHERE model_version != ?', (MODEL_VERSION,))
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not shareable across threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def key(self, params, sources=()):
+        """(scenario id, canonical inputs) for parsed simulate params"""
+        inputs = canonical_inputs(params, self.grid_deg, sources)
+        return scenario_id(inputs), inputs
+
+    def get(self, scenario):
+        """Encoded result for a scenario id, or None"""
+        db = self._connect()
+        row = db.execute('SELECT result FROM scenarios WHERE id = ?', (scenario,)).fetchone()
+        self._bump('_misses' if row is None else '_hits')
+        if row is None:
+            return None
+        db.execute('UPDATE scenarios SET accessed = ?, hits = hits + 1 WHERE id = ?', (time.time(), scenario))
+        return bytes(row[0])
+
+    def put(self, scenario, inputs, result):
+        """Store an encoded result under its scenario id"""
+        now = time.time()
+        self._connect().execute(
+            'INSERT OR REPLACE INTO scenarios (id, model_version, inputs, result, size, created, accessed)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (scenario, inputs['modelVersion'], json.dumps(inputs, sort_keys=True), result, len(result), now, now))
+        self._maybe_purge(now)
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        db = self._connect()
+        # Evict least recently used results until under the byte budget
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM scenarios').fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            victims = []
+            for scenario, size in db.execute('SELECT id, size FROM scenarios ORDER BY accessed').fetchall():
+                if excess <= 0:
+                    break
+                victims.append((scenario,))
+                excess -= size
+            db.executemany('DELETE FROM scenarios WHERE id = ?', victims)
+
+    def _bump(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def stats(self):
+        count, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scenarios').fetchone()
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'path': self.path,
+                'modelVersion': MODEL_VERSION,
+                'gridDeg': self.grid_deg,
+                'scenarios': count,
+                'bytes': size,
+                'maxBytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hitRate': self._hits / lookups if lookups else 0.0,
+            }
+
+
+def scenario_store_from_env():
+    """
+    Store at SCENARIO_STORE_PATH (default scenario_results.db in DATA_DIR; empty disables it),
+    sized by SCENARIO_STORE_MAX_BYTES, snapping locations to SCENARIO_GRID_DEG.
+    """
+    path = os.environ.get('SCENARIO_STORE_PATH')
+    if path is None:
+        path = data_path('scenario_results.db')
+    if not path:
+        return None
+    max_bytes = int(os.environ.get('SCENARIO_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+    grid_deg = float(os.environ.get('SCENARIO_GRID_DEG', DEFAULT_GRID_DEG))
+    return ScenarioStore(path, max_bytes=max_bytes, grid_deg=grid_deg)
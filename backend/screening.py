@@ -0,0 +1,274 @@
+"""
+Catalog-wide Earth MOID screening.
+
+For every orbit in a catalog snapshot the minimum orbit intersection
+distance to Earth's orbit is found by a coarse grid over both eccentric
+anomalies, followed by a shrinking local grid around the best candidate
+minima. Each MOID point also gives the two heliocentric velocity vectors,
+so encounter speed comes from the real geometry, not from a head-on guess
+at 1 AU. Chunks of orbits are spread over a process pool, and the ranked
+table is written next to the snapshot it was computed from.
+
+    python -m backend.screening --root catalog [--workers 8]
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from backend.catalog import Catalog
+from backend.ephemeris import AU_KM, GAUSS_K, perifocal_basis
+
+# Earth's mean J2000 orbit (ecliptic, so inclination and node are zero)
+EARTH_ELEMENTS = {'a': 1.00000261, 'e': 0.01671123, 'i': 0.0, 'om': 0.0, 'w': 102.93768193}
+EARTH_ESCAPE_KM_S = 11.186
+# Orbital speed unit: 1 AU/day in units of k, expressed in km/s
+VELOCITY_UNIT_KM_S = GAUSS_K * AU_KM / 86400.0
+
+COARSE_POINTS = 48
+REFINE_POINTS = 9
+REFINE_ROUNDS = 10
+CANDIDATES = 2
+CHUNK_SIZE = 512
+DEFAULT_ALBEDO = 0.14
+RESULT_FILE = 'screening.json'
+RESULT_FIELDS = ('rank', 'spkid', 'full_name', 'pha', 'H', 'diameter', 'moid',
+                 'vRelative', 'vImpact', 'scenarioDiameter')
+
+
+def _orbit_state(a, e, P, Q, E):
+    """Positions (AU) and velocities (km/s) at eccentric anomalies E; a, e broadcast to E"""
+    cos_E, sin_E = np.cos(E), np.sin(E)
+    root = np.sqrt(1.0 - e ** 2)
+    x, y = a * (cos_E - e), a * root * sin_E
+    # Perifocal velocity: sqrt(mu a) / r * (-sin E, sqrt(1 - e^2) cos E)
+    scale = np.sqrt(1.0 / a) / (1.0 - e * cos_E) * VELOCITY_UNIT_KM_S
+    vx, vy = -scale * sin_E, scale * root * cos_E
+    pos = x[..., None] * P + y[..., None] * Q
+    vel = vx[..., None] * P + vy[..., None] * Q
+    return pos, vel
+
+
+def _earth():
+    P, Q = perifocal_basis(EARTH_ELEMENTS['i'], EARTH_ELEMENTS['om'], EARTH_ELEMENTS['w'])
+    return EARTH_ELEMENTS['a'], EARTH_ELEMENTS['e'], P, Q
+
+
+def moid(elements):
+    """
+    MOID against Earth for arrays of orbital elements a, e, i, om, w.
+    Returns {moid (AU), vRelative (km/s), vImpact (km/s)}; unbound or
+    invalid orbits get NaN.
+    """
+    a = np.asarray(elements['a'], dtype=np.float64)
+    e = np.asarray(elements['e'], dtype=np.float64)
+    n = a.size
+    valid = np.isfinite(a) & np.isfinite(e) & (a > 0) & (e >= 0) & (e < 1)
+    a, e = np.where(valid, a, 1.0), np.where(valid, e, 0.0)
+    P, Q = perifocal_basis(np.nan_to_num(np.asarray(elements['i'], dtype=np.float64)),
+                           np.nan_to_num(np.asarray(elements['om'], dtype=np.float64)),
+                           np.nan_to_num(np.asarray(elements['w'], dtype=np.float64)))
+    a_earth, e_earth, P_earth, Q_earth = _earth()
+
+    # Coarse grid over both anomalies: (n, COARSE, COARSE) squared distances
+    grid = np.linspace(0.0, 2 * np.pi, COARSE_POINTS, endpoint=False)
+    pos, _ = _orbit_state(a[:, None], e[:, None], P[:, None, :], Q[:, None, :],
+                          np.broadcast_to(grid, (n, COARSE_POINTS)))
+    earth_pos, _ = _orbit_state(np.float64(a_earth), np.float64(e_earth), P_earth, Q_earth, grid)
+    d2 = ((pos[:, :, None, :] - earth_pos[None, None, :, :]) ** 2).sum(axis=-1)
+
+    # Best few local minima of the distance profile along the object's orbit
+    profile = d2.min(axis=2)
+    is_min = (profile <= np.roll(profile, 1, axis=1)) & (profile <= np.roll(profile, -1, axis=1))
+    ranked = np.argsort(np.where(is_min, profile, np.inf), axis=1)[:, :CANDIDATES]
+    rows = np.arange(n)[:, None]
+    E_obj = grid[ranked]
+    E_earth = grid[np.argmin(d2[rows, ranked], axis=2)]
+
+    # Refine every candidate on a shrinking local grid (candidates flattened into the batch)
+    idx = np.repeat(np.arange(n), CANDIDATES)
+    E_obj, E_earth = E_obj.ravel(), E_earth.ravel()
+    half = np.pi / COARSE_POINTS * 2
+    offsets = np.linspace(-1.0, 1.0, REFINE_POINTS)
+    for _ in range(REFINE_ROUNDS):
+        u = E_obj[:, None] + half * offsets
+        v = E_earth[:, None] + half * offsets
+        pos, _ = _orbit_state(a[idx, None], e[idx, None], P[idx, None, :], Q[idx, None, :], u)
+        earth_pos, _ = _orbit_state(np.float64(a_earth), np.float64(e_earth), P_earth, Q_earth, v)
+        local = ((pos[:, :, None, :] - earth_pos[:, None, :, :]) ** 2).sum(axis=-1)
+        best = local.reshape(len(idx), -1).argmin(axis=1)
+        E_obj = u[np.arange(len(idx)), best // REFINE_POINTS]
+        E_earth = v[np.arange(len(idx)), best % REFINE_POINTS]
+        half *= 2.0 / (REFINE_POINTS - 1)
+
+    pos, vel = _orbit_state(a[idx], e[idx], P[idx], Q[idx], E_obj)
+    earth_pos, earth_vel = _orbit_state(np.float64(a_earth), np.float64(e_earth), P_earth, Q_earth, E_earth)
+    dist = np.linalg.norm(pos - earth_pos, axis=-1).reshape(n, CANDIDATES)
+    v_rel = np.linalg.norm(vel - earth_vel, axis=-1).reshape(n, CANDIDATES)
+
+    pick = np.argmin(dist, axis=1)
+    result = {
+        'moid': dist[np.arange(n), pick],
+        'vRelative': v_rel[np.arange(n), pick],
+    }
+    # Earth's gravity accelerates the body on the way in
+    result['vImpact'] = np.sqrt(result['vRelative'] ** 2 + EARTH_ESCAPE_KM_S ** 2)
+    for values in result.values():
+        values[~valid] = np.nan
+    return result
+
+
+def diameter_from_h(H, albedo=DEFAULT_ALBEDO):
+    """Diameter in km from absolute magnitude for an assumed geometric albedo"""
+    return 1329.0 / math.sqrt(albedo) * 10 ** (-np.asarray(H, dtype=np.float64) / 5)
+
+
+def screen(elements, workers=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    MOID for every orbit in `elements`, chunked over a process pool.
+    progress(done, total) is called as chunks finish.
+    """
+    n = len(elements['a'])
+    bounds = [(s, min(s + chunk_size, n)) for s in range(0, n, chunk_size)]
+    results = {}
+    if workers == 1 or len(bounds) <= 1:
+        for k, (s, t) in enumerate(bounds):
+            results[k] = moid({f: v[s:t] for f, v in elements.items()})
+            if progress:
+                progress(t, n)
+    else:
+        # spawn: forking a threaded web worker is not safe
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                executor.submit(moid, {f: v[s:t] for f, v in elements.items()}): k
+                for k, (s, t) in enumerate(bounds)
+            }
+            done = 0
+            for future in as_completed(futures):
+                k = futures[future]
+                results[k] = future.result()
+                done += bounds[k][1] - bounds[k][0]
+                if progress:
+                    progress(done, n)
+    return {
+        field: np.concatenate([results[k][field] for k in range(len(bounds))]) if bounds else np.empty(0)
+        for field in ('moid', 'vRelative', 'vImpact')
+    }
+
+
+def build_table(snapshot, screened):
+    """Rows ranked by MOID (closest first), in the {fields, data} layout of sbdb_query"""
+    def column(name):
+        return np.asarray(snapshot.strings[name]).tolist() if name in snapshot.strings else [None] * snapshot.count
+
+    diameter_km = snapshot.numbers['diameter'] if 'diameter' in snapshot.numbers else np.full(snapshot.count, np.nan)
+    H = snapshot.numbers['H'] if 'H' in snapshot.numbers else np.full(snapshot.count, np.nan)
+    # Meters, for /api/impact/calculate; fall back to an H-based estimate
+    scenario_m = np.where(np.isfinite(diameter_km), diameter_km, diameter_from_h(H)) * 1000.0
+
+    order = np.argsort(screened['moid'], kind='stable')
+    order = order[np.isfinite(screened['moid'][order])]
+    spkid, name, pha = column('spkid'), column('full_name'), column('pha')
+    flags = snapshot.flags.get('pha')
+
+    data = []
+    for rank, row in enumerate(order.tolist(), start=1):
+        data.append([
+            rank, spkid[row], (name[row] or '').strip() or None,
+            bool(flags[row]) if flags is not None else pha[row],
+            None if np.isnan(H[row]) else float(H[row]),
+            None if np.isnan(diameter_km[row]) else float(diameter_km[row]),
+            round(float(screened['moid'][row]), 8),
+            round(float(screened['vRelative'][row]), 4),
+            round(float(screened['vImpact'][row]), 4),
+            None if np.isnan(scenario_m[row]) else round(float(scenario_m[row]), 1),
+        ])
+    return {
+        'snapshot': snapshot.manifest['id'],
+        'generated': time.time(),
+        'count': len(data),
+        'fields': list(RESULT_FIELDS),
+        'units': {'moid': 'au', 'vRelative': 'km/s', 'vImpact': 'km/s', 'diameter': 'km',
+                  'scenarioDiameter': 'm'},
+        'data': data,
+    }
+
+
+def run(root, workers=None, progress=None):
+    """Screen the current catalog snapshot and store the ranked table inside it"""
+    snapshot = Catalog(root).snapshot()
+    elements = snapshot.elements(fields=('a', 'e', 'i', 'om', 'w'))
+    missing = [f for f in ('a', 'e', 'i', 'om', 'w') if f not in elements]
+    if missing:
+        raise ValueError(f'Catalog lacks orbital element columns: {missing}')
+
+    table = build_table(snapshot, screen(elements, workers=workers, progress=progress))
+    path = os.path.join(snapshot.path, RESULT_FILE)
+    tmp = f'{path}.tmp-{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(table, f, separators=(',', ':'))
+    os.replace(tmp, path)
+    return path, table
+
+
+_loaded = {}
+
+
+def load_results(snapshot):
+    """Ranked table for a snapshot, or None when it has not been screened"""
+    path = os.path.join(snapshot.path, RESULT_FILE)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _loaded.clear()
+        _loaded[path] = cached
+    return cached[1]
+
+
+def query_results(table, max_moid=None, pha_only=False, limit=100):
+    """Filter a ranked table; returns a copy in the same layout"""
+    fields = table['fields']
+    moid_col, pha_col = fields.index('moid'), fields.index('pha')
+    rows = table['data']
+    if max_moid is not None:
+        rows = [r for r in rows if r[moid_col] <= max_moid]
+    if pha_only:
+        rows = [r for r in rows if r[pha_col] in (True, 'Y', '1')]
+    return {**table, 'count': len(rows), 'data': rows[:limit]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Screen the local catalog for Earth MOID')
+    parser.add_argument('--root', default=os.environ.get('NEO_CATALOG_DIR', 'catalog'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SCREENING_WORKERS', os.cpu_count() or 1)))
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+
+    def report(done, total):
+        elapsed = time.monotonic() - start
+        eta = elapsed / done * (total - done) if done else 0
+        print(f'\rscreened {done}/{total} ({done / total:.0%}) elapsed {elapsed:.0f}s eta {eta:.0f}s',
+              end='', file=sys.stderr, flush=True)
+
+    path, table = run(args.root, workers=args.workers, progress=report)
+    print(file=sys.stderr)
+    print(f"Ranked {table['count']} objects into {path} in {time.monotonic() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
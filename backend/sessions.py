@@ -0,0 +1,178 @@
+"""
+Per-session simulation state for /api/simulation/*.
+
+Payloads are kept as encoded JSON so status reads are a dictionary lookup
+plus a byte concatenation, with no parsing. MemorySessionStore bounds total
+size (LRU) and expires idle sessions; SQLiteSessionStore (WAL mode) shares
+state between gunicorn workers on one host.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from backend.datadir import data_path
+
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+MAX_PAYLOAD_BYTES = 1024 * 1024
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def _check_size(payload):
+    if len(payload) > MAX_PAYLOAD_BYTES:
+        raise PayloadTooLarge(f'Simulation data too large ({len(payload)} > {MAX_PAYLOAD_BYTES} bytes)')
+
+
+class MemorySessionStore:
+    """In-process store: O(1) get/set, LRU by total bytes, TTL since last write"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def set(self, session_id, payload):
+        """Store encoded JSON bytes for a session"""
+        _check_size(payload)
+        with self._lock:
+            self._pop(session_id)
+            self._items[session_id] = (payload, time.monotonic())
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._items)))
+
+    def get(self, session_id):
+        """Encoded JSON bytes for a session, or None"""
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None:
+                return None
+            payload, stored_at = item
+            if time.monotonic() - stored_at > self.ttl:
+                self._pop(session_id)
+                return None
+            self._items.move_to_end(session_id)
+            return payload
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._pop(session_id)
+
+    def _pop(self, session_id):
+        item = self._items.pop(session_id, None)
+        if item is None:
+            return False
+        self._size -= len(item[0])
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'sessions': len(self._items),
+                    'bytes': self._size, 'maxBytes': self.max_bytes, 'ttl': self.ttl}
+
+
+class SQLiteSessionStore:
+    """Store shared by every worker on the host through one SQLite file in WAL mode"""
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' id TEXT PRIMARY KEY, payload BLOB NOT NULL,'
+                ' size INTEGER NOT NULL, updated REAL NOT NULL, accessed REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)')
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not shareable across threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def set(self, session_id, payload):
+        _check_size(payload)
+        now = time.time()
+        db = self._connect()
+        db.execute(
+            'INSERT OR REPLACE INTO sessions (id, payload, size, updated, accessed) VALUES (?, ?, ?, ?, ?)',
+            (session_id, payload, len(payload), now, now))
+        self._maybe_purge(now)
+
+    def get(self, session_id):
+        now = time.time()
+        db = self._connect()
+        row = db.execute(
+            'SELECT payload, updated FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            db.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            return None
+        db.execute('UPDATE sessions SET accessed = ? WHERE id = ?', (now, session_id))
+        return bytes(row[0])
+
+    def delete(self, session_id):
+        cursor = self._connect().execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        return cursor.rowcount > 0
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        db = self._connect()
+        db.execute('DELETE FROM sessions WHERE updated < ?', (now - self.ttl,))
+        # Evict least recently accessed sessions until under the byte budget
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM sessions').fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            rows = db.execute('SELECT id, size FROM sessions ORDER BY accessed').fetchall()
+            victims = []
+            for session_id, size in rows:
+                if excess <= 0:
+                    break
+                victims.append((session_id,))
+                excess -= size
+            db.executemany('DELETE FROM sessions WHERE id = ?', victims)
+
+    def stats(self):
+        count, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions').fetchone()
+        return {'backend': 'sqlite', 'path': self.path, 'sessions': count,
+                'bytes': size, 'maxBytes': self.max_bytes, 'ttl': self.ttl}
+
+
+def session_store_from_env():
+    """
+    SIMULATION_STORE=memory (default) or sqlite; SIMULATION_STORE_PATH (default
+    simulation_sessions.db in DATA_DIR), SIMULATION_STORE_MAX_BYTES and
+    SIMULATION_SESSION_TTL tune it.
+    """
+    max_bytes = int(os.environ.get('SIMULATION_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+    ttl = float(os.environ.get('SIMULATION_SESSION_TTL', DEFAULT_TTL))
+    if os.environ.get('SIMULATION_STORE', 'memory') == 'sqlite':
+        path = os.environ.get('SIMULATION_STORE_PATH') or data_path('simulation_sessions.db')
+        return SQLiteSessionStore(path, max_bytes=max_bytes, ttl=ttl)
+    return MemorySessionStore(max_bytes=max_bytes, ttl=ttl)
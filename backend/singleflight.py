@@ -0,0 +1,262 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls.
+
+The first caller for a key runs the fetch; callers that arrive while it is
+in flight wait for it and get the same result, or the same exception.
+With a lock directory (SINGLEFLIGHT_LOCK_DIR) the leaders of different
+gunicorn workers also coordinate: each one takes an flock on a per-key
+file. A worker that had to wait reads the body or error the first worker
+published instead of calling the upstream again. Shared results must be
+bytes. Published files only matter to workers already waiting, so they are
+swept once no waiter can still be blocked on them, and idle lock files
+after a while.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; coordination stays per worker
+    fcntl = None
+
+DEFAULT_WAIT_TIMEOUT = 60.0
+LOCK_POLL_INTERVAL = 0.01
+SWEEP_INTERVAL = 60.0
+LOCK_IDLE_TTL = 10 * 60
+
+
+class SharedFlightError(Exception):
+    """The call failed in another worker while this one was waiting for it"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls per key across threads, and optionally across workers"""
+
+    def __init__(self, name, lock_dir=None, wait_timeout=DEFAULT_WAIT_TIMEOUT):
+        self.name = name
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_timeout = wait_timeout
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+        self._shared = 0
+        self._swept_at = time.monotonic()
+
+    def do(self, key, fn):
+        """Return fn() for key, sharing one execution among concurrent callers"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                raise TimeoutError(f'Timed out waiting for in-flight {self.name} call')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn) if self.lock_dir else fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run(self, key, fn):
+        """Leader path with cross-worker coordination through an flock per key"""
+        base = os.path.join(self.lock_dir, f"{self.name}-{hashlib.sha256(key.encode()).hexdigest()}")
+        started = time.time()
+        self._maybe_sweep()
+        fd, waited = self._lock_file(base + '.lock')
+        try:
+            if not waited:
+                return self._publish(base, fn)
+
+            # Another worker ran this call while we waited: use what it published
+            result_path, error_path = base + '.result', base + '.error'
+            if self._written_since(result_path, started):
+                with open(result_path, 'rb') as f:
+                    body = f.read()
+                self._bump('_shared')
+                return body
+            if self._written_since(error_path, started):
+                with open(error_path, encoding='utf-8', errors='replace') as f:
+                    message = f.read()
+                self._bump('_shared')
+                raise SharedFlightError(message)
+            return self._publish(base, fn)
+        finally:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+    def _lock_file(self, path):
+        """Open and flock path; returns (fd, waited). Retries if a sweep unlinked the file meanwhile"""
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                waited = self._flock(fd)
+                try:
+                    current = os.stat(path).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current == os.fstat(fd).st_ino:
+                    # Mark the lock as in use so the sweep leaves it alone
+                    os.utime(fd)
+                    return fd, waited
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
+
+    def _flock(self, fd):
+        """Take the key's flock; returns True if another worker held it first"""
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except BlockingIOError:
+            pass
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                continue
+        raise TimeoutError(f'Timed out waiting for {self.name} call in another worker')
+
+    def _publish(self, base, fn):
+        try:
+            result = fn()
+        except Exception as e:
+            self._write(base + '.error', str(e).encode('utf-8'))
+            self._unlink(base + '.result')
+            raise
+        self._write(base + '.result', result)
+        self._unlink(base + '.error')
+        return result
+
+    def _maybe_sweep(self):
+        """Every SWEEP_INTERVAL, drop published files no waiter can still use and idle locks"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at < SWEEP_INTERVAL:
+                return
+            self._swept_at = now
+
+        # A waiter gives up after wait_timeout, so anything published before
+        # that is never read again
+        published_cutoff = time.time() - self.wait_timeout - SWEEP_INTERVAL
+        lock_cutoff = time.time() - max(LOCK_IDLE_TTL, self.wait_timeout + SWEEP_INTERVAL)
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.lock_dir, name)
+            if name.startswith(f'{self.name}-') and name.endswith('.lock'):
+                self._sweep_lock(path, lock_cutoff)
+            elif name.startswith(f'{self.name}-') or name.startswith('.tmp-'):
+                try:
+                    if os.path.getmtime(path) < published_cutoff:
+                        os.unlink(path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _sweep_lock(path, cutoff):
+        """Unlink an idle lock file, but only while holding its flock"""
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                return
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+        try:
+            # Workers that opened it before the unlink notice the inode change and reopen
+            if os.fstat(fd).st_mtime < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Single-flight cleanup failed for {path}: {e}")
+
+    @staticmethod
+    def _written_since(path, since):
+        try:
+            return os.path.getmtime(path) >= since
+        except OSError:
+            return False
+
+    def _write(self, path, data):
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.lock_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except (OSError, TypeError) as e:
+            print(f"Single-flight publish failed for {path}: {e}")
+
+    def _bump(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': len(self._calls),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced,
+                'sharedAcrossWorkers': self._shared,
+                'lockDir': self.lock_dir,
+            }
+
+
+def singleflight_from_env(name):
+    """SingleFlight for name, coordinating workers when SINGLEFLIGHT_LOCK_DIR is set"""
+    return SingleFlight(name, lock_dir=os.environ.get('SINGLEFLIGHT_LOCK_DIR'))
@@ -0,0 +1,214 @@
+"""
+Precompressed, fingerprinted static assets served from memory.
+
+At startup every public file (index.html, styles.css, js/*.js, assets/*)
+is read once, hashed, and compressed with gzip and, when the optional
+brotli package is installed, brotli. Requests are answered from that table:
+Accept-Encoding picks the variant, strong ETags give 304s, and
+content-hashed aliases (styles.<hash>.css) are cacheable forever.
+
+index.html is rewritten to point its stylesheet and classic <script> tags
+at the hashed aliases. ES modules keep their names: they import each other
+by relative path, and a renamed copy would be evaluated as a second module.
+They are revalidated with their ETag instead.
+"""
+
+import fnmatch
+import glob
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+PUBLIC_PATTERNS = ('index.html', 'styles.css', 'js/*.js', 'assets/*')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 512
+
+# Never served by the filesystem fallback, wherever they are: SQLite databases
+# and their -wal/-shm/-journal files
+PRIVATE_FILES = ('*.db', '*.db-*', '*.sqlite', '*.sqlite-*', '*.sqlite3', '*.sqlite3-*')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+RELOAD_CHECK_INTERVAL = 1.0
+
+# <link rel="stylesheet" href="..."> and <script src="..."> without type="module"
+_STYLESHEET = re.compile(r'(<link\b[^>]*\brel="stylesheet"[^>]*\bhref=")([^":]+)(")')
+_CLASSIC_SCRIPT = re.compile(r'(<script\b(?![^>]*\btype="module")[^>]*\bsrc=")([^":]+)(")')
+
+
+class Asset:
+    __slots__ = ('path', 'mimetype', 'etag', 'variants', 'immutable')
+
+    def __init__(self, path, body, mimetype):
+        self.path = path
+        self.mimetype = mimetype
+        self.immutable = False
+        digest = hashlib.sha256(body).hexdigest()
+        self.etag = digest[:20]
+        # Encoding -> body; each encoding gets its own strong ETag
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES and mimetype.startswith(COMPRESSIBLE_TYPES):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.variants['gzip'] = gz
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    self.variants['br'] = br
+
+    def immutable_copy(self):
+        """The same content under its hashed alias, cacheable forever"""
+        copy = Asset.__new__(Asset)
+        copy.path = self.alias()
+        copy.mimetype = self.mimetype
+        copy.etag = self.etag
+        copy.variants = self.variants
+        copy.immutable = True
+        return copy
+
+    def etag_for(self, encoding):
+        return f'"{self.etag}"' if encoding == 'identity' else f'"{self.etag}-{encoding}"'
+
+    def alias(self):
+        """Content-hashed file name, e.g. js/main.3f2a9c1b0d.js"""
+        stem, ext = os.path.splitext(self.path)
+        return f'{stem}.{self.etag[:10]}{ext}'
+
+
+def _accepted_encodings(header):
+    """Encodings from an Accept-Encoding header with q > 0"""
+    accepted = set()
+    for part in (header or '').split(','):
+        token, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if token and q > 0:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class StaticAssets:
+    """In-memory table of public files and their compressed, hashed variants"""
+
+    def __init__(self, root, patterns=PUBLIC_PATTERNS, reload=False):
+        self.root = os.path.abspath(root)
+        self.patterns = patterns
+        self.reload = reload
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtimes = {}
+        self._table = {}
+        self._build()
+
+    def _files(self):
+        for pattern in self.patterns:
+            for path in sorted(glob.glob(os.path.join(self.root, pattern))):
+                if os.path.isfile(path):
+                    yield os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _build(self):
+        table, mtimes, aliases = {}, {}, {}
+        for name in self._files():
+            full = os.path.join(self.root, name)
+            mtimes[name] = os.path.getmtime(full)
+            if name == 'index.html':
+                continue
+            with open(full, 'rb') as f:
+                body = f.read()
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            if mimetype.startswith('text/'):
+                mimetype += '; charset=utf-8'
+            asset = Asset(name, body, mimetype)
+            table[name] = asset
+            table[asset.alias()] = asset.immutable_copy()
+            aliases[name] = asset.alias()
+
+        if 'index.html' in mtimes:
+            with open(os.path.join(self.root, 'index.html'), encoding='utf-8') as f:
+                html = f.read()
+
+            def to_alias(match):
+                return match.group(1) + aliases.get(match.group(2), match.group(2)) + match.group(3)
+
+            html = _CLASSIC_SCRIPT.sub(to_alias, _STYLESHEET.sub(to_alias, html))
+            table['index.html'] = Asset('index.html', html.encode('utf-8'), 'text/html; charset=utf-8')
+
+        with self._lock:
+            self._table = table
+            self._mtimes = mtimes
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        current = {}
+        for name in self._files():
+            current[name] = os.path.getmtime(os.path.join(self.root, name))
+        if current != self._mtimes:
+            self._build()
+
+    def lookup(self, path):
+        """Asset for a request path ('' means index.html), or None"""
+        if self.reload:
+            self._maybe_reload()
+        return self._table.get(path or 'index.html')
+
+    def respond(self, asset, request_headers):
+        """(body, status, headers) for an asset given the request headers"""
+        accepted = _accepted_encodings(request_headers.get('Accept-Encoding'))
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+
+        headers = {
+            'ETag': asset.etag_for(encoding),
+            'Cache-Control': IMMUTABLE if asset.immutable else REVALIDATE,
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request_headers.get('If-None-Match', '')
+        known = {asset.etag_for(e) for e in asset.variants}
+        if if_none_match.strip() == '*' or any(tag.strip() in known for tag in if_none_match.split(',')):
+            return b'', 304, headers
+
+        headers['Content-Type'] = asset.mimetype
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return asset.variants[encoding], 200, headers
+
+    def stats(self):
+        with self._lock:
+            assets = [a for a in self._table.values() if not a.immutable]
+            return {
+                'files': len(assets),
+                'bytes': sum(len(a.variants['identity']) for a in assets),
+                'gzipBytes': sum(len(a.variants.get('gzip', a.variants['identity'])) for a in assets),
+                'brotli': brotli is not None,
+            }
+
+
+def is_private(filename):
+    """Whether a request path names a file the filesystem fallback must not serve"""
+    name = posixpath.basename(filename).lower()
+    return any(fnmatch.fnmatch(name, pattern) for pattern in PRIVATE_FILES)
+
+
+def static_assets_from_env(root):
+    """Asset table for root; STATIC_ASSETS_RELOAD=1 picks up edits without a restart"""
+    return StaticAssets(root, reload=os.environ.get('STATIC_ASSETS_RELOAD') == '1')
@@ -0,0 +1,119 @@
+"""
+Parameter sweeps over the impact model, streamed as newline-delimited JSON.
+
+The Cartesian product of the requested axes is never materialized: rows are
+generated block by block from flat indices, evaluated with the vectorized
+physics model and serialized before the next block is computed.
+"""
+
+import json
+
+import numpy as np
+
+from backend import physics
+
+# Axis order defines the row order (last axis varies fastest)
+AXES = ('diameter', 'velocity', 'density', 'angle')
+DEFAULT_AXES = {'angle': [45.0]}
+
+MAX_AXIS_POINTS = 10000
+MAX_ROWS = 5_000_000
+BLOCK_SIZE = 8192
+
+
+def parse_axis(name, spec):
+    """
+    An axis is a list of values, a single value, or
+    {"start": a, "stop": b, "num": n, "scale": "linear" | "log"}.
+    """
+    if name == 'density':
+        values = [spec] if isinstance(spec, str) else spec
+        if not isinstance(values, list) or not values:
+            raise ValueError('density: expected a class name or a list of class names')
+        unknown = [v for v in values if v not in physics.DENSITY_VALUES]
+        if unknown:
+            raise ValueError(f'density: unknown classes {unknown}')
+        return np.asarray(values)
+
+    if isinstance(spec, dict):
+        try:
+            start, stop, num = float(spec['start']), float(spec['stop']), int(spec['num'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'{name}: range axes need numeric start, stop and num')
+        if not 1 <= num <= MAX_AXIS_POINTS:
+            raise ValueError(f'{name}: num must be between 1 and {MAX_AXIS_POINTS}')
+        scale = spec.get('scale', 'linear')
+        if scale == 'log':
+            if start <= 0 or stop <= 0:
+                raise ValueError(f'{name}: log axes need positive start and stop')
+            values = np.geomspace(start, stop, num)
+        elif scale == 'linear':
+            values = np.linspace(start, stop, num)
+        else:
+            raise ValueError(f'{name}: scale must be linear or log')
+    else:
+        try:
+            values = np.atleast_1d(np.asarray(spec, dtype=np.float64))
+        except (TypeError, ValueError):
+            raise ValueError(f'{name}: expected numbers')
+        if values.ndim != 1 or not 1 <= values.size <= MAX_AXIS_POINTS:
+            raise ValueError(f'{name}: expected 1 to {MAX_AXIS_POINTS} values')
+
+    if name == 'angle' and not np.all((values > 0) & (values <= 90)):
+        raise ValueError('angle must be in (0, 90] degrees')
+    if name in ('diameter', 'velocity') and not np.all(values > 0):
+        raise ValueError(f'{name} values must be positive')
+    return values
+
+
+def parse_request(data):
+    """Validate a sweep request into axis arrays and fixed parameters"""
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+    axes_spec = data.get('axes', data)
+    for name in ('diameter', 'velocity', 'density'):
+        if name not in axes_spec:
+            raise ValueError(f'Missing required axis: {name}')
+
+    axes = {name: parse_axis(name, axes_spec.get(name, DEFAULT_AXES.get(name))) for name in AXES}
+    rows = int(np.prod([len(v) for v in axes.values()], dtype=np.int64))
+    if rows > MAX_ROWS:
+        raise ValueError(f'Sweep too large ({rows} > {MAX_ROWS} rows)')
+
+    outputs = data.get('outputs') or list(physics.FLAT_OUTPUTS)
+    unknown = [o for o in outputs if o not in physics.FLAT_OUTPUTS]
+    if unknown:
+        raise ValueError(f'Unknown outputs: {unknown}')
+
+    return {
+        'axes': axes,
+        'rows': rows,
+        'outputs': outputs,
+        'population_density': float(data.get('population_density', 1000)),
+        'is_ocean_impact': bool(data.get('is_ocean_impact', False)),
+    }
+
+
+def iter_blocks(spec, block_size=BLOCK_SIZE):
+    """Yield ({column: array}, row count) blocks covering the whole grid in order"""
+    axes = spec['axes']
+    shape = tuple(len(axes[name]) for name in AXES)
+    for start in range(0, spec['rows'], block_size):
+        flat = np.arange(start, min(start + block_size, spec['rows']))
+        index = np.unravel_index(flat, shape)
+        inputs = {name: axes[name][idx] for name, idx in zip(AXES, index)}
+
+        effects = physics.calculate_all_effects(
+            inputs['diameter'], inputs['velocity'], inputs['density'], inputs['angle'],
+            spec['population_density'], spec['is_ocean_impact'])
+        yield {**inputs, **physics.flatten_outputs(effects, spec['outputs'])}, len(flat)
+
+
+def iter_ndjson(spec, block_size=BLOCK_SIZE):
+    """Yield the sweep as NDJSON text, one chunk per block"""
+    for columns, _ in iter_blocks(spec, block_size):
+        names = list(columns)
+        lists = [columns[name].tolist() for name in names]
+        yield ''.join(
+            json.dumps(dict(zip(names, row)), separators=(',', ':')) + '\n'
+            for row in zip(*lists))
@@ -0,0 +1,309 @@
+"""
+Shared HTTP client layer for the upstream APIs (NASA, JPL, Nominatim, Overpass).
+
+Each upstream gets its own keep-alive connection pool, a concurrency cap,
+default timeouts and a circuit breaker that fails fast while the upstream
+is unhealthy.
+"""
+
+import os
+import threading
+import time
+import weakref
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from backend.metrics import observe_upstream
+
+USER_AGENT = "MeteoriteImpactSimulator/1.0 (+https://github.com/hanserlodev/Hackathon)"
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream is short-circuited or saturated (maps to HTTP 503)"""
+
+    def __init__(self, upstream, reason):
+        super().__init__(f"Upstream '{upstream}' unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cooldown"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def allow(self):
+        """Return True if a call may go through right now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let exactly one probe through to test recovery
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def retry_after(self):
+        """Seconds until the breaker will allow a probe again"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+
+class Upstream:
+    """Pooled, concurrency-limited client for one upstream host"""
+
+    def __init__(self, name, base_url, max_concurrency=8, connect_timeout=3.05,
+                 read_timeout=10, acquire_timeout=2.0, failure_threshold=5,
+                 reset_timeout=30.0):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.host = urlparse(self.base_url).netloc
+        self.max_concurrency = max_concurrency
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = requests.Session()
+        self._session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, pool_block=True)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._requests = 0
+        self._failures = 0
+        self._rejected = 0
+        self._total_time = 0.0
+
+    def url(self, path=''):
+        """Absolute URL for a path under this upstream"""
+        if not path:
+            return self.base_url
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path='', **kwargs):
+        """
+        Perform a request through the pool.
+        Raises UpstreamUnavailable when the breaker is open or no slot frees up in time,
+        and the usual requests exceptions for transport errors.
+        """
+        if not self.breaker.allow():
+            self._count('_rejected')
+            observe_upstream(self.name, self.host, 'rejected', 0.0)
+            raise UpstreamUnavailable(
+                self.name, f"circuit open, retry in {self.breaker.retry_after():.0f}s")
+
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._count('_rejected')
+            observe_upstream(self.name, self.host, 'rejected', 0.0)
+            raise UpstreamUnavailable(self.name, 'too many concurrent requests')
+
+        kwargs.setdefault('timeout', self.timeout)
+        self._enter()
+        start = time.perf_counter()
+        try:
+            response = self._session.request(method, self.url(path), **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            elapsed = time.perf_counter() - start
+            self._leave(elapsed, failed=True)
+            self._slots.release()
+            observe_upstream(self.name, self.host, 'error', elapsed)
+            raise
+        except BaseException:
+            self._leave(time.perf_counter() - start, failed=True)
+            self._slots.release()
+            raise
+
+        # 5xx and 429 mean the upstream is struggling; 4xx are the caller's fault
+        failed = response.status_code >= 500 or response.status_code == 429
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        elapsed = time.perf_counter() - start
+        observe_upstream(self.name, self.host, response.status_code, elapsed)
+        if kwargs.get('stream'):
+            # The unread body still holds a pooled connection: keep the slot until it is closed
+            self._hold_until_closed(response, start, failed)
+        else:
+            self._leave(elapsed, failed=failed)
+            self._slots.release()
+        return response
+
+    def _hold_until_closed(self, response, start, failed):
+        released = []
+        body_failed = []
+        lock = threading.Lock()
+        raw = response.raw
+
+        def fail_body():
+            # The headers counted as a success; a body that breaks off midway is a failure
+            with lock:
+                if body_failed:
+                    return
+                body_failed.append(True)
+            if not failed:
+                self.breaker.record_failure()
+
+        def guarded(read):
+            def guarded_read(*args, **kwargs):
+                try:
+                    return read(*args, **kwargs)
+                except (urllib3.exceptions.HTTPError, OSError):
+                    fail_body()
+                    raise
+            return guarded_read
+
+        def guarded_chunks(read_chunked):
+            def guarded_read_chunked(*args, **kwargs):
+                try:
+                    yield from read_chunked(*args, **kwargs)
+                except (urllib3.exceptions.HTTPError, OSError):
+                    fail_body()
+                    raise
+            return guarded_read_chunked
+
+        # Read timeouts and dropped connections while streaming reach the breaker too
+        raw.read = guarded(raw.read)
+        raw.read1 = guarded(raw.read1)
+        raw.read_chunked = guarded_chunks(raw.read_chunked)
+
+        def release():
+            with lock:
+                if released:
+                    return
+                released.append(True)
+            try:
+                # Hand the connection back to the pool too, or the next request blocks on it
+                raw.close()
+                raw.release_conn()
+            finally:
+                self._leave(time.perf_counter() - start, failed=failed or bool(body_failed))
+                self._slots.release()
+
+        close = response.close
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+
+        response.close = close_and_release
+        # A response dropped without close() still gives its slot back when collected
+        weakref.finalize(response, release)
+
+    def get(self, path='', **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path='', **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def _count(self, attr):
+        with self._stats_lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def _enter(self):
+        with self._stats_lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _leave(self, elapsed, failed):
+        with self._stats_lock:
+            self._in_flight -= 1
+            self._requests += 1
+            self._total_time += elapsed
+            if failed:
+                self._failures += 1
+
+    def stats(self):
+        """Snapshot of pool usage and health"""
+        with self._stats_lock:
+            return {
+                'baseUrl': self.base_url,
+                'circuit': self.breaker.state,
+                'maxConcurrency': self.max_concurrency,
+                'inFlight': self._in_flight,
+                'peakInFlight': self._peak_in_flight,
+                'saturation': self._in_flight / self.max_concurrency,
+                'requests': self._requests,
+                'failures': self._failures,
+                'rejected': self._rejected,
+                'avgLatencyMs': (self._total_time / self._requests * 1000) if self._requests else 0.0,
+            }
+
+    def close(self):
+        self._session.close()
+
+
+# Base URLs can be overridden through the environment (e.g. to point at local stubs)
+UPSTREAMS = {
+    'nasa': Upstream(
+        'nasa', os.environ.get('NASA_API_URL', 'https://api.nasa.gov'),
+        max_concurrency=8, read_timeout=10),
+    'nominatim': Upstream(
+        'nominatim', os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org'),
+        max_concurrency=2, read_timeout=10),
+    'jpl': Upstream(
+        'jpl', os.environ.get('JPL_SSD_API_URL', 'https://ssd-api.jpl.nasa.gov'),
+        max_concurrency=8, read_timeout=30),
+    'overpass': Upstream(
+        'overpass', os.environ.get('OVERPASS_URL', 'http://overpass-api.de/api/interpreter'),
+        max_concurrency=4, read_timeout=60, acquire_timeout=5.0),
+}
+
+
+def get_upstream(name):
+    """Look up a configured upstream by name"""
+    return UPSTREAMS[name]
+
+
+def upstream_stats():
+    """Stats for every configured upstream, keyed by name"""
+    return {name: upstream.stats() for name, upstream in UPSTREAMS.items()}
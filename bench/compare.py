@@ -0,0 +1,74 @@
+"""
+Compare two benchmark result files (bench/load.py or bench/micro.py --output).
+
+Prints the change of each metric per route/case and exits with status 1
+when any metric regressed by more than --threshold percent, so it can gate
+a CI job.
+
+Usage: python bench/compare.py baseline.json candidate.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+
+# (metric path, higher is better)
+METRICS = {
+    'load': ((('reqPerSec',), True), (('latencyMs', 'p50'), False), (('latencyMs', 'p95'), False),
+             (('latencyMs', 'p99'), False), (('errors',), False), (('rssKb',), False)),
+    'micro': ((('medianUs',), False), (('bestUs',), False)),
+}
+
+
+def _get(result, path):
+    for key in path:
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def compare(baseline, candidate, threshold):
+    """Rows of (name, metric, before, after, change %, regressed)"""
+    if baseline.get('kind') != candidate.get('kind'):
+        raise ValueError(f"Cannot compare {baseline.get('kind')} results with {candidate.get('kind')} results")
+    rows = []
+    for name, before in baseline['results'].items():
+        after = candidate['results'].get(name)
+        if after is None:
+            continue
+        for path, higher_is_better in METRICS[baseline['kind']]:
+            old, new = _get(before, path), _get(after, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+            worse = -change if higher_is_better else change
+            rows.append((name, '.'.join(path), old, new, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    print(f'{baseline.get("commit")} -> {candidate.get("commit")}')
+    print(f'{"name":28} {"metric":14} {"before":>12} {"after":>12} {"change":>9}')
+    for name, metric, old, new, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:28} {metric:14} {old:12.2f} {new:12.2f} {change:+8.1f}%{flag}')
+    regressions = sum(1 for row in rows if row[-1])
+    print(f'{regressions} regression(s) beyond {args.threshold:g}%')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
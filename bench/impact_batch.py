@@ -0,0 +1,88 @@
+"""
+Throughput benchmark: scalar impact calculation vs. the vectorized batch path.
+
+Usage: python bench/impact_batch.py [--rows 100000] [--http]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.impact import calculate_impact, calculate_impact_batch  # noqa: E402
+
+
+def make_scenarios(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.uniform(1, 20000, rows),
+        rng.uniform(11, 72, rows),
+        rng.choice(['iron', 'stone', 'ice'], rows),
+        rng.uniform(0, 20000, rows),
+    )
+
+
+def bench_functions(rows):
+    diameter, velocity, density, population = make_scenarios(rows)
+    scenarios = list(zip(diameter.tolist(), velocity.tolist(), density.tolist(), population.tolist()))
+
+    start = time.perf_counter()
+    for scenario in scenarios:
+        calculate_impact(*scenario)
+    scalar = time.perf_counter() - start
+
+    # Warm up NumPy's ufunc dispatch before timing
+    calculate_impact_batch(diameter[:10], velocity[:10], density[:10], population[:10])
+    start = time.perf_counter()
+    calculate_impact_batch(diameter, velocity, density, population)
+    batch = time.perf_counter() - start
+
+    print(f"functions, {rows} scenarios")
+    print(f"  scalar: {scalar:8.3f}s  {rows / scalar:12,.0f} scenarios/s")
+    print(f"  batch:  {batch:8.3f}s  {rows / batch:12,.0f} scenarios/s  ({scalar / batch:.0f}x)")
+
+
+def bench_http(rows):
+    from server import app
+
+    client = app.test_client()
+    diameter, velocity, density, population = make_scenarios(rows)
+
+    start = time.perf_counter()
+    for i in range(rows):
+        client.post('/api/impact/calculate', json={
+            'diameter': diameter[i], 'velocity': velocity[i],
+            'density': density[i], 'population_density': population[i],
+        })
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/api/impact/calculate_batch', json={
+        'diameter': diameter.tolist(), 'velocity': velocity.tolist(),
+        'density': density.tolist(), 'population_density': population.tolist(),
+    })
+    batch = time.perf_counter() - start
+    assert response.status_code == 200, response.get_json()
+
+    print(f"HTTP (Flask test client), {rows} scenarios")
+    print(f"  /api/impact/calculate x{rows}: {scalar:8.3f}s  {rows / scalar:10,.0f} scenarios/s")
+    print(f"  /api/impact/calculate_batch:  {batch:8.3f}s  {rows / batch:10,.0f} scenarios/s  ({scalar / batch:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--http', action='store_true', help='also benchmark through the Flask routes')
+    args = parser.parse_args()
+
+    bench_functions(args.rows)
+    if args.http:
+        bench_http(min(args.rows, 5000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Load benchmark: the app under gunicorn against local stub upstreams.
+
+Starts bench/stubs.py in-process and the app in a subprocess, then runs each
+route in turn with --concurrency client threads for --duration seconds.
+Reports req/s, p50/p95/p99 latency, errors and the server's RSS (all
+processes) after each route. --output writes the results as JSON for
+bench/compare.py.
+
+Usage: python bench/load.py [--routes impact_calculate,neo_feed] [--workers 1]
+                            [--concurrency 8] [--duration 10] [--latency overpass=300]
+                            [--output results.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.stubs import add_arguments as add_stub_arguments, config_from_args, start_stubs, upstream_env  # noqa: E402
+
+CITIES = ('Paris', 'Madrid', 'Lima', 'Tokyo', 'Nairobi', 'Quito', 'Oslo', 'Perth', 'Austin', 'Seoul')
+DENSITIES = ('iron', 'stone', 'ice')
+
+
+def _feed_dates(i):
+    start = datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 60)
+    return start.isoformat(), (start + datetime.timedelta(days=i % 7)).isoformat()
+
+
+# name -> builder(i) returning (method, path, kwargs); i varies cache keys between requests
+ROUTES = {
+    'static_index': lambda i: ('GET', '/', {'headers': {'Accept-Encoding': 'gzip'}}),
+    'static_js': lambda i: ('GET', '/js/simulation.js', {'headers': {'Accept-Encoding': 'gzip'}}),
+    'impact_calculate': lambda i: ('POST', '/api/impact/calculate', {'json': {
+        'diameter': 10 + i % 990, 'velocity': 11 + i % 60, 'density': DENSITIES[i % 3], 'angle': 15 + i % 75}}),
+    'impact_batch': lambda i: ('POST', '/api/impact/calculate_batch', {'json': {
+        'diameter': [10 + (i + k) % 990 for k in range(100)],
+        'velocity': [11 + (i + k) % 60 for k in range(100)],
+        'density': [DENSITIES[(i + k) % 3] for k in range(100)]}}),
+    'neo_feed': lambda i: ('GET', '/api/nasa/neo', {'params': dict(zip(('start_date', 'end_date'), _feed_dates(i)))}),
+    'neo_feed_month': lambda i: ('GET', '/api/nasa/neo', {'params': {
+        'start_date': (datetime.date(2023, 1, 1) + datetime.timedelta(days=i % 365)).isoformat(),
+        'end_date': (datetime.date(2023, 1, 31) + datetime.timedelta(days=i % 365)).isoformat()}}),
+    'sbdb': lambda i: ('GET', '/api/sbdb', {'params': {'sstr': str(433 + i % 50)}}),
+    'geocoding': lambda i: ('GET', '/api/geocoding', {'params': {'q': CITIES[i % len(CITIES)]}}),
+    'overpass': lambda i: ('GET', '/overpass', {'params': {
+        'lat': 48.80 + (i % 20) * 0.01, 'lon': 2.30 + (i % 13) * 0.01, 'radius': 1000, 'profile': 'impact'}}),
+    'sbdb_query': lambda i: ('POST', '/api/sbdb_query', {'json': {
+        'fields': 'full_name,a,e,i,om,w,ma,epoch', 'sb-kind': 'a', 'sb-group': 'neo', 'limit': 50 + i % 50}}),
+    'simulate': lambda i: ('POST', '/api/impact/simulate', {'json': {
+        'lat': 48.85 + (i % 10) * 0.05, 'lon': 2.35, 'diameter': 50 + i % 200, 'velocity': 19,
+        'density': 'stone'}}),
+    'metrics': lambda i: ('GET', '/metrics', {}),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss_kb(pid):
+    """Resident memory of pid and all its descendants (Linux /proc)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, ()))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def start_server(port, env, workers, threads):
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning', 'server:app']
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env})
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/upstreams/stats', timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('server did not start within 30s')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_route(base_url, build, concurrency, duration, warmup):
+    """Drive one route; returns its result dict"""
+    session = requests.Session()
+    for i in range(warmup):
+        method, path, kwargs = build(i)
+        session.request(method, base_url + path, **kwargs)
+
+    latencies, statuses, errors = [], {}, []
+    lock = threading.Lock()
+    counter = iter(range(warmup, 10 ** 12))
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        session = requests.Session()
+        local, local_statuses = [], {}
+        while time.perf_counter() < stop_at:
+            with lock:
+                i = next(counter)
+            method, path, kwargs = build(i)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, timeout=60, **kwargs)
+                response.content
+                status = response.status_code
+            except requests.RequestException as e:
+                status = 'error'
+                with lock:
+                    errors.append(str(e))
+            local.append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    failed = sum(count for status, count in statuses.items() if status == 'error' or status >= 500)
+    return {
+        'requests': len(latencies),
+        'errors': failed,
+        'statuses': {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        'reqPerSec': len(latencies) / elapsed,
+        'latencyMs': {
+            'p50': percentile(latencies, 50) * 1000 if latencies else None,
+            'p95': percentile(latencies, 95) * 1000 if latencies else None,
+            'p99': percentile(latencies, 99) * 1000 if latencies else None,
+            'max': latencies[-1] * 1000 if latencies else None,
+            'mean': sum(latencies) / len(latencies) * 1000 if latencies else None,
+        },
+        'sampleErrors': errors[:3],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--routes', default=','.join(ROUTES), help=f'comma-separated subset of: {", ".join(ROUTES)}')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per route')
+    parser.add_argument('--warmup', type=int, default=20, help='sequential requests before timing')
+    parser.add_argument('--server', help='benchmark an already running server at this base URL instead')
+    parser.add_argument('--output', help='write results as JSON')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    routes = [r for r in args.routes.split(',') if r]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        parser.error(f'unknown routes: {", ".join(unknown)}')
+
+    process = None
+    stubs = start_stubs(0, config_from_args(args))
+    if args.server:
+        base_url = args.server.rstrip('/')
+    else:
+        port = free_port()
+        # Fresh, process-local caches so runs are comparable
+        env = {**upstream_env(stubs), 'SIMULATION_STORE': 'memory', 'RESPONSE_CACHE_DIR': '',
+               'SINGLEFLIGHT_LOCK_DIR': '', 'SCENARIO_STORE_PATH': ''}
+        process = start_server(port, env, args.workers, args.threads)
+        base_url = f'http://127.0.0.1:{port}'
+
+    results = {}
+    try:
+        rss_start = process_tree_rss_kb(process.pid) if process else None
+        print(f'{"route":18} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7} {"RSS MB":>8}')
+        for name in routes:
+            result = run_route(base_url, ROUTES[name], args.concurrency, args.duration, args.warmup)
+            result['rssKb'] = process_tree_rss_kb(process.pid) if process else None
+            results[name] = result
+            latency = result['latencyMs']
+            rss = f'{result["rssKb"] / 1024:8.1f}' if result['rssKb'] else f'{"-":>8}'
+            print(f'{name:18} {result["reqPerSec"]:9.1f} {latency["p50"] or 0:8.2f} {latency["p95"] or 0:8.2f} '
+                  f'{latency["p99"] or 0:8.2f} {result["errors"]:7d} {rss}')
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+        stubs.shutdown()
+
+    report = {
+        'kind': 'load',
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'rssStartKb': rss_start,
+        'upstreamCalls': dict(stubs.counts),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Micro-benchmarks of the impact math and its hot helpers.
+
+Each case runs in timed batches after a warm-up. The best and median time
+per call are reported, and --output writes them as JSON for
+bench/compare.py.
+
+Usage: python bench/micro.py [--cases impact_scalar,impact_batch_1k] [--repeat 5]
+                             [--output micro.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import physics  # noqa: E402
+from backend.ephemeris import positions, solve_kepler  # noqa: E402
+from backend.impact import calculate_impact, calculate_impact_batch, to_columns  # noqa: E402
+from backend.montecarlo import parse_request as parse_monte_carlo, run_monte_carlo  # noqa: E402
+
+from bench.impact_batch import make_scenarios  # noqa: E402
+from bench.load import git_commit  # noqa: E402
+
+
+def _cases():
+    """name -> (setup() returning a zero-argument callable, items processed per call)"""
+    def impact_scalar():
+        return lambda: calculate_impact(120, 19, 'stone', population_density=800, angle=40)
+
+    def impact_batch(rows):
+        def setup():
+            diameter, velocity, density, population = make_scenarios(rows)
+            return lambda: calculate_impact_batch(diameter, velocity, density, population)
+        return setup
+
+    def impact_to_json():
+        result = calculate_impact(120, 19, 'stone', population_density=800, angle=40)
+        return lambda: json.dumps(result)
+
+    def batch_to_columns():
+        diameter, velocity, density, population = make_scenarios(10000)
+        result = calculate_impact_batch(diameter, velocity, density, population)
+        return lambda: json.dumps(to_columns(result))
+
+    def atmospheric_entry():
+        return lambda: physics.calculate_atmospheric_entry(120.0, 19.0, 3000.0, 40.0)
+
+    def blast_zones():
+        return lambda: physics.calculate_blast_zones(127.6)
+
+    def kepler_10k():
+        rng = np.random.default_rng(1)
+        mean_anomaly, e = rng.uniform(0, 2 * np.pi, 10000), rng.uniform(0, 0.97, 10000)
+        return lambda: solve_kepler(mean_anomaly, e)
+
+    def ephemeris_1k_x_100():
+        rng = np.random.default_rng(2)
+        n = 1000
+        elements = {
+            'a': rng.uniform(0.8, 3.5, n), 'e': rng.uniform(0, 0.9, n), 'i': rng.uniform(0, 40, n),
+            'om': rng.uniform(0, 360, n), 'w': rng.uniform(0, 360, n), 'ma': rng.uniform(0, 360, n),
+            'epoch': np.full(n, 2460600.5),
+        }
+        epochs = 2460600.5 + np.arange(100, dtype=np.float64)
+        return lambda: positions(elements, epochs)
+
+    def monte_carlo_20k():
+        spec = parse_monte_carlo({'diameter': {'dist': 'lognormal', 'median': 100, 'sigma': 0.3},
+                                  'velocity': {'dist': 'uniform', 'min': 15, 'max': 25},
+                                  'samples': 20000, 'seed': 7})
+        return lambda: run_monte_carlo(spec, parallel=False)
+
+    return {
+        'impact_scalar': (impact_scalar, 1),
+        'impact_batch_1k': (impact_batch(1000), 1000),
+        'impact_batch_100k': (impact_batch(100000), 100000),
+        'impact_to_json': (impact_to_json, 1),
+        'batch_to_columns_json_10k': (batch_to_columns, 10000),
+        'atmospheric_entry': (atmospheric_entry, 1),
+        'blast_zones': (blast_zones, 1),
+        'kepler_10k': (kepler_10k, 10000),
+        'ephemeris_1k_x_100': (ephemeris_1k_x_100, 100000),
+        'monte_carlo_20k': (monte_carlo_20k, 20000),
+    }
+
+
+def run_case(fn, repeat, min_time):
+    """Seconds per invocation for each of repeat batches, batch size chosen to take ~min_time"""
+    timer = timeit.Timer(fn)
+    number, elapsed = 1, timer.timeit(1)
+    while elapsed < min_time / 4:
+        number *= 4
+        elapsed = timer.timeit(number)
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    return [t / number for t in timer.repeat(repeat=repeat, number=number)], number
+
+
+def main():
+    cases = _cases()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', default=','.join(cases), help=f'comma-separated subset of: {", ".join(cases)}')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per timed batch')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    selected = [c for c in args.cases.split(',') if c]
+    unknown = [c for c in selected if c not in cases]
+    if unknown:
+        parser.error(f'unknown cases: {", ".join(unknown)}')
+
+    results = {}
+    print(f'{"case":28} {"best":>12} {"median":>12} {"items/s":>14}')
+    for name in selected:
+        setup, items = cases[name]
+        fn = setup()
+        fn()
+        times, number = run_case(fn, args.repeat, args.min_time)
+        best, median = min(times), statistics.median(times)
+        results[name] = {
+            'bestUs': best * 1e6,
+            'medianUs': median * 1e6,
+            'itemsPerCall': items,
+            'itemsPerSec': items / best,
+            'callsPerBatch': number,
+        }
+        print(f'{name:28} {best * 1e6:10.1f}us {median * 1e6:10.1f}us {items / best:14,.0f}')
+
+    report = {
+        'kind': 'micro',
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
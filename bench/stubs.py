@@ -0,0 +1,270 @@
+"""
+Local stand-ins for the NASA, JPL, Nominatim and Overpass APIs.
+
+Responses come from the recorded payloads in bench/fixtures. Each upstream
+can be given extra latency (fixed plus uniform jitter) and a failure rate
+(answered with 503), so benchmarks can reproduce slow or flaky upstreams.
+One server answers all four under path prefixes; upstream_env() returns the
+*_URL variables that point backend.upstream at it.
+
+Usage: python bench/stubs.py [--port 18766] [--latency overpass=300,nominatim=50]
+                             [--jitter overpass=100] [--failure-rate nominatim=0.1]
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+UPSTREAMS = ('nasa', 'jpl', 'nominatim', 'overpass')
+MAX_FEED_DAYS = 7
+METERS_PER_DEGREE = 111320
+
+BBOX_RE = re.compile(r'\((-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)\)')
+TILE_RE = re.compile(r'make tile ix="(-?\d+)",iy="(-?\d+)"')
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_spec(spec, cast=float):
+    """'overpass=300,nominatim=50' (or a bare value for every upstream) -> {upstream: value}"""
+    if not spec:
+        return {}
+    if '=' not in spec:
+        return {name: cast(spec) for name in UPSTREAMS}
+    values = {}
+    for part in spec.split(','):
+        name, _, value = part.partition('=')
+        if name not in UPSTREAMS:
+            raise ValueError(f'Unknown upstream: {name}')
+        values[name] = cast(value)
+    return values
+
+
+class StubConfig:
+    """Latency (ms), jitter (ms) and failure rate per upstream; seeded for reproducible runs"""
+
+    def __init__(self, latency=None, jitter=None, failure_rate=None, seed=0):
+        self.latency = latency or {}
+        self.jitter = jitter or {}
+        self.failure_rate = failure_rate or {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, upstream):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter.get(upstream, 0))
+        return (self.latency.get(upstream, 0) + jitter) / 1000
+
+    def fails(self, upstream):
+        rate = self.failure_rate.get(upstream, 0)
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+
+class Fixtures:
+    """Recorded payloads, adapted to each request where the real API would differ"""
+
+    def __init__(self):
+        self.neo_feed = _fixture('neo_feed.json')
+        self.sbdb = _fixture('sbdb.json')
+        self.sbdb_query = _fixture('sbdb_query.json')
+        self.search = _fixture('nominatim_search.json')
+        self.reverse = _fixture('nominatim_reverse.json')
+        self.overpass = _fixture('overpass_templates.json')
+        self._day = next(iter(self.neo_feed['near_earth_objects'].values()))
+
+    def feed(self, params):
+        """The fixture day repeated for every date in [start_date, end_date]"""
+        start = datetime.date.fromisoformat(params.get('start_date', '2015-09-07'))
+        end = datetime.date.fromisoformat(params.get('end_date', start.isoformat()))
+        if end < start or (end - start).days >= MAX_FEED_DAYS:
+            return 400, {'code': 400, 'error_message': 'Date Format Exception - Expected format (yyyy-mm-dd) '
+                                                       '- The Feed date limit is only 7 Days'}
+        days = {}
+        for offset in range((end - start).days + 1):
+            date = (start + datetime.timedelta(days=offset)).isoformat()
+            neos = copy.deepcopy(self._day)
+            for neo in neos:
+                for approach in neo['close_approach_data']:
+                    approach['close_approach_date'] = date
+            days[date] = neos
+        return 200, {'links': self.neo_feed['links'], 'element_count': sum(len(v) for v in days.values()),
+                     'near_earth_objects': days}
+
+    def overpass_elements(self, query):
+        """Elements for an Overpass query: per-tile batches, 'out count' checks and plain bbox queries"""
+        elements = []
+        tiles = list(TILE_RE.finditer(query))
+        if tiles:
+            for match in tiles:
+                ix, iy = match.groups()
+                elements.append({'type': 'tile', 'id': len(elements) + 1, 'tags': {'ix': ix, 'iy': iy}})
+                bbox = BBOX_RE.search(query, match.end())
+                if bbox:
+                    elements.extend(self._populate(*map(float, bbox.groups())))
+            return elements
+
+        boxes = [tuple(map(float, m.groups())) for m in BBOX_RE.finditer(query)]
+        if 'out count' in query and boxes:
+            total = len(self._populate(*boxes[0]))
+            elements.append({'type': 'count', 'id': 0, 'tags': {'nodes': str(total), 'total': str(total)}})
+        if boxes:
+            elements.extend(self._populate(*boxes[-1]))
+        return elements
+
+    def _populate(self, south, west, north, east):
+        """Template copies at positions seeded by the bbox, so repeated queries agree"""
+        spec = self.overpass
+        height_km = (north - south) * METERS_PER_DEGREE / 1000
+        width_km = (east - west) * METERS_PER_DEGREE / 1000
+        count = min(spec['maxElementsPerBbox'], int(spec['elementsPerSquareKm'] * height_km * width_km))
+        rng = random.Random(f'{south:.6f},{west:.6f},{north:.6f},{east:.6f}')
+        base = int(abs(south * 1e6 + west * 1e3)) * 10000
+        templates = [('node', t) for t in spec['nodes']] + [('way', t) for t in spec['ways']]
+        weights = [t['weight'] for _, t in templates]
+
+        elements = []
+        for n in range(count):
+            kind, template = rng.choices(templates, weights)[0]
+            lat, lon = rng.uniform(south, north), rng.uniform(west, east)
+            element_id = base + n * 10
+            if kind == 'node':
+                elements.append({'type': 'node', 'id': element_id, 'lat': lat, 'lon': lon,
+                                 'tags': dict(template['tags'])})
+                continue
+            # A small square way with its own nodes
+            d = 0.0001
+            corners = [(lat, lon), (lat + d, lon), (lat + d, lon + d), (lat, lon + d)]
+            node_ids = [element_id + k + 1 for k in range(4)]
+            elements.append({'type': 'way', 'id': element_id, 'nodes': node_ids + node_ids[:1],
+                             'center': {'lat': lat + d / 2, 'lon': lon + d / 2}, 'tags': dict(template['tags'])})
+            elements.extend({'type': 'node', 'id': i, 'lat': a, 'lon': b} for i, (a, b) in zip(node_ids, corners))
+        return elements
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None
+    fixtures = None
+    counts = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        upstream, _, path = url.path.lstrip('/').partition('/')
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._body() if method == 'POST' else b''
+        if upstream not in UPSTREAMS:
+            return self._send(404, {'error': f'unknown upstream {upstream}'})
+
+        with self.server.counts_lock:
+            self.counts[upstream] = self.counts.get(upstream, 0) + 1
+        delay = self.config.delay(upstream)
+        if delay:
+            time.sleep(delay)
+        if self.config.fails(upstream):
+            return self._send(503, {'error': 'injected failure'})
+
+        fixtures = self.fixtures
+        if upstream == 'nasa' and path.startswith('neo/rest/v1/feed'):
+            return self._send(*fixtures.feed(params))
+        if upstream == 'jpl' and path == 'sbdb.api':
+            return self._send(200, fixtures.sbdb)
+        if upstream == 'jpl' and path == 'sbdb_query.api':
+            return self._send(200, fixtures.sbdb_query)
+        if upstream == 'nominatim' and path == 'search':
+            return self._send(200, fixtures.search)
+        if upstream == 'nominatim' and path == 'reverse':
+            return self._send(200, fixtures.reverse)
+        if upstream == 'overpass':
+            form = {k: v[-1] for k, v in parse_qs(body.decode('utf-8')).items()}
+            query = form.get('data') or params.get('data', '')
+            return self._send(200, {'version': 0.6, 'generator': 'bench stub',
+                                    'elements': fixtures.overpass_elements(query)})
+        return self._send(404, {'error': f'no fixture for {upstream}/{path}'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+def start_stubs(port=0, config=None, host='127.0.0.1'):
+    """Serve the stubs on a background thread; returns the server (server.server_port is the bound port)"""
+    handler = type('Handler', (StubHandler,), {
+        'config': config or StubConfig(), 'fixtures': Fixtures(), 'counts': {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.counts_lock = threading.Lock()
+    server.counts = handler.counts
+    threading.Thread(target=server.serve_forever, name='bench-stubs', daemon=True).start()
+    return server
+
+
+def upstream_env(server):
+    """Environment variables pointing backend.upstream at the stub server"""
+    base = f'http://{server.server_address[0]}:{server.server_port}'
+    return {
+        'NASA_API_URL': f'{base}/nasa',
+        'JPL_SSD_API_URL': f'{base}/jpl',
+        'NOMINATIM_URL': f'{base}/nominatim',
+        'OVERPASS_URL': f'{base}/overpass/api/interpreter',
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', default='', help='extra ms per upstream, e.g. overpass=300,nominatim=50')
+    parser.add_argument('--jitter', default='', help='uniform extra 0..ms per upstream')
+    parser.add_argument('--failure-rate', default='', help='fraction answered with 503, e.g. nominatim=0.1')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def config_from_args(args):
+    return StubConfig(parse_spec(args.latency), parse_spec(args.jitter),
+                      parse_spec(args.failure_rate), seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=18766)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stubs(args.port, config_from_args(args))
+    for name, value in upstream_env(server).items():
+        print(f'export {name}={value}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""
+gunicorn settings picked up from the project directory (gunicorn server:app).
+"""
+
+
+def post_worker_init(worker):
+    # Each web worker runs JOB_WORKERS background job threads (0 when python -m backend.jobs does the work)
+    import server
+    server.job_queue.start()
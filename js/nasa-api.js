@@ -17,8 +17,43 @@ class NASAAPI {
     return Math.floor(Math.random() * (max - min + 1)) + min;
   }
 
+  // Retrieve NEO data as columns from our server (much smaller than the raw feed)
+  async getNEOColumns(startDate, endDate) {
+    const params = new URLSearchParams({
+      start_date: startDate,
+      end_date: endDate,
+      api_key: this.apiKey,
+    });
+    const response = await fetch(`/api/nasa/neo/columns?${params}`, {
+      headers: { Accept: "application/json" },
+    });
+    if (!response.ok) {
+      throw new Error(`Server returned ${response.status}`);
+    }
+
+    const { count, columns } = await response.json();
+    const meteoritos = [];
+    for (let i = 0; i < count; i++) {
+      meteoritos.push({
+        name: columns.name[i],
+        hazardLevel: columns.pha[i] ? "HIGH" : "MEDIUM",
+        size: columns.diameterM[i],
+        velocity: columns.velocityKmh[i],
+        score: Math.random() * 100, // Random score
+        closeApproachDate: columns.approachDate[i],
+      });
+    }
+    return meteoritos;
+  }
+
   // Retrieve NEO data
   async getNEOData(startDate, endDate) {
+    try {
+      return await this.getNEOColumns(startDate, endDate);
+    } catch (error) {
+      console.warn("Server NEO columns unavailable, asking NASA directly:", error);
+    }
+
     const url = `https://api.nasa.gov/neo/rest/v1/feed?start_date=${startDate}&end_date=${endDate}&api_key=${this.apiKey}`;
     console.log("Requesting NEO data from proxy:", url);
 
@@ -1,7 +1,6 @@
-// Function to query Overpass API using sideLength (in meters)
+// Function to query Overpass data using sideLength (in meters).
+// Requests go through the server's tile cache so nearby clicks reuse fetched OSM data.
 async function fetchImpactData(lat, lon, sideLength) {
-  const overpassUrl = "https://overpass-api.de/api/interpreter";
-
   // Convert lat and lon to numbers to ensure no errors
   lat = parseFloat(lat);
   lon = parseFloat(lon);
@@ -25,35 +24,13 @@ async function fetchImpactData(lat, lon, sideLength) {
   const lon2 =
     lon + sideLength / 2 / (111320 * Math.cos((lat * Math.PI) / 180));
 
-  // Create Overpass query (nodes, ways, relations) with population data
-  const overpassQuery = `
-    [out:json][timeout:25];
-    (
-      node["building"](${lat1},${lon1},${lat2},${lon2});
-      way["building"](${lat1},${lon1},${lat2},${lon2});
-      node["amenity"](${lat1},${lon1},${lat2},${lon2});
-      way["amenity"](${lat1},${lon1},${lat2},${lon2});
-      node["population"](${lat1},${lon1},${lat2},${lon2});
-      way["population"](${lat1},${lon1},${lat2},${lon2});
-      relation["population"](${lat1},${lon1},${lat2},${lon2});
-      node["place"~"city|town|village|suburb|neighbourhood"](${lat1},${lon1},${lat2},${lon2});
-      way["place"~"city|town|village|suburb|neighbourhood"](${lat1},${lon1},${lat2},${lon2});
-    );
-    out body;
-    >;
-    out skel qt;
-  `;
-
-  // Make the request to Overpass API
-  const response = await fetch(
-    `${overpassUrl}?data=${encodeURIComponent(overpassQuery)}`,
-    {
-      method: "GET",
-      headers: {
-        "Content-Type": "application/json",
-      },
-    }
-  );
+  // Buildings, amenities, population and places ("impact" profile on the server)
+  const params = new URLSearchParams({
+    bbox: `${lat1},${lon1},${lat2},${lon2}`,
+    profile: "impact",
+  });
+
+  const response = await fetch(`/overpass?${params}`);
 
   if (!response.ok) {
     throw new Error(
@@ -197,6 +174,63 @@ function processImpactData(data) {
   return { buildings, amenities, totalPopulation, populatedAreas };
 }
 
+// Areas above this side length (meters) are summarized by a background job
+// so the request does not hit the proxy timeout
+const SUMMARY_JOB_MIN_SIDE = 25000;
+
+// Submit a server job and poll it until it finishes; resolves with its result
+async function runServerJob(kind, params, { lane = "normal", pollMs = 1000 } = {}) {
+  const submit = await fetch("/api/jobs", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ kind, params, lane }),
+  });
+  if (!submit.ok) {
+    throw new Error(`Error submitting ${kind} job: ${submit.statusText}`);
+  }
+
+  let job = await submit.json();
+  while (job.state === "queued" || job.state === "running") {
+    await new Promise((resolve) => setTimeout(resolve, pollMs));
+    const status = await fetch(`/api/jobs/${job.id}`);
+    if (!status.ok) {
+      throw new Error(`Error polling ${kind} job: ${status.statusText}`);
+    }
+    job = await status.json();
+  }
+  if (job.state !== "done") {
+    throw new Error(`${kind} job ${job.state}: ${job.error}`);
+  }
+
+  const result = await fetch(`/api/jobs/${job.id}/result`);
+  return await result.json();
+}
+
+// Fetch the server-side aggregated impact summary (counts, population and
+// a capped list of critical facilities) instead of the raw OSM elements
+async function fetchImpactSummary(lat, lon, sideLength) {
+  const params = new URLSearchParams({
+    lat: parseFloat(lat),
+    lon: parseFloat(lon),
+    sideLength: parseFloat(sideLength) || 5000,
+  });
+
+  if (parseFloat(params.get("sideLength")) >= SUMMARY_JOB_MIN_SIDE) {
+    return await runServerJob("overpass_summary", Object.fromEntries(params));
+  }
+
+  const response = await fetch(`/api/overpass/summary?${params}`);
+  if (!response.ok) {
+    throw new Error(
+      `Error fetching impact summary: ${response.statusText}`
+    );
+  }
+
+  return await response.json();
+}
+
 // Expose functions globally
 window.fetchImpactData = fetchImpactData;
+window.fetchImpactSummary = fetchImpactSummary;
+window.runServerJob = runServerJob;
 window.processImpactData = processImpactData;
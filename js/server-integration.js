@@ -6,6 +6,12 @@ class ServerIntegration {
     this.serverUrl = "http://localhost:5000";
     this.simulation2DRunning = false;
     this.simulation2DPID = null;
+    this.sessionId = null;
+  }
+
+  // Headers identifying this browser's simulation session on the server.
+  sessionHeaders() {
+    return this.sessionId ? { "X-Session-Id": this.sessionId } : {};
   }
 
   // Start the 2D simulation.
@@ -15,6 +21,7 @@ class ServerIntegration {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          ...this.sessionHeaders(),
         },
         body: JSON.stringify(simulationData),
       });
@@ -28,6 +35,7 @@ class ServerIntegration {
       if (result.status === "success") {
         this.simulation2DRunning = true;
         this.simulation2DPID = result.pid;
+        this.sessionId = result.sessionId || this.sessionId;
 
         // Display notification.
         this.showNotification(
@@ -54,6 +62,7 @@ class ServerIntegration {
     try {
       const response = await fetch(`${this.serverUrl}/api/simulation/stop`, {
         method: "POST",
+        headers: this.sessionHeaders(),
       });
 
       if (!response.ok) {
@@ -84,7 +93,9 @@ class ServerIntegration {
   // Check 2D simulation status.
   async checkSimulationStatus() {
     try {
-      const response = await fetch(`${this.serverUrl}/api/simulation/status`);
+      const response = await fetch(`${this.serverUrl}/api/simulation/status`, {
+        headers: this.sessionHeaders(),
+      });
 
       if (!response.ok) {
         throw new Error(`Error HTTP: ${response.status}`);
@@ -190,34 +190,33 @@ class MeteorSimulation {
   }
 
   async checkIfOceanImpact(lat, lon) {
-    // Check if coordinates are over water using Overpass API
+    // Prefer the server's offline land/sea mask (no upstream round-trip)
     try {
-      const overpassUrl = "https://overpass-api.de/api/interpreter";
+      const params = new URLSearchParams({ lat, lon });
+      const maskResponse = await fetch(`/api/landmask?${params}`);
+      if (maskResponse.ok) {
+        const mask = await maskResponse.json();
+        return mask.isOceanImpact;
+      }
+    } catch (error) {
+      console.warn("Land mask unavailable, falling back to Overpass:", error);
+    }
 
-      // Small radius query (500m) just to check terrain type
+    // Check if coordinates are over water using Overpass API
+    try {
+      // Small bbox (500m) just to check terrain type
       const radius = 500; // meters
       const lat1 = lat - radius / 111320;
       const lon1 = lon - radius / (111320 * Math.cos((lat * Math.PI) / 180));
       const lat2 = lat + radius / 111320;
       const lon2 = lon + radius / (111320 * Math.cos((lat * Math.PI) / 180));
 
-      // Query for land features (buildings, highways, landuse)
-      const query = `
-        [out:json][timeout:10];
-        (
-          node["building"](${lat1},${lon1},${lat2},${lon2});
-          way["building"](${lat1},${lon1},${lat2},${lon2});
-          way["highway"](${lat1},${lon1},${lat2},${lon2});
-          way["landuse"](${lat1},${lon1},${lat2},${lon2});
-          node["place"](${lat1},${lon1},${lat2},${lon2});
-        );
-        out body;
-      `;
-
-      const response = await fetch(
-        `${overpassUrl}?data=${encodeURIComponent(query)}`,
-        { method: "GET", timeout: 10000 }
-      );
+      // Land features (buildings, highways, landuse, places) from the tile cache
+      const params = new URLSearchParams({
+        bbox: [lat1, lon1, lat2, lon2].join(","),
+        profile: "terrain",
+      });
+      const response = await fetch(`/overpass?${params}`);
 
       if (!response.ok) {
         console.warn("Could not determine terrain type, assuming land");
@@ -293,7 +292,7 @@ class MeteorSimulation {
     `;
   }
 
-  searchLocation() {
+  async searchLocation() {
     const input = document.getElementById("location-input");
     if (!input) {
       return;
@@ -332,11 +331,33 @@ class MeteorSimulation {
     if (match) {
       this.setImpactLocation(match.lat, match.lon, match.label);
       input.value = match.label; // Update text field with found location
-    } else {
-      this.showInlineMessage(
-        "Location not found. Use latitude, longitude coordinates."
-      );
+      return;
     }
+
+    // Otherwise ask the server (local gazetteer, Nominatim on a miss)
+    try {
+      const params = new URLSearchParams({ q: value });
+      const response = await fetch(`/api/geocoding?${params}`);
+      if (response.ok) {
+        const places = await response.json();
+        if (Array.isArray(places) && places.length > 0) {
+          const place = places[0];
+          this.setImpactLocation(
+            parseFloat(place.lat),
+            parseFloat(place.lon),
+            place.display_name
+          );
+          input.value = place.display_name;
+          return;
+        }
+      }
+    } catch (error) {
+      console.warn("Geocoding unavailable:", error);
+    }
+
+    this.showInlineMessage(
+      "Location not found. Use latitude, longitude coordinates."
+    );
   }
 
   renderLocationInfo() {
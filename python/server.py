@@ -2,79 +2,95 @@
 Flask server integrating the 2D simulation with the web application.
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, render_template, request, jsonify, send_from_directory
 import json
 import os
+import sys
 import requests
 from flask_cors import CORS
 from geopy.geocoders import Nominatim
 
+# Guardar archivo de datos en el directorio del proyecto / Save data file in the project directory.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Compartir el paquete backend con el servidor raíz / Share the backend package with the root server.
+sys.path.insert(0, PROJECT_DIR)
+from backend.gazetteer import gazetteer_from_env
+from backend.impact import (
+    DEFAULT_ANGLE, DEFAULT_POPULATION_DENSITY, calculate_impact as calculate_impact_scenario,
+    validate_inputs as validate_impact_inputs
+)
+from backend.metrics import REGISTRY as metrics_registry, instrument
+from backend.overpass_tiles import AreaTooLarge, tile_cache_from_env
+from backend.static_assets import is_private as is_private_file, static_assets_from_env
+from backend.upstream import UpstreamUnavailable, get_upstream
+
 app = Flask(__name__)
 CORS(app)
+# Latencia y tamaños por ruta / Per-route latency and sizes (GET /metrics)
+instrument(app)
 
-# Guardar archivo de datos en el directorio del proyecto / Save data file in the project directory.
-PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+overpass_tiles = tile_cache_from_env(get_upstream('overpass'))
+
+# Geocodificación local (GAZETTEER_DIR); Nominatim solo si no hay resultado
+# Local geocoding (GAZETTEER_DIR); Nominatim only when it has no answer
+gazetteer = gazetteer_from_env()
+# Un solo cliente geopy para todas las peticiones / One geopy client for every request
+geolocator = Nominatim(user_agent="MeteoriteImpactSimulatorHackathonNASA/1.0 (hanserlodev@gmail.com)")
+
+# Archivos públicos precomprimidos en memoria / Public files precompressed in memory
+static_assets = static_assets_from_env(PROJECT_DIR)
+
+
+def static_response(filename):
+    """Servir desde la tabla de assets / Serve from the asset table, falling back to the filesystem"""
+    asset = static_assets.lookup(filename)
+    if asset is None:
+        # Bases de datos nunca / Never databases (e.g. simulation_sessions.db)
+        if is_private_file(filename):
+            abort(404)
+        return send_from_directory(PROJECT_DIR, filename)
+    body, status, headers = static_assets.respond(asset, request.headers)
+    return Response(body, status=status, headers=headers)
 
 
 @app.route('/')
 def index():
     """Página principal"""
-    # Obtener el directorio padre (donde están los archivos HTML/CSS/JS) / Get the directory containing HTML/CSS/JS files.
-    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    return send_from_directory(parent_dir, 'index.html')
+    return static_response('index.html')
 
 @app.route('/<path:filename>')
 def static_files(filename):
     """Servir archivos estáticos"""
-    # Obtener el directorio padre (donde están los archivos HTML/CSS/JS) / Get the directory containing HTML/CSS/JS files.
-    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    return send_from_directory(parent_dir, filename)
+    return static_response(filename)
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato Prometheus / Metrics in Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/overpass', methods=['GET','POST'])
 def get_overpass_data():
-    """Proxy para Overpass API"""
+    """Proxy para Overpass API (servido desde la caché de teselas / served from the tile cache)"""
     try:
         # Obtener parámetros de consulta del frontend
-        lat = (request.args.get('lat'))
-        lon = (request.args.get('lon'))
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
         side_length = int(request.args.get('sideLength', 5000))  # Tamaño del área de impacto en metros (ajustable)
 
         # Validar que las coordenadas sean válidas
-        if not lat or not lon:
+        if lat is None or lon is None:
             return jsonify({'error': 'Coordenadas lat/lon son necesarias'}), 400
         
-        # URL de Overpass API
-        overpass_url = 'https://overpass-api.de/api/interpreter'
-        
-        # Consulta Overpass API para obtener edificios, infraestructura y población
-        query = f"""
-            [out:json];
-            (
-              node["building"](around:{lat},{lon},{side_length});
-              way["building"](around:{lat},{lon},{side_length});
-              relation["building"](around:{lat},{lon},{side_length});
-              
-              node["amenity"](around:{lat},{lon},{side_length});
-              way["amenity"](around:{lat},{lon},{side_length});
-              relation["amenity"](around:{lat},{lon},{side_length});
-              
-              node["population"](around:{lat},{lon},{side_length});
-            );
-            out body;
-            >;
-            out skel qt;
-        """
-
-        # Mostrar la consulta en la consola (útil para depuración)
-        print(f"Consulta enviada a Overpass API: {query}")
-        
-        # Realizar la solicitud a Overpass API
-        response = requests.post(overpass_url, data={'data': query})
-        response.raise_for_status()  # Si hay un error, se lanzará una excepción
-
-        # Devolver los datos obtenidos de Overpass API
-        return jsonify(response.json())
+        # Edificios, infraestructura y población; solo se descargan las teselas que faltan
+        # Buildings, infrastructure and population; only missing tiles are downloaded.
+        return jsonify(overpass_tiles.query_radius('impact', lat, lon, side_length))
 
+    except AreaTooLarge as e:
+        # Área demasiado grande para el límite de teselas / Area over the tile limit
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except requests.exceptions.RequestException as e:
         # Capturar cualquier error de la solicitud (como problemas de red)
         return jsonify({'error': str(e)}), 500
@@ -87,11 +103,22 @@ def geocoding():
         if not query:
             return jsonify({'error': 'Parámetro q requerido'}), 400
         
+        # Lugar poblado más cercano desde el índice local / Nearest populated place from the local index
+        if gazetteer is not None:
+            try:
+                lat, lon = (float(part) for part in query.split(','))
+            except ValueError:
+                lat = lon = None
+            place = gazetteer.reverse(lat, lon) if lat is not None and abs(lat) <= 90 and abs(lon) <= 180 else None
+            if place is not None:
+                return jsonify({
+                    'address': place['address'],
+                    'latitude': float(place['lat']),
+                    'longitude': float(place['lon'])
+                })
+
         print(f"Realizando solicitud a Nominatim para: {query}")
         
-        # Usar Geopy con Nominatim
-        geolocator = Nominatim(user_agent="MeteoriteImpactSimulatorHackathonNASA/1.0 (hanserlodev@gmail.com)")
-        
         # Obtener la ubicación usando Geopy
         location = geolocator.reverse(query, language='es', addressdetails=True)
         
@@ -127,73 +154,20 @@ def calculate_impact():
             if field not in data:
                 return jsonify({'error': f'Campo requerido faltante: {field}'}), 400
         
-        # Simular cálculos (en una implementación real, usarías las funciones de JavaScript) / Simulate calculations (in a real implementation, JavaScript functions would be used).
+        # Modelo físico compartido con js/calculations.js / Physics model shared with js/calculations.js.
         diameter = float(data['diameter'])
         velocity = float(data['velocity'])
-        density = data['density']
-        
-        # Cálculos simplificados / Simplified calculations.
-        density_values = {
-            'iron': 7.8,
-            'stone': 3.0,
-            'ice': 0.9
-        }
-        
-        density_kg_m3 = density_values.get(density, 3.0) * 1000
-        radius = diameter / 2
-        volume = (4/3) * 3.14159 * (radius ** 3)
-        mass = volume * density_kg_m3
-        velocity_ms = velocity * 1000
-        energy_joules = 0.5 * mass * (velocity_ms ** 2)
-        energy_megatons = energy_joules / (4.184e15)
-        
-        # Calcular efectos / Calculate effects.
-        crater_diameter = (energy_megatons ** 0.294) * 800
-        total_destruction_zone = (energy_megatons ** 0.33) * 2.5
-        severe_destruction_zone = (energy_megatons ** 0.33) * 5
-        moderate_destruction_zone = (energy_megatons ** 0.33) * 10
-        
-        # Estimar víctimas (simplificado) / Estimate casualties (simplified).
-        population_density = data.get('population_density', 1000)
-        fatalities = int(total_destruction_zone * total_destruction_zone * 3.14159 * population_density * 0.5)
-        injuries = int(fatalities * 3)
-        
-        # Efectos secundarios / Secondary effects.
-        earthquake_magnitude = max(0, (energy_megatons ** 0.5) * 2)
-        tsunami_height = max(1, (energy_megatons ** 0.4) * 20)
-        fire_radius = max(1, (energy_megatons ** 0.33) * 3)
-        dust_radius = max(5, (energy_megatons ** 0.33) * 15)
-        
-        result = {
-            'mass': mass,
-            'energy': energy_joules,
-            'energyMegatons': energy_megatons,
-            'craterDiameter': crater_diameter,
-            'totalDestructionZone': total_destruction_zone,
-            'severeDestructionZone': severe_destruction_zone,
-            'moderateDestructionZone': moderate_destruction_zone,
-            'casualties': {
-                'fatalities': fatalities,
-                'injuries': injuries,
-                'totalAffected': fatalities + injuries
-            },
-            'earthquake': {
-                'magnitude': earthquake_magnitude
-            },
-            'tsunami': {
-                'height': tsunami_height
-            },
-            'fire': {
-                'radius': fire_radius
-            },
-            'dust': {
-                'radius': dust_radius
-            },
-            'impactClassification': {
-                'level': 'Regional' if energy_megatons < 10 else 'Continental',
-                'description': 'Impacto regional con daños significativos' if energy_megatons < 10 else 'Impacto continental con devastación masiva'
-            }
-        }
+        angle = float(data.get('angle', DEFAULT_ANGLE))
+        try:
+            validate_impact_inputs(diameter, velocity, angle)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        result = calculate_impact_scenario(
+            diameter, velocity, data['density'],
+            population_density=data.get('population_density', DEFAULT_POPULATION_DENSITY),
+            angle=angle,
+            is_ocean_impact=data.get('is_ocean_impact', False))
         
         return jsonify(result)
         
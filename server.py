@@ -3,27 +3,152 @@ Simplified Flask server for Meteorite Impact Simulator
 Production-ready for Render deployment
 """
 
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, Response, abort, send_from_directory, request, jsonify
 from flask_cors import CORS
+import asyncio
 import json
+import math
 import os
-import requests
+
+from backend.cache import ResponseCache, make_key
+from backend.catalog import CatalogUnavailable, catalog_from_env
+from backend.ephemeris import encode as encode_ephemeris, parse_request as parse_ephemeris_request, positions as ephemeris_positions
+from backend.gazetteer import MAX_LIMIT as GAZETTEER_MAX_LIMIT, gazetteer_from_env
+from backend.gateway import parse_request as parse_simulate_request, simulate as simulate_pipeline
+from backend.impact import (
+    DEFAULT_ANGLE, DEFAULT_POPULATION_DENSITY, calculate_impact as calculate_impact_scenario,
+    calculate_impact_batch as calculate_impact_columns, parse_batch_request,
+    to_columns as impact_to_columns, validate_inputs as validate_impact_inputs
+)
+from backend.jobs import QueueFull, job_queue_from_env
+from backend.landmask import landmask_from_env, parse_points as parse_landmask_points
+from backend.metrics import REGISTRY as metrics_registry, instrument, profiler_from_env, stats_collector, timed
+from backend.montecarlo import parse_request as parse_monte_carlo_request, run_monte_carlo
+from backend.neo_feed import (
+    MSGPACK_TYPES as NEO_MSGPACK_TYPES, daily_feed_from_env, encode as encode_neo_columns,
+    normalize_feed as normalize_neo_feed, parse_range as parse_neo_range
+)
+from backend.overpass_summary import summarize_stream, summary_query
+from backend.overpass_tiles import PROFILES as OVERPASS_PROFILES, AreaTooLarge, tile_cache_from_env
+from backend.passthrough import ResponseTooLarge, stream_response
+from backend.population import (
+    apply_to_impact as apply_population_grid, box_area_km2, check_point as check_population_point,
+    circle_area_km2, population_grid_from_env
+)
+from backend.scenarios import scenario_store_from_env
+from backend.screening import load_results as load_screening, query_results as query_screening
+from backend.singleflight import singleflight_from_env
+from backend.static_assets import is_private as is_private_file, static_assets_from_env
+from backend.sessions import PayloadTooLarge, new_session_id, session_store_from_env
+from backend.sweep import (
+    BLOCK_SIZE as SWEEP_BLOCK_SIZE, iter_ndjson as iter_sweep_ndjson, parse_request as parse_sweep_request
+)
+from backend.upstream import UpstreamUnavailable, get_upstream, upstream_stats
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+# Latency, payload size and in-flight metrics for every route (GET /metrics)
+instrument(app)
+# Opt-in sampling profiler (METRICS_PROFILE_HZ), read at GET /metrics/profile
+profiler = profiler_from_env()
 
 # Configuration for production (no pygame needed in cloud)
-SIMULATION_DATA_FILE = 'simulation_data.json'
+# Per-session simulation state (SIMULATION_STORE=sqlite to share it between workers)
+simulation_store = session_store_from_env()
+SESSION_COOKIE = 'sim_session'
+
+# Upstream response cache (set RESPONSE_CACHE_DIR to share it between workers)
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    disk_dir=os.environ.get('RESPONSE_CACHE_DIR'),
+    flight=singleflight_from_env('responses'),
+    disk_max_bytes=int(os.environ.get('RESPONSE_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+)
+# Concurrent identical geocoding lookups share one Nominatim call
+geocoding_flight = singleflight_from_env('geocoding')
+# Offline place index (GAZETTEER_DIR, built with python -m backend.gazetteer); Nominatim only on a miss
+gazetteer = gazetteer_from_env()
+NEO_FEED_CACHE_TTL = 60 * 60           # feed for a date range changes a few times a day
+NEO_FEED_STALE_TTL = 24 * 60 * 60
+# Feed ranges of any length, cached per day (past days are kept for good)
+neo_feed = daily_feed_from_env(get_upstream('nasa'), response_cache, ttl=NEO_FEED_CACHE_TTL,
+                               stale_ttl=NEO_FEED_STALE_TTL, flight=response_cache.flight)
+SBDB_CACHE_TTL = 24 * 60 * 60          # orbital elements change at most daily
+SBDB_STALE_TTL = 7 * 24 * 60 * 60
+
+# Untransformed upstream bodies are streamed through up to this size
+PASSTHROUGH_MAX_BYTES = int(os.environ.get('PASSTHROUGH_MAX_BYTES', 64 * 1024 * 1024))
+
+# Per-tile Overpass element cache shared by every radius/bbox query
+overpass_tiles = tile_cache_from_env(get_upstream('overpass'))
+
+# Local SBDB catalog (NEO_CATALOG_DIR); /api/sbdb_query falls back to JPL without it
+neo_catalog = catalog_from_env()
+
+
+# Offline land/sea mask (LANDMASK_PATH, built with python -m backend.landmask)
+landmask = landmask_from_env()
+
+# Gridded population summed-area table (POPULATION_GRID_PATH, built with python -m backend.population)
+population_grid = population_grid_from_env()
+
+# Complete simulate results by scenario id (SCENARIO_STORE_PATH, default in DATA_DIR; empty disables it)
+scenario_store = scenario_store_from_env()
+
+# Background job queue shared by all workers (JOB_QUEUE_PATH, default in DATA_DIR); kinds are registered below
+job_queue = job_queue_from_env()
+
+# index.html, styles.css, js/ and assets/ precompressed in memory
+static_assets = static_assets_from_env(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Cache, single-flight and pool stats exported as gauges on each scrape
+metrics_registry.register_collector(stats_collector('component', {
+    'simulationSessions': simulation_store.stats,
+    'responses': response_cache.stats,
+    'overpassTiles': overpass_tiles.stats,
+    'responsesFlight': response_cache.flight.stats,
+    'neoFeed': neo_feed.stats,
+    'geocodingFlight': geocoding_flight.stats,
+    'overpassFlight': overpass_tiles.flight.stats,
+    'scenarios': scenario_store.stats if scenario_store is not None else lambda: None,
+    'jobs': job_queue.stats,
+}))
+metrics_registry.register_collector(stats_collector('upstream', {'pool': upstream_stats}))
+
+
+def static_response(filename):
+    """Serve a public file from the asset table; other files fall back to the filesystem"""
+    asset = static_assets.lookup(filename)
+    if asset is None:
+        if is_private_file(filename):
+            abort(404)
+        return send_from_directory('.', filename)
+    body, status, headers = static_assets.respond(asset, request.headers)
+    return Response(body, status=status, headers=headers)
+
+
+def cached_json_response(body, cache_status):
+    """Wrap a cached upstream JSON body in a response tagged with its cache status"""
+    response = Response(body, mimetype='application/json')
+    response.headers['X-Cache'] = cache_status
+    return response
 
 @app.route('/')
 def index():
     """Main page"""
-    return send_from_directory('.', 'index.html')
+    return static_response('index.html')
 
 @app.route('/<path:filename>')
 def static_files(filename):
     """Serve static files"""
-    return send_from_directory('.', filename)
+    return static_response(filename)
+
+def get_session_id():
+    """Session id from the X-Session-Id header, session_id query param or cookie"""
+    return (request.headers.get('X-Session-Id')
+            or request.args.get('session_id')
+            or request.cookies.get(SESSION_COOKIE))
 
 @app.route('/api/simulation/start', methods=['POST'])
 def start_simulation():
@@ -34,15 +159,22 @@ def start_simulation():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Save simulation data for reference
-        with open(SIMULATION_DATA_FILE, 'w') as f:
-            json.dump(data, f)
+        # Save simulation data for this session only
+        session_id = get_session_id() or new_session_id()
+        try:
+            simulation_store.set(session_id, json.dumps(data, separators=(',', ':')).encode())
+        except PayloadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
         
-        return jsonify({
+        response = jsonify({
             'status': 'success',
             'message': 'Simulation data saved successfully',
+            'sessionId': session_id,
             'data': data
         })
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax',
+                            max_age=int(simulation_store.ttl))
+        return response
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -51,50 +183,78 @@ def start_simulation():
 def simulation_status():
     """Get simulation status"""
     try:
-        # Try to read saved simulation data
-        if os.path.exists(SIMULATION_DATA_FILE):
-            with open(SIMULATION_DATA_FILE, 'r') as f:
-                data = json.load(f)
-            return jsonify({
-                'running': True,
-                'data': data
-            })
-        else:
+        session_id = get_session_id()
+        payload = simulation_store.get(session_id) if session_id else None
+        if payload is None:
             return jsonify({
                 'running': False,
                 'data': None
             })
+        
+        # Stored payload is already JSON; splice it in without re-parsing
+        return Response(b'{"running":true,"data":' + payload + b'}', mimetype='application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/simulation/stop', methods=['POST'])
+def stop_simulation():
+    """Stop the simulation and drop this session's data"""
+    try:
+        session_id = get_session_id()
+        if session_id:
+            simulation_store.delete(session_id)
+        
+        response = jsonify({
+            'status': 'success',
+            'message': 'Simulation stopped'
+        })
+        response.delete_cookie(SESSION_COOKIE)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def neo_feed_range():
+    """(start, end, api_key) from the request; any range up to a year, split into feed windows"""
+    start, end = parse_neo_range(request.args.get('start_date'), request.args.get('end_date'))
+    return start, end, request.args.get('api_key', 'DEMO_KEY')
+
+
 @app.route('/api/nasa/neo', methods=['GET'])
 def get_nasa_data():
     """Proxy for NASA API data"""
     try:
-        import requests
-        
-        # Query parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        api_key = request.args.get('api_key', 'DEMO_KEY')
-        
-        # Build URL
-        url = f"https://api.nasa.gov/neo/rest/v1/feed"
-        params = {
-            'api_key': api_key
-        }
-        
-        if start_date:
-            params['start_date'] = start_date
-        if end_date:
-            params['end_date'] = end_date
-        
-        #   Make request to NASA
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        return jsonify(response.json())
-        
+        try:
+            start, end, api_key = neo_feed_range()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        body, cache_status = neo_feed.fetch(start, end, api_key)
+        return cached_json_response(body, cache_status)
+        
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/nasa/neo/columns', methods=['GET'])
+def get_nasa_columns():
+    """The NASA feed flattened to typed columns; JSON, or MessagePack via Accept"""
+    try:
+        try:
+            start, end, api_key = neo_feed_range()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        body, cache_status = neo_feed.fetch(start, end, api_key)
+        columns = normalize_neo_feed(json.loads(body))
+        best = request.accept_mimetypes.best_match(('application/json',) + NEO_MSGPACK_TYPES)
+        payload, mimetype = encode_neo_columns(columns, accept_msgpack=best in NEO_MSGPACK_TYPES)
+
+        response = Response(payload, mimetype=mimetype)
+        response.headers['X-Cache'] = cache_status
+        response.vary.add('Accept')
+        return response
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -102,28 +262,66 @@ def get_nasa_data():
 def geocoding():
     """Proxy para geocoding"""
     try:
-        import requests
-        
-        query = request.args.get('q')
+        query = ' '.join(request.args.get('q', '').split())
         if not query:
             return jsonify({'error': 'Parameter q required'}), 400
+
+        if gazetteer is not None:
+            places = gazetteer.search(query, limit=5)
+            if places:
+                response = jsonify(places)
+                response.headers['X-Source'] = 'local-gazetteer'
+                return response
         
         # Use Nominatim API for geocoding
-        url = "https://nominatim.openstreetmap.org/search"
         params = {
             'format': 'json',
             'q': query,
             'limit': 5
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        return jsonify(response.json())
+        def fetch():
+            response = get_upstream('nominatim').get('search', params=params)
+            response.raise_for_status()
+            return response.content
+
+        # Nominatim ignores case, so "Paris" and "PARIS" coalesce
+        key = make_key('geocoding', {'q': query.casefold(), 'limit': 5})
+        return Response(geocoding_flight.do(key, fetch), mimetype='application/json')
         
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/geocoding/autocomplete', methods=['GET'])
+def geocoding_autocomplete():
+    """City names starting with q, largest first, from the local gazetteer"""
+    if gazetteer is None:
+        return jsonify({'error': 'Gazetteer not configured (GAZETTEER_DIR)'}), 503
+    query = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), GAZETTEER_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify(gazetteer.search(query, limit=limit, exact_first=False))
+
+
+@app.route('/api/geocoding/reverse', methods=['GET'])
+def geocoding_reverse():
+    """Nearest populated place to lat/lon, in Nominatim's reverse shape"""
+    if gazetteer is None:
+        return jsonify({'error': 'Gazetteer not configured (GAZETTEER_DIR)'}), 503
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180):
+        return jsonify({'error': 'Parameters lat and lon required'}), 400
+    place = gazetteer.reverse(lat, lon)
+    if place is None:
+        return jsonify({'error': 'Unable to geocode'}), 404
+    return jsonify(place)
+
+
 @app.route('/api/sbdb', methods=['GET'])
 def nasa_sbdb_proxy():
     """Proxy para NASA Small-Body Database API"""
@@ -135,19 +333,25 @@ def nasa_sbdb_proxy():
         if not sstr:
             return jsonify({'error': 'Parameter sstr required'}), 400
         
-        # Make URL
-        url = 'https://ssd-api.jpl.nasa.gov/sbdb.api'
         params = {
             'sstr': sstr,
             'full-prec': full_prec
         }
         
-        # Make request to NASA
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
+        def fetch():
+            # Make request to NASA
+            response = get_upstream('jpl').get('sbdb.api', params=params)
+            response.raise_for_status()
+            return response.content
         
-        return jsonify(response.json())
+        # Designations are case-insensitive upstream ("Apophis" == "apophis")
+        key = make_key('sbdb', {'sstr': sstr.lower(), 'full-prec': full_prec})
+        body, cache_status = response_cache.get_or_fetch(
+            key, fetch, ttl=SBDB_CACHE_TTL, stale_ttl=SBDB_STALE_TTL)
+        return cached_json_response(body, cache_status)
         
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -160,16 +364,25 @@ def nasa_sbdb_query_proxy():
         
         if not query_data:
             return jsonify({'error': 'Query data required'}), 400
-        
-        # API URL
-        url = 'https://ssd-api.jpl.nasa.gov/sbdb_query.api'
-        
-        # Make POST request to NASA
-        response = requests.post(url, json=query_data, timeout=30)
-        response.raise_for_status()
-        
-        return jsonify(response.json())
-        
+
+        if neo_catalog is not None:
+            try:
+                response = jsonify(neo_catalog.handle_query(query_data))
+                response.headers['X-Source'] = 'local-catalog'
+                return response
+            except CatalogUnavailable:
+                pass  # no snapshot ingested yet
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': str(e)}), 400
+        
+        # Make POST request to NASA; the body is relayed as-is, never parsed here
+        response = get_upstream('jpl').post('sbdb_query.api', json=query_data, stream=True)
+        return stream_response(response, 'jpl', PASSTHROUGH_MAX_BYTES)
+        
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except ResponseTooLarge as e:
+        return jsonify({'error': str(e)}), 502
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -185,73 +398,29 @@ def calculate_impact():
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
 
-        # Simulated calculations
         diameter = float(data['diameter'])
         velocity = float(data['velocity'])
-        density = data['density']
-        
-        # Simplified calculations
-        density_values = {
-            'iron': 7.8,
-            'stone': 3.0,
-            'ice': 0.9
-        }
-        
-        density_kg_m3 = density_values.get(density, 3.0) * 1000
-        radius = diameter / 2
-        volume = (4/3) * 3.14159 * (radius ** 3)
-        mass = volume * density_kg_m3
-        velocity_ms = velocity * 1000
-        energy_joules = 0.5 * mass * (velocity_ms ** 2)
-        energy_megatons = energy_joules / (4.184e15)
-        
-        # Calculate effects
-        crater_diameter = (energy_megatons ** 0.294) * 800
-        total_destruction_zone = (energy_megatons ** 0.33) * 2.5
-        severe_destruction_zone = (energy_megatons ** 0.33) * 5
-        moderate_destruction_zone = (energy_megatons ** 0.33) * 10
-        
-        # Estimate casualties (simplified)
-        population_density = data.get('population_density', 1000)
-        fatalities = int(total_destruction_zone * total_destruction_zone * 3.14159 * population_density * 0.5)
-        injuries = int(fatalities * 3)
-        
-        # Secondary effects
-        earthquake_magnitude = max(0, (energy_megatons ** 0.5) * 2)
-        tsunami_height = max(1, (energy_megatons ** 0.4) * 20)
-        fire_radius = max(1, (energy_megatons ** 0.33) * 3)
-        dust_radius = max(5, (energy_megatons ** 0.33) * 15)
-        
-        result = {
-            'mass': mass,
-            'energy': energy_joules,
-            'energyMegatons': energy_megatons,
-            'craterDiameter': crater_diameter,
-            'totalDestructionZone': total_destruction_zone,
-            'severeDestructionZone': severe_destruction_zone,
-            'moderateDestructionZone': moderate_destruction_zone,
-            'casualties': {
-                'fatalities': fatalities,
-                'injuries': injuries,
-                'totalAffected': fatalities + injuries
-            },
-            'earthquake': {
-                'magnitude': earthquake_magnitude
-            },
-            'tsunami': {
-                'height': tsunami_height
-            },
-            'fire': {
-                'radius': fire_radius
-            },
-            'dust': {
-                'radius': dust_radius
-            },
-            'impactClassification': {
-                'level': 'Regional' if energy_megatons < 10 else 'Continental',
-                'description': 'Regional impact with significant damage' if energy_megatons < 10 else 'Continental impact with massive devastation'
-            }
-        }
+        angle = float(data.get('angle', DEFAULT_ANGLE))
+        try:
+            validate_impact_inputs(diameter, velocity, angle)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with timed('physics'):
+            result = calculate_impact_scenario(
+                diameter, velocity, data['density'],
+                population_density=data.get('population_density', DEFAULT_POPULATION_DENSITY),
+                angle=angle,
+                is_ocean_impact=data.get('is_ocean_impact', False))
+
+        # With coordinates, casualties come from the people actually inside each ring
+        if population_grid is not None and data.get('lat') is not None and data.get('lon') is not None:
+            try:
+                lat, lon = float(data['lat']), float(data['lon'])
+                check_population_point(lat, lon)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'lat/lon must be finite numbers within +-90/+-180'}), 400
+            apply_population_grid(population_grid, lat, lon, result)
         
         return jsonify(result)
         
@@ -259,37 +428,543 @@ def calculate_impact():
         return jsonify({'error': str(e)}), 500
     
 
-OVERPASS_URL = "http://overpass-api.de/api/interpreter"
-
 @app.route('/overpass', methods=['GET'])
 def overpass():
+    """Overpass data for a radius (lat/lon/radius) or a bbox (south,west,north,east), served from the tile cache"""
     try:
+        profile = request.args.get('profile', 'all')
+        bbox = request.args.get('bbox')
+        if profile not in OVERPASS_PROFILES:
+            return jsonify({'error': f'Unknown profile: {profile}'}), 400
+
+        if bbox:
+            try:
+                south, west, north, east = (float(v) for v in bbox.split(','))
+            except ValueError:
+                return jsonify({'error': 'bbox must be south,west,north,east'}), 400
+            return jsonify(overpass_tiles.query_bbox(profile, south, west, north, east))
+
         # Get request coordinates
         lat = request.args.get('lat', type=float)
         lon = request.args.get('lon', type=float)
         radius = request.args.get('radius', default=1000, type=int)  # Radius in meters (default 1 km)
 
-        # Overpass API query to get data within the specified radius
-        overpass_query = f"""
-        [out:json];
-        (
-          node(around:{radius},{lat},{lon});
-          way(around:{radius},{lat},{lon});
-          relation(around:{radius},{lat},{lon});
-        );
-        out body;
-        """
-        response = requests.get(OVERPASS_URL, params={'data': overpass_query})
-
-        # Handle Overpass response
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({"error": "Error fetching data from Overpass API"}), 500
+        if lat is None or lon is None:
+            return jsonify({'error': 'Parameters lat and lon (or bbox) required'}), 400
+
+        return jsonify(overpass_tiles.query_radius(profile, lat, lon, radius))
+    except AreaTooLarge as e:
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Largest summary area: a square of this side, as fetchImpactData allows for sideLength
+SUMMARY_MAX_SIDE_M = 100000
+
+
+def summary_area(values):
+    """(south, west, north, east) from bbox, or lat/lon/sideLength meters; raises ValueError"""
+    bbox = values.get('bbox')
+    if bbox:
+        try:
+            south, west, north, east = (float(v) for v in str(bbox).split(','))
+        except ValueError:
+            raise ValueError('bbox must be south,west,north,east')
+        if not all(math.isfinite(v) for v in (south, west, north, east)):
+            raise ValueError('bbox must be finite numbers')
+        if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+            raise ValueError('bbox must have south < north within +-90 and west < east within +-180')
+        # Widest parallel of the box is the one nearest the equator
+        widest = 0.0 if south <= 0 <= north else min(abs(south), abs(north))
+        height_m = (north - south) * 111320
+        width_m = (east - west) * 111320 * math.cos(math.radians(widest))
+        if max(height_m, width_m) > SUMMARY_MAX_SIDE_M + 1:
+            raise ValueError(f'bbox too large: at most {SUMMARY_MAX_SIDE_M // 1000} km a side')
+        return south, west, north, east
+
+    try:
+        lat, lon = float(values['lat']), float(values['lon'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Parameters lat and lon (or bbox) required')
+    if not (math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180):
+        raise ValueError('lat/lon must be finite numbers within +-90/+-180')
+    try:
+        side_length = float(values.get('sideLength', 5000))
+    except (TypeError, ValueError):
+        side_length = 5000.0
+    if not math.isfinite(side_length):
+        side_length = 5000.0
+
+    # Square of sideLength meters around the point, same limits as fetchImpactData
+    side_length = min(SUMMARY_MAX_SIDE_M, max(100, side_length))
+    half_lat = side_length / 2 / 111320
+    half_lon = side_length / 2 / (111320 * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - half_lat, lon - half_lon, lat + half_lat, lon + half_lon
+
+
+def fetch_summary(area, timeout=25, check=None):
+    """Impact summary of an area, aggregated while the Overpass response streams in"""
+    south, west, north, east = area
+    response = get_upstream('overpass').post(
+        data={'data': summary_query(south, west, north, east, timeout=timeout)}, stream=True,
+        timeout=(3.05, max(60, timeout + 5)))
+    try:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=64 * 1024)
+        if check is not None:
+            chunks = _checked(chunks, check)
+        summary = summarize_stream(chunks)
+    finally:
+        response.close()
+
+    summary['bbox'] = [south, west, north, east]
+    return summary
+
+
+def _checked(chunks, check):
+    # Background jobs stop between chunks when cancelled or out of time
+    for chunk in chunks:
+        check()
+        yield chunk
+
+
+@app.route('/api/overpass/summary', methods=['GET'])
+def overpass_summary():
+    """Compact impact summary (buildings, amenities, population) aggregated server-side"""
+    try:
+        try:
+            area = summary_area(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(fetch_summary(area))
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/impact/calculate_batch', methods=['POST'])
+def calculate_impact_batch():
+    """Vectorized impact effects for many scenarios, returned as columns"""
+    try:
+        data = request.get_json(silent=True)
+        try:
+            columns = parse_batch_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        result = calculate_impact_columns(**columns)
+        return jsonify({
+            'count': int(result['mass'].size),
+            'results': impact_to_columns(result)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/impact/simulate', methods=['POST'])
+def simulate_impact():
+    """Terrain, infrastructure, reverse geocoding and physics in one round-trip"""
+    try:
+        params = parse_simulate_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    body, scenario, cache_status = simulate_scenario(params)
+    if scenario is None:
+        return Response(body, mimetype='application/json')
+    return scenario_response(body, scenario, cache_status)
+
+
+def simulate_scenario(params):
+    """(encoded result, scenario id or None, cache status) for parsed simulate params"""
+    scenario = None
+    if scenario_store is not None:
+        # The point is snapped to its grid cell so every request in the cell is the same scenario
+        scenario, inputs = scenario_store.key(params, scenario_sources())
+        params['lat'], params['lon'] = inputs['lat'], inputs['lon']
+        stored = scenario_store.get(scenario)
+        if stored is not None:
+            return stored, scenario, 'HIT'
+
+    # Stages run concurrently, each under its own deadline; slow ones come back as partial
+    result = asyncio.run(simulate_pipeline(params, geocoding_flight, landmask, population_grid, gazetteer))
+    if scenario is not None:
+        result['scenario'] = {'id': scenario, 'modelVersion': inputs['modelVersion'], 'gridDeg': inputs['gridDeg']}
+    with timed('simulate.serialize'):
+        body = json.dumps(result, separators=(',', ':')).encode('utf-8')
+    # Partial results depend on which upstream was slow this time; only complete ones are kept
+    if scenario is not None and not result['partial']:
+        scenario_store.put(scenario, inputs, body)
+    return body, scenario, 'MISS'
+
+
+def dataset_version(dataset):
+    """When a local dataset was built (its metadata), or its file's mtime for older builds"""
+    built = dataset.meta.get('built')
+    if built is None:
+        built = os.path.getmtime(dataset.path)
+    return f'{built:.0f}'
+
+
+def scenario_sources():
+    """
+    Local datasets in use and their build times; results computed with
+    different or rebuilt datasets are different scenarios
+    """
+    datasets = (('landmask', landmask), ('population', population_grid), ('gazetteer', gazetteer))
+    return [f'{name}@{dataset_version(dataset)}' for name, dataset in datasets if dataset is not None]
+
+
+def scenario_response(body, scenario, cache_status):
+    response = cached_json_response(body, cache_status)
+    response.headers['X-Scenario-Id'] = scenario
+    return response
+
+
+@app.route('/api/scenarios/<scenario>', methods=['GET'])
+def get_scenario(scenario):
+    """A stored simulate result by its scenario id (shareable links)"""
+    body = scenario_store.get(scenario) if scenario_store is not None else None
+    if body is None:
+        return jsonify({'error': 'Unknown scenario'}), 404
+    return scenario_response(body, scenario, 'HIT')
+
+
+@app.route('/api/impact/monte_carlo', methods=['POST'])
+def calculate_impact_monte_carlo():
+    """Percentile ranges (P5/P50/P95) for impact outcomes under parameter uncertainty"""
+    try:
+        try:
+            spec = parse_monte_carlo_request(request.get_json(silent=True))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify(run_monte_carlo(spec))
+        
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/impact/sweep', methods=['POST'])
+def impact_sweep():
+    """Evaluate the impact model over a parameter grid, streamed as NDJSON rows"""
+    try:
+        spec = parse_sweep_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Rows are generated block by block while the response is being sent
+    response = Response(iter_sweep_ndjson(spec), mimetype='application/x-ndjson')
+    response.headers['X-Sweep-Rows'] = str(spec['rows'])
+    return response
+
+
+@app.route('/api/landmask', methods=['GET'])
+def landmask_lookup():
+    """Land or water at one point, from the local mask"""
+    if landmask is None:
+        return jsonify({'error': 'Land mask not configured (LANDMASK_PATH)'}), 503
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180):
+        return jsonify({'error': 'Parameters lat and lon required'}), 400
+    is_land = landmask.is_land(lat, lon)
+    return jsonify({'lat': lat, 'lon': lon, 'isLand': is_land, 'isOceanImpact': not is_land})
+
+
+@app.route('/api/landmask/batch', methods=['POST'])
+def landmask_batch():
+    """Land or water for many points: {"lat": [...], "lon": [...]} or {"points": [[lat, lon], ...]}"""
+    if landmask is None:
+        return jsonify({'error': 'Land mask not configured (LANDMASK_PATH)'}), 503
+    try:
+        lat, lon = parse_landmask_points(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    is_land = landmask.is_land(lat, lon)
+    return jsonify({'count': int(is_land.size), 'landCount': int(is_land.sum()), 'isLand': is_land.tolist()})
+
+
+@app.route('/api/population', methods=['GET'])
+def population_lookup():
+    """People within radius_km of lat/lon (ring with inner_km), or inside bbox=south,west,north,east"""
+    if population_grid is None:
+        return jsonify({'error': 'Population grid not configured (POPULATION_GRID_PATH)'}), 503
+    try:
+        if 'bbox' in request.args:
+            south, west, north, east = (float(v) for v in request.args['bbox'].split(','))
+            check_population_point(south, west)
+            check_population_point(north, east)
+            if not south < north:
+                raise ValueError
+            population = population_grid.box(south, west, north, east)
+            area = box_area_km2(south, west, north, east)
+            return jsonify({'bbox': [south, west, north, east], 'population': round(population),
+                            'areaKm2': area, 'density': population / area})
+
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius = float(request.args['radius_km'])
+        inner = float(request.args.get('inner_km', 0))
+        check_population_point(lat, lon)
+        if not (math.isfinite(radius) and radius > 0 and 0 <= inner < radius):
+            raise ValueError
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Parameters lat, lon and radius_km (optional inner_km), or bbox, required'}), 400
+
+    population = population_grid.ring(lat, lon, inner, radius)
+    area = circle_area_km2(radius) - circle_area_km2(inner)
+    return jsonify({'lat': lat, 'lon': lon, 'radiusKm': radius, 'innerKm': inner,
+                    'population': round(population), 'areaKm2': area, 'density': population / area})
+
+
+@app.route('/api/ephemeris', methods=['POST'])
+def ephemeris():
+    """Heliocentric ecliptic positions for many orbits over a range of Julian dates"""
+    try:
+        ids, elements, epochs = parse_ephemeris_request(request.get_json(silent=True), neo_catalog)
+    except CatalogUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    xyz = ephemeris_positions(elements, epochs)
+    if request.accept_mimetypes.best == 'application/octet-stream':
+        # Raw little-endian float32, shape (orbits, epochs, 3)
+        response = Response(xyz.astype('<f4').tobytes(), mimetype='application/octet-stream')
+        response.headers['X-Shape'] = ','.join(str(n) for n in xyz.shape)
+        return response
+    return jsonify(encode_ephemeris(ids, epochs, xyz))
+
+
+@app.route('/api/screening', methods=['GET'])
+def screening_results():
+    """Catalog objects ranked by Earth MOID, with encounter velocities (python -m backend.screening)"""
+    if neo_catalog is None:
+        return jsonify({'error': 'Local catalog not configured (NEO_CATALOG_DIR)'}), 503
+    try:
+        table = load_screening(neo_catalog.snapshot())
+    except CatalogUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    if table is None:
+        return jsonify({'error': 'Current catalog snapshot has not been screened yet'}), 404
+
+    try:
+        max_moid = request.args.get('max_moid', type=float)
+        limit = max(1, min(int(request.args.get('limit', 100)), 10000))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    pha_only = request.args.get('pha') in ('1', 'true', 'Y')
+    return jsonify(query_screening(table, max_moid=max_moid, pha_only=pha_only, limit=limit))
+
+
+# Background jobs: heavy work runs off the request thread and is polled by id
+MAX_BATCH_SCENARIOS = 500
+JOB_SUMMARY_TIMEOUT = 180  # Overpass server-side timeout for the large areas sent as jobs
+
+
+def run_sweep_job(data, job):
+    """The whole sweep as one NDJSON result"""
+    spec = parse_sweep_request(data)
+    parts, size = [], 0
+    for n, text in enumerate(iter_sweep_ndjson(spec, SWEEP_BLOCK_SIZE), 1):
+        part = text.encode('utf-8')
+        size += len(part)
+        if size > job.max_result_bytes:
+            raise ValueError(f'Sweep result over {job.max_result_bytes} bytes; use fewer axis points')
+        parts.append(part)
+        rows = min(spec['rows'], n * SWEEP_BLOCK_SIZE)
+        job.progress(rows / spec['rows'], f"{rows} of {spec['rows']} rows")
+    return b''.join(parts), 'application/x-ndjson'
+
+
+def run_monte_carlo_job(data, job):
+    spec = parse_monte_carlo_request(data)
+    job.progress(0, f"{spec['samples']} samples")
+    # Cancellation and the job deadline are honored between chunks
+    return run_monte_carlo(spec, check=job.check)
+
+
+def run_summary_job(data, job):
+    """Overpass impact summary for areas up to the 100 km cap of fetchImpactData"""
+    area = summary_area(data)
+    job.progress(0, 'Querying Overpass')
+    return fetch_summary(area, timeout=JOB_SUMMARY_TIMEOUT, check=job.check)
+
+
+def parse_simulate_batch(data):
+    scenarios = data.get('scenarios') if isinstance(data, dict) else None
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ValueError('scenarios must be a non-empty list')
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        raise ValueError(f'At most {MAX_BATCH_SCENARIOS} scenarios per job')
+    batch = []
+    for n, scenario in enumerate(scenarios):
+        try:
+            batch.append(parse_simulate_request(scenario))
+        except ValueError as e:
+            raise ValueError(f'scenarios[{n}]: {e}')
+    return batch
+
+
+def run_simulate_batch_job(data, job):
+    """Simulate results in request order; stored scenarios are reused"""
+    batch = parse_simulate_batch(data)
+    bodies = []
+    for n, params in enumerate(batch):
+        job.progress(n / len(batch), f'Scenario {n + 1} of {len(batch)}')
+        bodies.append(simulate_scenario(params)[0])
+    return b'[' + b','.join(bodies) + b']', 'application/json'
+
+
+job_queue.register('sweep', run_sweep_job, validate=parse_sweep_request)
+job_queue.register('monte_carlo', run_monte_carlo_job, validate=parse_monte_carlo_request)
+job_queue.register('overpass_summary', run_summary_job, validate=summary_area)
+job_queue.register('simulate_batch', run_simulate_batch_job, validate=parse_simulate_batch)
+# Workers are started by an entrypoint (below, gunicorn.conf.py or python -m backend.jobs),
+# never at import: spawned Monte Carlo processes re-import this module
+
+
+# Jobs belong to the session that submitted them; other sessions get 404 for them
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a background job: {"kind", "params", "lane": high|normal|low, "deadline": seconds}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'kind' not in data:
+        return jsonify({'error': 'JSON object with kind required'}), 400
+    session_id = get_session_id() or new_session_id()
+    try:
+        job = job_queue.submit(str(data['kind']), data.get('params') or {},
+                               lane=data.get('lane', 'normal'), deadline=data.get('deadline'),
+                               client=session_id)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 429
+        response.headers['Retry-After'] = '30'
+        return response
+
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    response.headers['X-Session-Id'] = session_id
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax',
+                        max_age=int(simulation_store.ttl))
+    return response
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """This session's most recent jobs, optionally filtered by state"""
+    session_id = get_session_id()
+    if not session_id:
+        return jsonify({'jobs': []})
+    limit = min(500, max(1, request.args.get('limit', default=50, type=int)))
+    return jsonify({'jobs': job_queue.list(session_id, state=request.args.get('state'), limit=limit)})
+
+
+def session_job(job_id):
+    """(status, session id) of a job of this session; status is None for anyone else's job"""
+    session_id = get_session_id()
+    if not session_id:
+        return None, None
+    return job_queue.get(job_id, client=session_id), session_id
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job, _ = session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next check"""
+    job, session_id = session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_queue.cancel(job_id, client=session_id))
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Job status as NDJSON, one line per change, until it finishes (or ?timeout= seconds)"""
+    job, session_id = session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    timeout = min(300.0, max(1.0, request.args.get('timeout', default=60.0, type=float)))
+    statuses = job_queue.watch(job_id, client=session_id, timeout=timeout)
+    lines = (json.dumps(status, separators=(',', ':')) + '\n' for status in statuses)
+    return Response(lines, mimetype='application/x-ndjson')
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job, session_id = session_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    result = job_queue.result(job_id, client=session_id)
+    if result is not None:
+        body, mimetype = result
+        return Response(body, mimetype=mimetype)
+    job = job_queue.get(job_id, client=session_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify({'error': f"Job is {job['state']}", 'job': job}), 409
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/metrics/profile', methods=['GET'])
+def metrics_profile():
+    """Collapsed stacks from the sampling profiler (?reset=1 starts a new window)"""
+    if profiler is None:
+        return jsonify({'error': 'Profiler not enabled (METRICS_PROFILE_HZ)'}), 503
+    body = profiler.collapsed(reset=request.args.get('reset') in ('1', 'true'))
+    response = Response(body, mimetype='text/plain')
+    for name, value in profiler.stats().items():
+        response.headers[f'X-Profile-{name.capitalize()}'] = str(value)
+    return response
+
+
+@app.route('/api/upstreams/stats', methods=['GET'])
+def upstreams_stats():
+    """Connection pool, concurrency and circuit breaker stats per upstream"""
+    return jsonify(upstream_stats())
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Upstream response cache usage and hit rates"""
+    return jsonify({
+        'simulationSessions': simulation_store.stats(),
+        'responses': response_cache.stats(),
+        'overpassTiles': overpass_tiles.stats(),
+        'neoFeed': neo_feed.stats(),
+        'scenarios': scenario_store.stats() if scenario_store is not None else None,
+        'staticAssets': static_assets.stats(),
+        'singleFlight': {
+            'responses': response_cache.flight.stats(),
+            'geocoding': geocoding_flight.stats(),
+            'overpass': overpass_tiles.flight.stats()
+        }
+    })
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -300,18 +975,7 @@ def internal_error(error):
     """Handle 500 errors"""
     return jsonify({'error': 'Internal server error'}), 500
 
-def cleanup_on_exit():
-    """Clean up resources on exit"""
-    if os.path.exists(SIMULATION_DATA_FILE):
-        try:
-            os.remove(SIMULATION_DATA_FILE)
-        except:
-            pass
-
 if __name__ == '__main__':
-    import atexit
-    atexit.register(cleanup_on_exit)
-    
     # Get port from environment variable (Render provides this)
     port = int(os.environ.get('PORT', 5000))
     
@@ -320,5 +984,7 @@ if __name__ == '__main__':
     print("📁 Serving files from:", os.getcwd())
     print("🚀 Production mode enabled")
     
+    job_queue.start()
+
     # Production settings
     app.run(debug=False, host='0.0.0.0', port=port)
@@ -0,0 +1,38 @@
+// Regenerate physics_parity.json from the browser model:
+//   node tests/fixtures/generate_physics_parity.js > tests/fixtures/physics_parity.json
+// Bump MODEL_VERSION in backend/physics.py whenever the expected values change.
+
+const fs = require("fs");
+const path = require("path");
+const vm = require("vm");
+
+const source = fs.readFileSync(path.join(__dirname, "..", "..", "js", "calculations.js"), "utf8");
+const sandbox = { window: {}, Math };
+vm.runInNewContext(source, sandbox);
+const model = new sandbox.window.ImpactCalculations();
+
+const diameters = [1, 30, 150, 1000, 10000];
+const velocities = [11, 20, 72];
+const densities = ["stone", "iron", "comet", "carbon", "unknown"];
+const angles = [5, 45, 90];
+const populations = [0, 1000, 25000];
+
+const cases = [];
+let n = 0;
+for (const diameter of diameters) {
+  for (const velocity of velocities) {
+    for (const density of densities) {
+      const angle = angles[n % angles.length];
+      const populationDensity = populations[Math.floor(n / 3) % populations.length];
+      const isOceanImpact = n % 4 === 0;
+      n += 1;
+      cases.push({
+        input: { diameter, velocity, density, angle, populationDensity, isOceanImpact },
+        expected: model.calculateAllEffects(
+          diameter, velocity, density, angle, populationDensity, isOceanImpact),
+      });
+    }
+  }
+}
+
+process.stdout.write(JSON.stringify({ source: "js/calculations.js", cases }, null, 1) + "\n");
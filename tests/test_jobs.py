@@ -0,0 +1,175 @@
+"""
+backend/jobs.py: claiming, requeueing after a lost worker, cancellation and expiry.
+
+Worker threads are not started; each test drives _claim, _run and _maintain
+directly so the outcome does not depend on timing.
+"""
+
+import time
+
+import pytest
+
+from backend import jobs
+from backend.jobs import JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(str(tmp_path / 'jobs.db'), workers=0)
+    q.register('echo', lambda params, job: params)
+    return q
+
+
+def maintain(queue):
+    # _maintain is throttled to once per POLL_INTERVAL
+    queue._last_maintenance = 0.0
+    queue._maintain()
+
+
+def age_heartbeat(queue, job_id, seconds):
+    queue._connect().execute('UPDATE jobs SET heartbeat = ? WHERE id = ?', (time.time() - seconds, job_id))
+
+
+def test_claims_by_lane_then_age(queue):
+    low = queue.submit('echo', {'n': 1}, lane='low')['id']
+    normal = queue.submit('echo', {'n': 2})['id']
+    high = queue.submit('echo', {'n': 3}, lane='high')['id']
+
+    assert queue._claim(jobs.LANES['low'])[0] == high
+    assert queue._claim(jobs.LANES['low'])[0] == normal
+    # A worker reserved for the high and normal lanes leaves low jobs alone
+    assert queue._claim(jobs.LANES['normal']) is None
+    assert queue._claim(jobs.LANES['low'])[0] == low
+    assert queue._claim(jobs.LANES['low']) is None
+
+
+def test_run_stores_result(queue):
+    job_id = queue.submit('echo', {'a': 1}, client='alice')['id']
+    queue._run(*queue._claim(jobs.LANES['low']))
+
+    status = queue.get(job_id, 'alice')
+    assert status['state'] == jobs.DONE
+    assert status['progress'] == 1
+    assert queue.result(job_id, 'alice') == (b'{"a":1}', 'application/json')
+    # Other clients cannot see the job at all
+    assert queue.get(job_id, 'bob') is None
+    assert queue.result(job_id, 'bob') is None
+
+
+def test_submit_rejects_bad_input(queue):
+    with pytest.raises(ValueError):
+        queue.submit('missing', {})
+    with pytest.raises(ValueError):
+        queue.submit('echo', [1, 2])
+    with pytest.raises(ValueError):
+        queue.submit('echo', {}, deadline='soon')
+    with pytest.raises(ValueError):
+        queue.submit('echo', {}, deadline=jobs.MAX_DEADLINE + 1)
+
+
+def test_queue_full(tmp_path):
+    q = JobQueue(str(tmp_path / 'jobs.db'), workers=0, max_queued=1)
+    q.register('echo', lambda params, job: params)
+    q.submit('echo', {})
+    with pytest.raises(QueueFull):
+        q.submit('echo', {})
+
+
+def test_stale_job_is_requeued_for_another_worker(queue):
+    job_id = queue.submit('echo', {'a': 1})['id']
+    claimed = queue._claim(jobs.LANES['low'])
+    age_heartbeat(queue, job_id, jobs.STALE_AFTER + 1)
+    maintain(queue)
+    assert queue.get(job_id)['state'] == jobs.QUEUED
+
+    other = JobQueue(queue.path, workers=0)
+    other.register('echo', lambda params, job: {'by': 'other'})
+    other._run(*other._claim(jobs.LANES['low']))
+    assert queue.get(job_id)['attempts'] == 2
+
+    # The first worker finishing late must not overwrite the new owner's result
+    queue._run(*claimed)
+    assert queue.result(job_id) == (b'{"by":"other"}', 'application/json')
+
+
+def test_job_fails_after_max_attempts(queue):
+    job_id = queue.submit('echo', {})['id']
+    for _ in range(jobs.MAX_ATTEMPTS):
+        assert queue._claim(jobs.LANES['low'])[0] == job_id
+        age_heartbeat(queue, job_id, jobs.STALE_AFTER + 1)
+        maintain(queue)
+
+    status = queue.get(job_id)
+    assert status['state'] == jobs.FAILED
+    assert status['error'] == 'Worker lost'
+
+
+def test_cancel_queued_job(queue):
+    job_id = queue.submit('echo', {}, client='alice')['id']
+    # Only the submitting client can cancel
+    assert queue.cancel(job_id, 'bob') is None
+    assert queue.cancel(job_id, 'alice')['state'] == jobs.CANCELLED
+    assert queue._claim(jobs.LANES['low']) is None
+
+
+def test_cancel_running_job(queue, monkeypatch):
+    # check() normally reads the cancel flag at most every CHECK_INTERVAL
+    monkeypatch.setattr(jobs, 'CHECK_INTERVAL', 0)
+    seen = []
+
+    def run(params, job):
+        queue.cancel(job.id)
+        seen.append(queue.get(job.id)['state'])
+        job.check()
+        return 'unreachable'
+
+    queue.register('slow', run)
+    job_id = queue.submit('slow', {})['id']
+    queue._run(*queue._claim(jobs.LANES['low']))
+
+    assert seen == [jobs.RUNNING]
+    status = queue.get(job_id)
+    assert status['state'] == jobs.CANCELLED
+    assert queue.result(job_id) is None
+
+
+def test_queued_job_expires(queue):
+    job_id = queue.submit('echo', {}, deadline=60)['id']
+    queue._connect().execute('UPDATE jobs SET deadline = ? WHERE id = ?', (time.time() - 1, job_id))
+    maintain(queue)
+
+    status = queue.get(job_id)
+    assert status['state'] == jobs.EXPIRED
+    assert queue._claim(jobs.LANES['low']) is None
+
+
+def test_running_job_expires(queue):
+    def run(params, job):
+        job.deadline = time.time() - 1
+        job.progress(0.5)
+        return 'unreachable'
+
+    queue.register('late', run)
+    job_id = queue.submit('late', {})['id']
+    queue._run(*queue._claim(jobs.LANES['low']))
+    assert queue.get(job_id)['state'] == jobs.EXPIRED
+
+
+def test_failed_job_records_error(queue):
+    def run(params, job):
+        raise RuntimeError('boom')
+
+    queue.register('broken', run)
+    job_id = queue.submit('broken', {})['id']
+    queue._run(*queue._claim(jobs.LANES['low']))
+
+    status = queue.get(job_id)
+    assert (status['state'], status['error']) == (jobs.FAILED, 'boom')
+    assert queue.stats()['failedHere'] == 1
+
+
+def test_watch_stops_at_terminal_state(queue):
+    job_id = queue.submit('echo', {})['id']
+    queue._run(*queue._claim(jobs.LANES['low']))
+    states = [status['state'] for status in queue.watch(job_id, interval=0.01, timeout=1)]
+    assert states == [jobs.DONE]
@@ -0,0 +1,118 @@
+"""
+backend/overpass_tiles.py: tile reuse, LRU eviction by element count, expiry and batching.
+
+A fake upstream answers batched queries with two tagged nodes at the center
+of every requested tile, so no network is involved.
+"""
+
+import json
+import re
+
+import pytest
+
+from backend.overpass_tiles import AreaTooLarge, OverpassTileCache, QUERY_TIMEOUT_MARGIN
+
+TILE = 0.01
+TILE_MARKER = re.compile(r'make tile ix="(-?\d+)",iy="(-?\d+)"')
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeUpstream:
+    timeout = (3.05, 60)
+
+    def __init__(self):
+        self.queries = []
+
+    def post(self, data):
+        query = data['data']
+        self.queries.append(query)
+        elements = []
+        for ix, iy in TILE_MARKER.findall(query):
+            ix, iy = int(ix), int(iy)
+            elements.append({'type': 'tile', 'tags': {'ix': str(ix), 'iy': str(iy)}})
+            lat, lon = (iy + 0.5) * TILE, (ix + 0.5) * TILE
+            for n in range(2):
+                elements.append({'type': 'node', 'id': ix * 100000 + iy * 10 + n,
+                                 'lat': lat, 'lon': lon, 'tags': {'name': f'{ix},{iy},{n}'}})
+        return FakeResponse(json.dumps({'elements': elements}).encode())
+
+
+def query_tile(cache, ix, iy):
+    """Query a box inside one tile; returns the node names"""
+    south, west = iy * TILE + 0.002, ix * TILE + 0.002
+    result = cache.query_bbox('all', south, west, south + 0.006, west + 0.006)
+    return sorted(e['tags']['name'] for e in result['elements'])
+
+
+@pytest.fixture
+def upstream():
+    return FakeUpstream()
+
+
+def test_cached_tiles_are_reused(upstream):
+    cache = OverpassTileCache(upstream)
+    assert query_tile(cache, 10, 20) == ['10,20,0', '10,20,1']
+    assert query_tile(cache, 10, 20) == ['10,20,0', '10,20,1']
+    assert len(upstream.queries) == 1
+    stats = cache.stats()
+    assert (stats['tileHits'], stats['tileMisses']) == (1, 1)
+
+
+def test_evicts_least_recently_used_tile(upstream):
+    # Two elements per tile: room for two tiles
+    cache = OverpassTileCache(upstream, max_elements=4)
+    query_tile(cache, 1, 1)
+    query_tile(cache, 2, 2)
+    query_tile(cache, 1, 1)          # now the most recently used
+    query_tile(cache, 3, 3)          # evicts (2, 2)
+
+    stats = cache.stats()
+    assert (stats['tiles'], stats['elements']) == (2, 4)
+    batches = len(upstream.queries)
+    query_tile(cache, 1, 1)
+    assert len(upstream.queries) == batches
+    query_tile(cache, 2, 2)
+    assert len(upstream.queries) == batches + 1
+
+
+def test_keeps_a_tile_larger_than_the_budget(upstream):
+    cache = OverpassTileCache(upstream, max_elements=1)
+    query_tile(cache, 1, 1)
+    query_tile(cache, 2, 2)
+    stats = cache.stats()
+    # Only the newest tile is kept, even though it alone is over the limit
+    assert (stats['tiles'], stats['elements']) == (1, 2)
+
+
+def test_expired_tiles_are_fetched_again(upstream):
+    cache = OverpassTileCache(upstream, ttl=0)
+    query_tile(cache, 1, 1)
+    query_tile(cache, 1, 1)
+    assert len(upstream.queries) == 2
+    assert cache.stats()['elements'] == 2
+
+
+def test_missing_tiles_share_one_batch(upstream):
+    cache = OverpassTileCache(upstream)
+    query_tile(cache, 0, 0)
+    # A box over four tiles, one of them already cached
+    result = cache.query_bbox('all', 0.002, 0.002, 0.018, 0.018)
+    assert len(result['elements']) == 8
+    assert len(upstream.queries) == 2
+    assert len(TILE_MARKER.findall(upstream.queries[1])) == 3
+    # Overpass gives up before our read timeout does
+    assert f'[timeout:{60 - QUERY_TIMEOUT_MARGIN}]' in upstream.queries[1]
+
+
+def test_refuses_areas_too_large_for_any_level(upstream):
+    cache = OverpassTileCache(upstream)
+    with pytest.raises(AreaTooLarge):
+        cache.query_bbox('all', -1.5, -1.5, 1.5, 1.5)
+    assert upstream.queries == []
@@ -0,0 +1,69 @@
+"""
+backend/physics.py against the browser model it was ported from.
+
+The expected values come from js/calculations.js; regenerate them with
+tests/fixtures/generate_physics_parity.js after changing the JS model.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+
+from backend.physics import calculate_all_effects
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'physics_parity.json')
+REL_TOL = 1e-9
+ABS_TOL = 1e-12
+
+with open(FIXTURES) as f:
+    CASES = json.load(f)['cases']
+
+
+def assert_matches(actual, expected, path='result'):
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected), path
+        for key, value in expected.items():
+            assert_matches(actual[key], value, f'{path}.{key}')
+    elif isinstance(expected, str):
+        assert actual == expected, path
+    elif isinstance(expected, bool):
+        assert bool(actual) is expected, path
+    else:
+        assert math.isclose(float(actual), expected, rel_tol=REL_TOL, abs_tol=ABS_TOL), \
+            f'{path}: {actual} != {expected}'
+
+
+def pick(result, k):
+    """Row k of a batched result"""
+    if isinstance(result, dict):
+        return {key: pick(value, k) for key, value in result.items()}
+    return np.asarray(result)[k].item()
+
+
+def case_id(case):
+    i = case['input']
+    return f"{i['diameter']}m-{i['velocity']}kms-{i['density']}-{i['angle']}deg"
+
+
+@pytest.mark.parametrize('case', CASES, ids=case_id)
+def test_scalar_matches_js(case):
+    i = case['input']
+    result = calculate_all_effects(i['diameter'], i['velocity'], i['density'], i['angle'],
+                                   i['populationDensity'], i['isOceanImpact'])
+    assert_matches(result, case['expected'])
+
+
+def test_batch_matches_js():
+    inputs = [case['input'] for case in CASES]
+    result = calculate_all_effects(
+        np.array([i['diameter'] for i in inputs], dtype=float),
+        np.array([i['velocity'] for i in inputs], dtype=float),
+        np.array([i['density'] for i in inputs]),
+        np.array([i['angle'] for i in inputs], dtype=float),
+        np.array([i['populationDensity'] for i in inputs], dtype=float),
+        np.array([i['isOceanImpact'] for i in inputs]))
+    for k, case in enumerate(CASES):
+        assert_matches(pick(result, k), case['expected'], f'case {k}')
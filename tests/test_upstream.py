@@ -0,0 +1,157 @@
+"""
+backend/upstream.py: circuit breaker transitions, on their own and through an Upstream.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from backend import upstream as upstream_module
+from backend.upstream import CircuitBreaker, Upstream, UpstreamUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(upstream_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    # One failure in half-open is enough, whatever the threshold
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/error':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path == '/stall':
+            # Headers and part of the body, then nothing until the client gives up
+            self.send_response(200)
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            self.wfile.write(b'x' * 10)
+            self.wfile.flush()
+            time.sleep(0.5)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_upstream_short_circuits_after_server_errors(server):
+    upstream = Upstream('test', server, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        assert upstream.get('error').status_code == 503
+    with pytest.raises(UpstreamUnavailable):
+        upstream.get('ok')
+    stats = upstream.stats()
+    assert (stats['circuit'], stats['failures'], stats['rejected']) == (CircuitBreaker.OPEN, 2, 1)
+    upstream.close()
+
+
+def test_streamed_body_timeout_counts_as_failure(server):
+    upstream = Upstream('test', server, read_timeout=0.2, failure_threshold=1, max_concurrency=1)
+    response = upstream.get('stall', stream=True)
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+    with pytest.raises(requests.exceptions.ConnectionError):
+        try:
+            b''.join(response.iter_content(1024))
+        finally:
+            response.close()
+    stats = upstream.stats()
+    assert (stats['circuit'], stats['failures'], stats['inFlight']) == (CircuitBreaker.OPEN, 1, 0)
+    upstream.close()
+
+
+def test_streamed_body_read_in_full_is_a_success(server):
+    upstream = Upstream('test', server, failure_threshold=1, max_concurrency=1)
+    for _ in range(2):
+        # With one slot, the second request only gets through if close() released the first
+        response = upstream.get('ok', stream=True)
+        assert b''.join(response.iter_content(1024)) == b'ok'
+        response.close()
+    stats = upstream.stats()
+    assert (stats['circuit'], stats['failures'], stats['requests']) == (CircuitBreaker.CLOSED, 0, 2)
+    upstream.close()